@@ -0,0 +1,194 @@
+# artist_graph.py - Local artist-similarity graph built incrementally from Last.fm responses
+
+import os
+import json
+import time
+import atexit
+import heapq
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# JSON file the graph is persisted to (memory-only when unset)
+ARTIST_GRAPH_PATH = os.getenv("ARTIST_GRAPH_PATH")
+# Neighbor lists older than this are refetched from Last.fm
+ARTIST_GRAPH_MAX_AGE = int(os.getenv("ARTIST_GRAPH_MAX_AGE", str(14 * 24 * 3600)))
+# How many similar artists to pull per Last.fm call - one call should serve every later lookup
+ARTIST_GRAPH_FETCH_LIMIT = int(os.getenv("ARTIST_GRAPH_FETCH_LIMIT", "20"))
+# Minimum seconds between writes of a dirty graph to disk
+ARTIST_GRAPH_SAVE_INTERVAL = int(os.getenv("ARTIST_GRAPH_SAVE_INTERVAL", "60"))
+
+
+def graph_key(name: str) -> str:
+    """Node key for an artist name"""
+    return " ".join(name.lower().split())
+
+
+class ArtistSimilarityGraph:
+    """
+    Weighted adjacency lists: artist -> {similar artist: match weight (0..1)}.
+    Edges point from the artist we asked Last.fm about to the artists it returned.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: int = ARTIST_GRAPH_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.adjacency: Dict[str, Dict[str, float]] = {}
+        self.names: Dict[str, str] = {}        # key -> display name as Last.fm spells it
+        self.fetched_at: Dict[str, float] = {}  # key -> when its neighbor list was fetched
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.last_saved = 0.0
+
+        if path:
+            self.load(path)
+
+    def _node(self, name: str) -> str:
+        key = graph_key(name)
+        self.names.setdefault(key, name.strip())
+        return key
+
+    # --- building ---
+
+    def add_similar(self, artist: str, neighbors: Iterable[Tuple[str, float]], fetched_at: Optional[float] = None):
+        """Replace an artist's outgoing edges with a fresh Last.fm neighbor list"""
+        with self.lock:
+            key = self._node(artist)
+            edges = {}
+            for name, weight in neighbors:
+                if not name:
+                    continue
+                neighbor = self._node(name)
+                if neighbor != key:
+                    edges[neighbor] = max(0.0, min(1.0, float(weight)))
+            self.adjacency[key] = edges
+            self.fetched_at[key] = fetched_at or time.time()
+            self.dirty = True
+
+        self.maybe_save()
+
+    # --- lookups ---
+
+    def has_fresh_neighbors(self, artist: str) -> bool:
+        """
+        True once the artist's neighbor list was fetched within max_age. Fetches always ask for
+        ARTIST_GRAPH_FETCH_LIMIT neighbors, so a short (or empty) list is Last.fm's whole answer
+        and refetching it would return the same thing.
+        """
+        key = graph_key(artist)
+        with self.lock:
+            fetched = self.fetched_at.get(key)
+            return fetched is not None and time.time() - fetched <= self.max_age
+
+    def neighbors(self, artist: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Direct neighbors, strongest first"""
+        with self.lock:
+            edges = self.adjacency.get(graph_key(artist), {})
+            ranked = sorted(edges.items(), key=lambda kv: kv[1], reverse=True)
+            if limit is not None:
+                ranked = ranked[:limit]
+            return [(self.names.get(k, k), w) for k, w in ranked]
+
+    def neighborhood(self, seeds: Iterable[str], hops: int = 2, limit: Optional[int] = None,
+                     decay: float = 0.5) -> List[Tuple[str, float]]:
+        """
+        Multi-hop expansion from a set of seeds. A path's score is the product of its
+        edge weights, damped by `decay` per extra hop; each artist keeps its best path.
+        Seeds themselves are excluded.
+        """
+        with self.lock:
+            seed_keys = {graph_key(s) for s in seeds}
+            best: Dict[str, float] = {}
+            frontier = {k: 1.0 for k in seed_keys}
+
+            for hop in range(hops):
+                damping = decay ** hop
+                next_frontier: Dict[str, float] = {}
+                for node, path_score in frontier.items():
+                    for neighbor, weight in self.adjacency.get(node, {}).items():
+                        if neighbor in seed_keys:
+                            continue
+                        score = path_score * weight * damping
+                        if score > best.get(neighbor, 0.0):
+                            best[neighbor] = score
+                            next_frontier[neighbor] = path_score * weight
+                frontier = next_frontier
+                if not frontier:
+                    break
+
+            if limit is not None:
+                ranked = heapq.nlargest(limit, best.items(), key=lambda kv: kv[1])
+            else:
+                ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+            return [(self.names.get(k, k), round(s, 4)) for k, s in ranked]
+
+    def shared_neighbor_score(self, artist_a: str, artist_b: str) -> float:
+        """Weighted Jaccard overlap of two artists' neighbor sets (0 = nothing shared, 1 = identical)"""
+        with self.lock:
+            a = self.adjacency.get(graph_key(artist_a), {})
+            b = self.adjacency.get(graph_key(artist_b), {})
+            if not a or not b:
+                return 0.0
+            shared = sum(min(a[k], b[k]) for k in a.keys() & b.keys())
+            total = sum(max(a.get(k, 0.0), b.get(k, 0.0)) for k in a.keys() | b.keys())
+            return round(shared / total, 4) if total else 0.0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "artists": len(self.adjacency),
+                "edges": sum(len(e) for e in self.adjacency.values()),
+                "path": self.path
+            }
+
+    # --- persistence ---
+
+    def load(self, path: str):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            with self.lock:
+                self.adjacency = {k: dict(v) for k, v in data.get("adjacency", {}).items()}
+                self.names = data.get("names", {})
+                self.fetched_at = data.get("fetched_at", {})
+            print(f"🕸️ Loaded artist graph: {len(self.adjacency)} artists from {path}")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load artist graph from {path}: {e}")
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if not path:
+            return
+        with self.lock:
+            data = {"adjacency": self.adjacency, "names": self.names, "fetched_at": self.fetched_at}
+            payload = json.dumps(data)
+            self.dirty = False
+            self.last_saved = time.time()
+        try:
+            # Write atomically so a concurrent reader never sees a half-written file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not save artist graph to {path}: {e}")
+
+    def maybe_save(self):
+        if self.path and self.dirty and time.time() - self.last_saved >= ARTIST_GRAPH_SAVE_INTERVAL:
+            self.save()
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_artist_graph() -> ArtistSimilarityGraph:
+    """Process-wide similarity graph, loaded from ARTIST_GRAPH_PATH on first use"""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = ArtistSimilarityGraph(path=ARTIST_GRAPH_PATH)
+                atexit.register(lambda: _graph.dirty and _graph.save())
+    return _graph
@@ -0,0 +1,272 @@
+# async_clients.py - asyncio Spotify and Last.fm clients on httpx, plus the engine's event loop
+
+import os
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from moodque_logging import get_logger, log_track_event
+from rate_limiter import RateLimitTimeout
+from track_matcher import TrackMatcher
+from spotify_client import (
+    SPOTIFY_API_URL,
+    SPOTIFY_POOL_SIZE,
+    SPOTIFY_CONNECT_TIMEOUT,
+    SPOTIFY_READ_TIMEOUT,
+    SPOTIFY_MAX_RETRIES,
+    SPOTIFY_RATE_LIMIT_RETRIES,
+    SPOTIFY_QUEUE_TIMEOUT,
+    get_spotify_scheduler,
+    parse_retry_after
+)
+from lastfm_client import (
+    LASTFM_API_URL,
+    LASTFM_POOL_SIZE,
+    LASTFM_CONNECT_TIMEOUT,
+    LASTFM_READ_TIMEOUT,
+    LASTFM_MAX_RETRIES,
+    LASTFM_MAX_CONCURRENCY,
+    LASTFM_RATE_LIMIT_RETRIES,
+    LASTFM_RATE_LIMIT_BACKOFF,
+    LASTFM_RATE_LIMIT_QUEUE_TIMEOUT,
+    RATE_LIMITED,
+    RequestsTransport,
+    get_lastfm_client,
+    make_cache_key,
+    parse_similar_artists,
+    parse_top_tracks
+)
+
+# In-flight requests per client; HTTP/2 multiplexes these over one Spotify connection
+ASYNC_SPOTIFY_CONCURRENCY = int(os.getenv("ASYNC_SPOTIFY_CONCURRENCY", "8"))
+ASYNC_LASTFM_CONCURRENCY = int(os.getenv("ASYNC_LASTFM_CONCURRENCY", str(LASTFM_MAX_CONCURRENCY)))
+ASYNC_SPOTIFY_HTTP2 = os.getenv("ASYNC_SPOTIFY_HTTP2", "true").lower() != "false"
+
+log = get_logger("moodque.async_clients")
+
+
+class AsyncSpotifyClient:
+    """
+    Spotify Web API over one HTTP/2 connection. Draws on the same host-wide token bucket
+    as spotify_client, so sync and async callers share one budget and one Retry-After pause.
+    """
+
+    def __init__(self, bucket=None, concurrency=ASYNC_SPOTIFY_CONCURRENCY, max_retries=SPOTIFY_RATE_LIMIT_RETRIES,
+                 queue_timeout=SPOTIFY_QUEUE_TIMEOUT, breakers=None, transport=None):
+        self.bucket = bucket or get_spotify_scheduler().bucket
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.breakers = breakers
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            http2=ASYNC_SPOTIFY_HTTP2,
+            timeout=httpx.Timeout(SPOTIFY_READ_TIMEOUT, connect=SPOTIFY_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=SPOTIFY_POOL_SIZE, max_keepalive_connections=SPOTIFY_POOL_SIZE),
+            headers={"User-Agent": "moodQue/2.0"},
+            # Connection failures never reached Spotify, so they are safe to retry for any method
+            transport=transport or httpx.AsyncHTTPTransport(http2=ASYNC_SPOTIFY_HTTP2, retries=SPOTIFY_MAX_RETRIES)
+        )
+        self.counters = {"requests": 0, "rate_limited_responses": 0, "retries": 0}
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send once the host-wide budget allows it; 429s pause the bucket and are retried"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire_async(timeout=self.queue_timeout)
+            async with self.semaphore:
+                res = await self.client.request(method, url, **kwargs)
+            self.counters["requests"] += 1
+
+            if res.status_code != 429:
+                return res
+
+            self.counters["rate_limited_responses"] += 1
+            if attempt == self.max_retries:
+                break
+            retry_after = parse_retry_after(res.headers.get("Retry-After"))
+            log.warning("⏳ Spotify rate limit on %s %s - pausing all callers %.1fs", method, url.split('?')[0], retry_after)
+            self.bucket.pause_for(retry_after)
+            self.counters["retries"] += 1
+
+        log.warning("❌ Spotify still rate limited after %s retries: %s %s", self.max_retries, method, url.split('?')[0])
+        return res
+
+    async def search_track(self, artist: str, title: str, headers: Dict,
+                           playlist_type: str = "clean", limit: int = 3) -> Tuple[Optional[str], List[Dict]]:
+        """(best matching URI or None, every returned item) for one artist/title search"""
+        permit = self.breakers.admit("search", headers) if self.breakers else None
+        if self.breakers and permit is None:
+            log_track_event(log, "⚡ Circuit breaker OPEN - skipping Spotify search for '%s' by '%s'", title, artist)
+            return None, []
+
+        outcome = None
+        try:
+            res = await self.request("GET", f"{SPOTIFY_API_URL}/search", headers=headers,
+                                     params={"q": f"{artist} {title}", "type": "track", "limit": limit, "market": "US"})
+            if res.status_code in (401, 403):
+                log.warning("🔐 Auth error: %s", res.status_code)
+                outcome = "auth_failure"
+                return None, []
+            if res.status_code >= 500:
+                outcome = "failure"
+                return None, []
+            if res.status_code != 200:
+                return None, []
+
+            outcome = "success"
+            items = res.json().get("tracks", {}).get("items", [])
+            best = TrackMatcher(artist, title).best(items, playlist_type)
+            return (best["uri"] if best else None), items
+        except RateLimitTimeout:
+            log_track_event(log, "⏳ Spotify queue full - skipping '%s'", title)
+            return None, []
+        except httpx.HTTPError as e:
+            log.warning("🌐 Network error: %s...", str(e)[:50])
+            outcome = "failure"
+            return None, []
+        finally:
+            if permit is not None:
+                if outcome == "success":
+                    permit.success()
+                elif outcome in ("failure", "auth_failure"):
+                    permit.failure(auth=outcome == "auth_failure")
+                else:
+                    permit.release()
+
+    def stats(self):
+        return dict(self.counters)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class AsyncLastFMClient:
+    """
+    Last.fm over httpx, sharing the sync client's API key, response cache and host-wide
+    rate limiter. Identical in-flight calls on the loop share one request.
+    Fixture/in-memory transports are replayed through the sync client in a worker thread.
+    """
+
+    def __init__(self, client=None, concurrency=ASYNC_LASTFM_CONCURRENCY, transport=None):
+        self.sync = client or get_lastfm_client()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LASTFM_READ_TIMEOUT, connect=LASTFM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=LASTFM_POOL_SIZE, max_keepalive_connections=LASTFM_POOL_SIZE),
+            headers={"User-Agent": "moodQue/2.0"},
+            transport=transport or httpx.AsyncHTTPTransport(retries=LASTFM_MAX_RETRIES)
+        )
+        self.live = transport is not None or isinstance(self.sync.transport, RequestsTransport)
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self):
+        return self.sync.enabled
+
+    async def call(self, method: str, **params) -> Optional[Dict]:
+        """Async LastFMClient.call: cached, coalesced and rate limited the same way"""
+        if not self.sync.api_key:
+            return None
+        if not self.live:
+            return await asyncio.to_thread(self.sync.call, method, **params)
+
+        cache = self.sync.cache
+        ttl = cache.ttl_for(method) if cache else None
+        request_key = make_cache_key(method, params)
+        if ttl:
+            cached = cache.get(request_key)
+            if cached is not None:
+                return cached
+
+        task = self.inflight.get(request_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(method, params, request_key, ttl))
+            self.inflight[request_key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(request_key, None))
+        # One waiter being cancelled must not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, method, params, request_key, ttl):
+        data = await self._fetch_with_backoff(method, params)
+        if data is not None and ttl:
+            self.sync.cache.set(request_key, data, ttl)
+        return data
+
+    async def _fetch_with_backoff(self, method, params):
+        limiter = self.sync.rate_limiter
+        for attempt in range(LASTFM_RATE_LIMIT_RETRIES + 1):
+            if limiter:
+                await limiter.acquire_async(timeout=LASTFM_RATE_LIMIT_QUEUE_TIMEOUT)
+
+            async with self.semaphore:
+                res = await self.client.get(LASTFM_API_URL, params=self.sync.build_query(method, params))
+            body = res.json() if res.status_code == 200 else None
+            data = self.sync.interpret_response(method, res.status_code, body)
+
+            if data is not RATE_LIMITED:
+                return data
+
+            self.sync.rate_limited_responses += 1
+            if attempt == LASTFM_RATE_LIMIT_RETRIES:
+                break
+
+            backoff = LASTFM_RATE_LIMIT_BACKOFF * (2 ** attempt)
+            log.warning("⏳ Last.fm rate limit hit (%s) - backing off %.1fs (retry %s)", method, backoff, attempt + 1)
+            if limiter:
+                limiter.pause_for(backoff)
+            else:
+                await asyncio.sleep(backoff)
+
+        log.warning("❌ Last.fm %s still rate limited after %s retries", method, LASTFM_RATE_LIMIT_RETRIES)
+        return None
+
+    async def similar_artists(self, artist_name: str, limit: int = 5) -> List[Tuple[str, float]]:
+        return parse_similar_artists(await self.call("artist.getsimilar", artist=artist_name.strip(), limit=limit))
+
+    async def top_tracks(self, artist_name: str, limit: int = 15) -> List[Tuple[str, str]]:
+        data = await self.call("artist.gettoptracks", artist=artist_name.strip(), limit=limit)
+        return parse_top_tracks(data, artist_name)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# --- the engine's event loop ---
+# One long-lived loop per process, so HTTP/2 connections and clients survive between builds.
+# Flask request threads hand coroutines to it with run_coroutine().
+
+_loop = None
+_loop_lock = threading.Lock()
+_clients: Dict[str, object] = {}
+
+
+def get_engine_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="moodque-async", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_coroutine(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the engine loop from synchronous code and return its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_engine_loop()).result(timeout)
+
+
+def get_async_spotify_client(breakers=None) -> AsyncSpotifyClient:
+    """Loop-bound Spotify client; call from coroutines running on the engine loop"""
+    if "spotify" not in _clients:
+        _clients["spotify"] = AsyncSpotifyClient(breakers=breakers)
+    return _clients["spotify"]
+
+
+def get_async_lastfm_client() -> AsyncLastFMClient:
+    """Loop-bound Last.fm client; call from coroutines running on the engine loop"""
+    if "lastfm" not in _clients:
+        _clients["lastfm"] = AsyncLastFMClient()
+    return _clients["lastfm"]
@@ -0,0 +1,53 @@
+# build_result.py - What a successful playlist build hands back to the webhook layer
+
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+SPOTIFY_CODE_URL = "https://scannables.scdn.co/uri/plain/jpeg/black/white/640/spotify:playlist:{playlist_id}"
+
+
+@dataclass
+class BuildResult:
+    """Playlist created by MoodQueEngine, with everything the response needs (no follow-up API calls)"""
+
+    playlist_id: str
+    url: str
+    uris: List[str] = field(default_factory=list)
+    duration_ms: int = 0
+    missing_durations: int = 0  # tracks whose length wasn't known; duration_ms leaves them out
+    stage_stats: Dict[str, Dict] = field(default_factory=dict)  # stage -> {"seconds": ..., counters}
+    request_id: Optional[str] = None
+    service: str = "spotify"
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "BuildResult":
+        """Result for a playlist URL such as https://open.spotify.com/playlist/<id>"""
+        playlist_id = url.split("?")[0].rstrip("/").split("/")[-1]
+        return cls(playlist_id=playlist_id, url=url, **kwargs)
+
+    @property
+    def track_count(self) -> int:
+        return len(self.uris)
+
+    @property
+    def duration_minutes(self) -> float:
+        return round(self.duration_ms / 60000, 1)
+
+    @property
+    def duration_partial(self) -> bool:
+        """True when duration_ms is a lower bound because some track lengths were unknown"""
+        return self.missing_durations > 0
+
+    @property
+    def spotify_code_url(self) -> str:
+        return SPOTIFY_CODE_URL.format(playlist_id=self.playlist_id)
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data.update(track_count=self.track_count, duration_minutes=self.duration_minutes,
+                    duration_partial=self.duration_partial, spotify_code_url=self.spotify_code_url)
+        return data
+
+    def __str__(self):
+        # Log lines that used to print the bare URL keep doing so
+        return self.url
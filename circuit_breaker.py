@@ -0,0 +1,218 @@
+# circuit_breaker.py - Circuit breakers keyed by endpoint family and by auth principal
+
+import os
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from cachetools import LRUCache
+
+from moodque_logging import get_logger
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_TIMEOUT = int(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "60"))       # seconds before probing
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "2"))        # concurrent probes allowed
+CIRCUIT_HALF_OPEN_SUCCESSES = int(os.getenv("CIRCUIT_HALF_OPEN_SUCCESSES", "2"))  # probe successes needed to close
+CIRCUIT_MAX_PRINCIPALS = int(os.getenv("CIRCUIT_MAX_PRINCIPALS", "1000"))         # per-token breakers kept
+
+log = get_logger("moodque.circuit_breaker")
+
+
+class CircuitBreaker:
+    """
+    CLOSED -> OPEN after failure_threshold consecutive failures.
+    OPEN -> HALF_OPEN once recovery_timeout has passed; HALF_OPEN admits at most
+    half_open_max_probes requests at a time, closes after success_threshold probe
+    successes and reopens on any probe failure.
+    """
+
+    def __init__(self, name="spotify", failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout=CIRCUIT_RECOVERY_TIMEOUT, half_open_max_probes=CIRCUIT_HALF_OPEN_PROBES,
+                 success_threshold=CIRCUIT_HALF_OPEN_SUCCESSES, on_transition=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_probes = half_open_max_probes
+        self.success_threshold = success_threshold
+        self.on_transition = on_transition
+        self.failure_count = 0
+        self.last_failure_time = None
+        self.state = 'CLOSED'  # CLOSED, OPEN, HALF_OPEN
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def _transition(self, new_state):
+        old_state, self.state = self.state, new_state
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        log.warning("⚡ Circuit %s: %s -> %s", self.name, old_state, new_state)
+        if self.on_transition:
+            self.on_transition(self.name, old_state, new_state)
+
+    def _recovery_elapsed(self):
+        return datetime.now() - self.last_failure_time > timedelta(seconds=self.recovery_timeout)
+
+    def is_open(self):
+        """True while requests are being rejected outright (does not take a probe slot)"""
+        with self.lock:
+            return self.state == 'OPEN' and not self._recovery_elapsed()
+
+    def allow_request(self):
+        """Admit a request; in HALF_OPEN this takes one of the limited probe slots"""
+        with self.lock:
+            if self.state == 'OPEN':
+                if not self._recovery_elapsed():
+                    self.rejected += 1
+                    return False
+                self._transition('HALF_OPEN')
+
+            if self.state == 'HALF_OPEN':
+                if self.probes_in_flight >= self.half_open_max_probes:
+                    self.rejected += 1
+                    return False
+                self.probes_in_flight += 1
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failure_count = 0
+            if self.state == 'HALF_OPEN':
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self.probe_successes += 1
+                if self.probe_successes >= self.success_threshold:
+                    self._transition('CLOSED')
+            elif self.state == 'OPEN':
+                self._transition('CLOSED')
+
+    def record_failure(self):
+        with self.lock:
+            self.failure_count += 1
+            self.last_failure_time = datetime.now()
+            if self.state == 'HALF_OPEN':
+                self._transition('OPEN')
+            elif self.state == 'CLOSED' and self.failure_count >= self.failure_threshold:
+                self._transition('OPEN')
+
+    def release(self):
+        """Give back a probe slot for a request that neither succeeded nor failed (e.g. a 429)"""
+        with self.lock:
+            if self.state == 'HALF_OPEN':
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def stats(self):
+        with self.lock:
+            return {"state": self.state, "failure_count": self.failure_count,
+                    "probes_in_flight": self.probes_in_flight, "rejected": self.rejected}
+
+
+class CircuitPermit:
+    """Admission through an endpoint breaker and a principal breaker; report the outcome once"""
+
+    def __init__(self, endpoint: CircuitBreaker, principal: Optional[CircuitBreaker]):
+        self.endpoint = endpoint
+        self.principal = principal
+
+    def _breakers(self):
+        return [b for b in (self.endpoint, self.principal) if b is not None]
+
+    def success(self):
+        for breaker in self._breakers():
+            breaker.record_success()
+
+    def failure(self, auth=False):
+        """Auth failures count against the token only; everything else against the endpoint"""
+        blamed = self.principal if (auth and self.principal is not None) else self.endpoint
+        blamed.record_failure()
+        for breaker in self._breakers():
+            if breaker is not blamed:
+                breaker.release()
+
+    def release(self):
+        for breaker in self._breakers():
+            breaker.release()
+
+
+def endpoint_family(url: str) -> str:
+    """'search', 'tracks', 'playlists', 'me', 'token', ... from a Spotify URL"""
+    parsed = urlparse(url)
+    if parsed.netloc.startswith("accounts."):
+        return "token"
+    parts = [p for p in parsed.path.split("/") if p]
+    if parts and parts[0] == "v1":
+        parts = parts[1:]
+    if not parts:
+        return "other"
+    # /v1/users/{id}/playlists and /v1/playlists/{id}/tracks are both playlist writes
+    if "playlists" in parts:
+        return "playlists"
+    return parts[0]
+
+
+def principal_for(headers) -> Optional[str]:
+    """Stable, non-reversible id for the token in an Authorization header"""
+    auth = (headers or {}).get("Authorization")
+    if not auth:
+        return None
+    return hashlib.sha256(auth.encode()).hexdigest()[:12]
+
+
+class CircuitBreakerRegistry:
+    """One breaker per endpoint family plus one per auth principal, created on demand"""
+
+    def __init__(self, name="spotify", max_principals=CIRCUIT_MAX_PRINCIPALS):
+        self.name = name
+        self.endpoints: Dict[str, CircuitBreaker] = {}
+        self.principals = LRUCache(maxsize=max_principals)
+        self.lock = threading.Lock()
+        self.transitions: Dict[str, int] = {}
+
+    def _record_transition(self, breaker_name, old_state, new_state):
+        key = f"{old_state}->{new_state}"
+        with self.lock:
+            self.transitions[key] = self.transitions.get(key, 0) + 1
+
+    def for_endpoint(self, family: str) -> CircuitBreaker:
+        with self.lock:
+            breaker = self.endpoints.get(family)
+            if breaker is None:
+                breaker = CircuitBreaker(f"{self.name}:{family}", on_transition=self._record_transition)
+                self.endpoints[family] = breaker
+            return breaker
+
+    def for_principal(self, principal: Optional[str]) -> Optional[CircuitBreaker]:
+        if principal is None:
+            return None
+        with self.lock:
+            breaker = self.principals.get(principal)
+            if breaker is None:
+                breaker = CircuitBreaker(f"{self.name}:token:{principal}", on_transition=self._record_transition)
+                self.principals[principal] = breaker
+            return breaker
+
+    def admit(self, family: str, headers=None) -> Optional[CircuitPermit]:
+        """A permit if both the endpoint and the caller's token breakers admit the request, else None"""
+        endpoint = self.for_endpoint(family)
+        principal = self.for_principal(principal_for(headers))
+        if not endpoint.allow_request():
+            return None
+        if principal is not None and not principal.allow_request():
+            endpoint.release()
+            return None
+        return CircuitPermit(endpoint, principal)
+
+    def stats(self):
+        # Copy under the registry lock, read breakers outside it (transitions lock breaker -> registry)
+        with self.lock:
+            endpoints = dict(self.endpoints)
+            principals = list(self.principals.values())
+            transitions = dict(self.transitions)
+        return {
+            "endpoints": {family: b.stats() for family, b in endpoints.items()},
+            "principals_tracked": len(principals),
+            "principals_not_closed": sum(1 for b in principals if b.stats()["state"] != 'CLOSED'),
+            "transitions": transitions
+        }
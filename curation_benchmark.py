@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Offline comparison harness for curation strategies.
+
+Replays a fixed corpus of candidate pools through every registered strategy and
+reports latency, memory and output-quality metrics.
+
+Run with: python curation_benchmark.py [--corpus corpus.json] [--runs 5] [--json]
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from curation_strategies import (
+    CURATION_STRATEGIES,
+    DEFAULT_TRACK_DURATION_MS,
+    EXPLICIT_INDICATORS,
+    get_curation_strategy,
+    list_curation_strategies
+)
+from lastfm_recommender import GENRE_ARTIST_SEEDS
+
+CORPUS_SEED = 7
+
+TITLE_WORDS = [
+    "love", "night", "light", "dark", "heavy", "smooth", "lost", "wild", "easy", "dancing",
+    "summer", "broken", "shine", "gentle", "fire", "dream", "road", "heart", "power", "alone"
+]
+
+CORPUS_SCENARIOS = [
+    ("happy", "pop", 30, "clean"),
+    ("chill", "jazz", 45, "clean"),
+    ("workout", "hip-hop", 60, "explicit"),
+    ("sad", "indie", 20, "clean"),
+    ("party", "electronic", 90, "clean"),
+    ("focus", "classical", 120, "clean"),
+    ("energetic", "rock", 40, "explicit"),
+    ("romantic", "r-n-b", 35, "clean"),
+]
+
+
+def build_default_corpus(seed=CORPUS_SEED, pool_size=80):
+    """Deterministic corpus of candidate pools shaped like Last.fm discovery output"""
+    rng = random.Random(seed)
+    corpus = []
+
+    for mood, genre, minutes, playlist_type in CORPUS_SCENARIOS:
+        seeds = GENRE_ARTIST_SEEDS.get(genre, GENRE_ARTIST_SEEDS["pop"])
+        similar = [f"{genre.title()} Artist {i}" for i in range(1, 9)]
+        candidates = []
+
+        for i in range(pool_size):
+            is_seed = i < pool_size // 3
+            artist = rng.choice(seeds) if is_seed else rng.choice(similar)
+            title = " ".join(rng.sample(TITLE_WORDS, rng.randint(1, 3))).title()
+            if rng.random() < 0.08:
+                title += " (Explicit)"
+
+            candidates.append({
+                "artist": artist,
+                "track": title,
+                "score": round(rng.uniform(0.2, 1.5), 3),
+                "source": "artist_search" if is_seed else "similar_artist",
+                "duration_ms": rng.randint(140000, 330000),
+                "explicit": rng.random() < 0.15
+            })
+
+        corpus.append({
+            "mood_tags": mood,
+            "genre": genre,
+            "time_minutes": minutes,
+            "playlist_type": playlist_type,
+            "candidates": candidates
+        })
+
+    return corpus
+
+
+def load_corpus(path=None):
+    """Load a recorded corpus from disk, or build the default one"""
+    if not path:
+        return build_default_corpus()
+    with open(path) as f:
+        return json.load(f)
+
+
+def artist_diversity(tracks):
+    """Fraction of selected tracks that come from distinct artists (1.0 = all different)"""
+    if not tracks:
+        return 0.0
+    artists = {t.get("artist", "").lower() for t in tracks}
+    return len(artists) / len(tracks)
+
+
+def duration_error(tracks, time_minutes):
+    """Relative error between the playlist length and the requested time"""
+    if not time_minutes:
+        return 0.0
+    total_ms = sum(t.get("duration_ms") or DEFAULT_TRACK_DURATION_MS for t in tracks)
+    return abs(total_ms / 60000 - time_minutes) / time_minutes
+
+
+def clean_filter_violations(tracks, playlist_type):
+    """Number of explicit tracks that made it into a clean playlist"""
+    if playlist_type != "clean":
+        return 0
+    return sum(
+        1 for t in tracks
+        if t.get("explicit") or any(word in t.get("track", "").lower() for word in EXPLICIT_INDICATORS)
+    )
+
+
+def run_strategy_case(strategy_name, case, seed=CORPUS_SEED):
+    """Run one strategy over one corpus case and measure it"""
+    strategy_cls = get_curation_strategy(strategy_name)
+    candidates = copy.deepcopy(case["candidates"])
+
+    # Strategies randomize their scores - seed so runs are comparable
+    random.seed(seed)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    curator = strategy_cls(
+        mood_tags=case["mood_tags"],
+        genre=case["genre"],
+        time_minutes=case["time_minutes"],
+        playlist_type=case["playlist_type"]
+    )
+    selected = curator.curate_tracks(candidates)
+    latency_ms = (time.perf_counter() - started) * 1000
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "latency_ms": latency_ms,
+        "peak_kb": peak_bytes / 1024,
+        "track_count": len(selected),
+        "artist_diversity": artist_diversity(selected),
+        "duration_error": duration_error(selected, case["time_minutes"]),
+        "clean_violations": clean_filter_violations(selected, case["playlist_type"])
+    }
+
+
+def compare_strategies(corpus, strategies=None, runs=3):
+    """Replay the corpus through each strategy and aggregate the metrics"""
+    report = {}
+
+    for name in strategies or list_curation_strategies():
+        samples = []
+        for run in range(runs):
+            for case in corpus:
+                samples.append(run_strategy_case(name, case, seed=CORPUS_SEED + run))
+
+        latencies = sorted(s["latency_ms"] for s in samples)
+        report[name] = {
+            "cases": len(samples),
+            "latency_ms_mean": statistics.mean(latencies),
+            "latency_ms_p95": latencies[int(0.95 * (len(latencies) - 1))],
+            "peak_kb_max": max(s["peak_kb"] for s in samples),
+            "track_count_mean": statistics.mean(s["track_count"] for s in samples),
+            "artist_diversity_mean": statistics.mean(s["artist_diversity"] for s in samples),
+            "duration_error_mean": statistics.mean(s["duration_error"] for s in samples),
+            "clean_violations_total": sum(s["clean_violations"] for s in samples)
+        }
+
+    return report
+
+
+def print_report(report):
+    columns = [
+        ("latency_ms_mean", "lat ms", "{:.2f}"),
+        ("latency_ms_p95", "p95 ms", "{:.2f}"),
+        ("peak_kb_max", "peak KB", "{:.1f}"),
+        ("track_count_mean", "tracks", "{:.1f}"),
+        ("artist_diversity_mean", "diversity", "{:.2f}"),
+        ("duration_error_mean", "dur err", "{:.1%}"),
+        ("clean_violations_total", "clean viol", "{}"),
+    ]
+    header = f"{'strategy':<24}" + "".join(f"{label:>12}" for _, label, _ in columns)
+    print(header)
+    print("-" * len(header))
+    for name, metrics in report.items():
+        row = f"{name:<24}" + "".join(f"{fmt.format(metrics[key]):>12}" for key, _, fmt in columns)
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MoodQue curation strategies offline")
+    parser.add_argument("--corpus", help="JSON corpus of candidate pools (default: built-in fixed corpus)")
+    parser.add_argument("--dump-corpus", help="Write the built-in corpus to this path and exit")
+    parser.add_argument("--strategy", action="append", choices=sorted(CURATION_STRATEGIES),
+                        help="Only benchmark these strategies (repeatable)")
+    parser.add_argument("--runs", type=int, default=3, help="Replays of the corpus per strategy")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.dump_corpus:
+        with open(args.dump_corpus, "w") as f:
+            json.dump(build_default_corpus(), f, indent=2)
+        print(f"✅ Corpus written to {args.dump_corpus}")
+        return
+
+    corpus = load_corpus(args.corpus)
+
+    # Strategies print progress for each build - keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = compare_strategies(corpus, strategies=args.strategy, runs=args.runs)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"🧪 Replayed {len(corpus)} candidate pools x {args.runs} runs\n")
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# curation_strategies.py - Pluggable track curation strategies for the MoodQue engine
+
+import os
+import random
+import inspect
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+# Strategy used when the request does not ask for one explicitly
+DEFAULT_CURATION_STRATEGY = os.getenv("MOODQUE_CURATION_STRATEGY", "smart_mood_valence_v2")
+
+# Fallback track length used when candidates carry no duration_ms
+DEFAULT_TRACK_DURATION_MS = 210000
+
+# Words in a track name that suggest explicit content
+EXPLICIT_INDICATORS = ["explicit", "parental", "dirty", "fuck", "shit", "bitch"]
+
+# Registry of strategy name -> strategy class
+CURATION_STRATEGIES = {}
+
+
+def register_curation_strategy(cls):
+    """Class decorator that registers a curation strategy under its `name`"""
+    if not getattr(cls, "name", None):
+        raise ValueError(f"Curation strategy {cls.__name__} must define a name")
+    if inspect.isabstract(cls):
+        raise TypeError(f"Curation strategy {cls.__name__} must implement curate_tracks")
+    CURATION_STRATEGIES[cls.name] = cls
+    return cls
+
+
+def get_curation_strategy(name=None):
+    """Look up a strategy class by name, falling back to the configured default"""
+    if name and name in CURATION_STRATEGIES:
+        return CURATION_STRATEGIES[name]
+
+    if name:
+        print(f"⚠️ Unknown curation strategy '{name}', using '{DEFAULT_CURATION_STRATEGY}'")
+
+    return CURATION_STRATEGIES.get(DEFAULT_CURATION_STRATEGY) or CURATION_STRATEGIES["smart_mood_valence_v2"]
+
+
+def list_curation_strategies():
+    """Names of all registered strategies"""
+    return sorted(CURATION_STRATEGIES)
+
+
+class CurationStrategy(ABC):
+    """Base class for curation strategies - subclasses pick the tracks for a playlist"""
+
+    name = None
+
+    def __init__(self, mood_tags, genre, time_minutes, playlist_type="clean"):
+        self.mood_tags = mood_tags.lower() if isinstance(mood_tags, str) else ""
+        self.genre = genre.lower() if genre else "alternative"
+        self.time_minutes = time_minutes
+        self.playlist_type = playlist_type
+        self.target_track_count = max(8, min(25, time_minutes // 2))  # 8-25 tracks based on time
+
+    @abstractmethod
+    def curate_tracks(self, all_tracks):
+        """Pick the playlist's tracks from the discovered candidates"""
+
+
+@register_curation_strategy
+class SmartTrackCurator(CurationStrategy):
+    """Curates tracks based on mood, valence, and playlist requirements before streaming service search"""
+
+    name = "smart_mood_valence_v2"
+
+    # Mood to musical characteristics mapping
+    MOOD_CHARACTERISTICS = {
+        "happy": {"energy": "high", "valence": "positive", "tempo": "upbeat"},
+        "energetic": {"energy": "very_high", "valence": "positive", "tempo": "fast"},
+        "hype": {"energy": "very_high", "valence": "very_positive", "tempo": "very_fast"},
+        "party": {"energy": "very_high", "valence": "very_positive", "tempo": "danceable"},
+        "workout": {"energy": "high", "valence": "positive", "tempo": "driving"},
+        "chill": {"energy": "low", "valence": "neutral", "tempo": "slow"},
+        "relaxed": {"energy": "very_low", "valence": "positive", "tempo": "slow"},
+        "calm": {"energy": "very_low", "valence": "neutral", "tempo": "very_slow"},
+        "focus": {"energy": "low", "valence": "neutral", "tempo": "steady"},
+        "romantic": {"energy": "low", "valence": "positive", "tempo": "slow"},
+        "melancholy": {"energy": "low", "valence": "negative", "tempo": "slow"},
+        "sad": {"energy": "very_low", "valence": "negative", "tempo": "slow"},
+        "upbeat": {"energy": "high", "valence": "positive", "tempo": "fast"},
+        "groovy": {"energy": "medium", "valence": "positive", "tempo": "rhythmic"}
+    }
+
+    # Genre characteristics
+    GENRE_CHARACTERISTICS = {
+        "grunge": {"energy": "high", "rawness": "high", "era_weight": 1.5},
+        "alternative": {"energy": "medium", "complexity": "high", "era_weight": 1.3},
+        "rock": {"energy": "high", "intensity": "high", "era_weight": 1.2},
+        "pop": {"energy": "medium", "accessibility": "high", "era_weight": 1.0},
+        "hip-hop": {"energy": "high", "rhythm": "strong", "era_weight": 1.1},
+        "jazz": {"energy": "medium", "sophistication": "high", "era_weight": 1.4},
+        "electronic": {"energy": "high", "synthetic": "high", "era_weight": 0.9}
+    }
+
+    def score_track(self, track_info):
+        """Score a track based on mood, genre, and characteristics"""
+        score = 1.0
+
+        # Base scoring
+        artist = track_info.get("artist", "").lower()
+        track_name = track_info.get("track", "").lower()
+        source = track_info.get("source", "")
+
+        # Artist bonus (seed artists get priority)
+        if source == "artist_search":
+            score *= 1.5
+
+        # Mood matching
+        mood_characteristics = self.MOOD_CHARACTERISTICS.get(self.mood_tags, {})
+
+        # Energy level inference from track name
+        energy_keywords = {
+            "high": ["rock", "pump", "power", "energy", "wild", "crazy", "loud", "heavy"],
+            "low": ["soft", "quiet", "gentle", "calm", "peaceful", "slow", "rest"],
+            "medium": ["groove", "smooth", "easy", "flow", "steady"]
+        }
+
+        expected_energy = mood_characteristics.get("energy", "medium")
+        for energy_level, keywords in energy_keywords.items():
+            if any(keyword in track_name for keyword in keywords):
+                if energy_level == expected_energy:
+                    score *= 1.3
+                break
+
+        # Genre matching
+        genre_characteristics = self.GENRE_CHARACTERISTICS.get(self.genre, {})
+        genre_weight = genre_characteristics.get("era_weight", 1.0)
+        score *= genre_weight
+
+        # Special grunge characteristics
+        if self.genre == "grunge":
+            grunge_indicators = ["unplugged", "live", "acoustic", "raw", "demo"]
+            if any(indicator in track_name for indicator in grunge_indicators):
+                score *= 1.2
+
+        # Valence (positivity) matching
+        expected_valence = mood_characteristics.get("valence", "neutral")
+        positive_words = ["love", "happy", "good", "great", "beautiful", "shine", "light"]
+        negative_words = ["pain", "hurt", "sad", "dark", "broken", "lost", "alone", "die"]
+
+        if expected_valence in ["positive", "very_positive"]:
+            if any(word in track_name for word in positive_words):
+                score *= 1.2
+        elif expected_valence in ["negative"]:
+            if any(word in track_name for word in negative_words):
+                score *= 1.2
+
+        # Avoid explicit content for clean playlists
+        if self.playlist_type == "clean":
+            if any(indicator in track_name.lower() for indicator in EXPLICIT_INDICATORS):
+                score *= 0.3
+
+        # Randomization to avoid same tracks every time
+        score *= random.uniform(0.8, 1.2)
+
+        return score
+
+    def score_all(self, all_tracks):
+        """Score every candidate and return them sorted best first"""
+        scored_tracks = []
+        for track in all_tracks:
+            if isinstance(track, dict):
+                track["curation_score"] = self.score_track(track)
+                scored_tracks.append(track)
+
+        scored_tracks.sort(key=lambda x: x["curation_score"], reverse=True)
+        return scored_tracks
+
+    def curate_tracks(self, all_tracks):
+        """Curate the best tracks for this playlist"""
+        print(f"🎯 Curating tracks for {self.mood_tags} {self.genre} playlist ({self.time_minutes} min)")
+
+        scored_tracks = self.score_all(all_tracks)
+
+        # Artist diversity - don't have too many tracks from same artist
+        curated_tracks = []
+        artist_count = defaultdict(int)
+        max_per_artist = max(2, self.target_track_count // 8)  # Max 2-3 tracks per artist
+
+        for track in scored_tracks:
+            artist = track.get("artist", "").lower()
+
+            if artist_count[artist] < max_per_artist:
+                curated_tracks.append(track)
+                artist_count[artist] += 1
+
+                if len(curated_tracks) >= self.target_track_count:
+                    break
+
+        # If we don't have enough, fill with remaining tracks
+        if len(curated_tracks) < self.target_track_count:
+            remaining = [t for t in scored_tracks if t not in curated_tracks]
+            curated_tracks.extend(remaining[:self.target_track_count - len(curated_tracks)])
+
+        if not curated_tracks:
+            return curated_tracks
+
+        print(f"🎵 Curated {len(curated_tracks)} tracks from {len(all_tracks)} candidates")
+        print(f"📊 Top artists: {list(dict.fromkeys([t.get('artist', 'Unknown')[:20] for t in curated_tracks[:5]]))}")
+        print(f"🎯 Average curation score: {sum(t['curation_score'] for t in curated_tracks) / len(curated_tracks):.2f}")
+
+        return curated_tracks
+
+
+@register_curation_strategy
+class DurationFitCurator(SmartTrackCurator):
+    """Same scoring as smart_mood_valence_v2, but fills the requested time instead of a fixed track count"""
+
+    name = "duration_fit_v1"
+
+    def curate_tracks(self, all_tracks):
+        """Pick the best scored tracks until the playlist reaches the requested duration"""
+        print(f"⏱️ Duration-fit curation for {self.mood_tags} {self.genre} playlist ({self.time_minutes} min)")
+
+        scored_tracks = self.score_all(all_tracks)
+        target_ms = self.time_minutes * 60000
+        max_per_artist = max(2, self.target_track_count // 8)
+
+        curated_tracks = []
+        artist_count = defaultdict(int)
+        total_ms = 0
+
+        # Two passes: first respect the per-artist cap, then relax it if we are still short
+        for enforce_cap in (True, False):
+            for track in scored_tracks:
+                if total_ms >= target_ms:
+                    break
+                if track in curated_tracks:
+                    continue
+
+                artist = track.get("artist", "").lower()
+                if enforce_cap and artist_count[artist] >= max_per_artist:
+                    continue
+
+                # Skip obvious explicit titles for clean playlists rather than just down-weighting them
+                if self.playlist_type == "clean" and (
+                    track.get("explicit") or
+                    any(indicator in track.get("track", "").lower() for indicator in EXPLICIT_INDICATORS)
+                ):
+                    continue
+
+                duration_ms = track.get("duration_ms") or DEFAULT_TRACK_DURATION_MS
+                # Don't overshoot by more than half a track
+                if curated_tracks and total_ms + duration_ms - target_ms > duration_ms / 2:
+                    continue
+
+                curated_tracks.append(track)
+                artist_count[artist] += 1
+                total_ms += duration_ms
+
+        print(f"🎵 Curated {len(curated_tracks)} tracks ({total_ms / 60000:.1f} min) from {len(all_tracks)} candidates")
+        return curated_tracks
@@ -0,0 +1,109 @@
+# era_index.py - Artist -> era index keyed by normalized artist names
+
+import os
+import re
+import time
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Last.fm tags such as "80s", "1990s", "90's hip hop", "00s"
+ERA_TAG_PATTERN = re.compile(r"\b(19|20)?(\d)0'?s\b")
+# Tags below this Last.fm weight (0-100) are too noisy to date an artist
+ERA_TAG_MIN_COUNT = 10
+# Artists whose tags named no era are looked up again after this long
+ERA_UNKNOWN_RETRY_AFTER = int(os.getenv("ERA_UNKNOWN_RETRY_AFTER", str(7 * 24 * 3600)))  # seconds
+
+
+def normalize_artist_name(name: str) -> str:
+    """
+    Index key for an artist name: accents, case, punctuation and spacing are
+    ignored, "&" reads as "and" and a leading "The" is dropped, so
+    "The Beatles", "beatles" and "Beatles!" all share one key.
+    """
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = text.replace("&", " and ").strip()
+    if text.startswith("the "):
+        text = text[4:]
+    return "".join(c for c in text if c.isalnum())
+
+
+def eras_from_tags(tags: Iterable[Tuple[str, int]], min_count: int = ERA_TAG_MIN_COUNT) -> List[str]:
+    """Decades named in an artist's Last.fm tags, oldest first"""
+    decades = set()
+    for name, count in tags:
+        if count < min_count or not name:
+            continue
+        for century, digit in ERA_TAG_PATTERN.findall(name.lower()):
+            if not century:
+                # "20s" and younger read as this century, everything else as the last one
+                century = "20" if digit in "012" else "19"
+            decades.add(f"{century}{digit}0s")
+    return sorted(decades)
+
+
+class ArtistEraIndex:
+    """
+    Normalized-name lookup of the eras an artist was active in.
+    `version` increases on every change so memoized era results can key on it.
+    Artists whose tags named no era are remembered too, so they aren't looked up again
+    until `unknown_retry_after` passes.
+    """
+
+    def __init__(self, artist_eras: Optional[Dict[str, List[str]]] = None,
+                 unknown_retry_after: float = ERA_UNKNOWN_RETRY_AFTER):
+        self.eras: Dict[str, Tuple[str, ...]] = {}
+        self.names: Dict[str, str] = {}
+        self.unknown: Dict[str, float] = {}  # key -> when the lookup came back without eras
+        self.unknown_retry_after = unknown_retry_after
+        self.lock = threading.Lock()
+        self.version = 0
+        for artist, eras in (artist_eras or {}).items():
+            self.add(artist, eras)
+
+    def add(self, artist: str, eras: Iterable[str]) -> bool:
+        """Set an artist's eras; returns False for names that normalize to nothing"""
+        key = normalize_artist_name(artist)
+        eras = tuple(sorted(set(eras)))
+        if not key or not eras:
+            return False
+        with self.lock:
+            if self.eras.get(key) != eras:
+                self.eras[key] = eras
+                self.names.setdefault(key, artist)
+                self.version += 1
+        return True
+
+    def mark_unknown(self, artist: str, at: Optional[float] = None):
+        """Record that the artist's tags named no era"""
+        key = normalize_artist_name(artist)
+        if key:
+            with self.lock:
+                self.unknown[key] = at or time.time()
+
+    def is_settled(self, artist: str) -> bool:
+        """True if the artist's eras are known, or a recent lookup found none"""
+        key = normalize_artist_name(artist)
+        if key in self.eras:
+            return True
+        checked = self.unknown.get(key)
+        return checked is not None and time.time() - checked < self.unknown_retry_after
+
+    def get(self, artist: str, default=()) -> Tuple[str, ...]:
+        return self.eras.get(normalize_artist_name(artist), default)
+
+    def get_key(self, key: str, default=()) -> Tuple[str, ...]:
+        """Lookup by an already-normalized key"""
+        return self.eras.get(key, default)
+
+    def display_name(self, key: str) -> str:
+        return self.names.get(key, key)
+
+    def __contains__(self, artist: str) -> bool:
+        return normalize_artist_name(artist) in self.eras
+
+    def __len__(self) -> int:
+        return len(self.eras)
@@ -0,0 +1,264 @@
+# genre_pools.py - Precomputed, Spotify-resolved candidate pools for genre-only builds
+
+import os
+import time
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes - every process refreshes its own pools
+    fcntl = None
+
+from firebase_admin_init import db
+from lastfm_recommender import GENRE_ARTIST_SEEDS, get_recommendations, infer_era_from_age
+from moodque_utilities import search_spotify_track_ultra_robust, get_tracks_with_duration
+
+# Background refresher is opt-in per deployment
+GENRE_POOLS_ENABLED = os.getenv("GENRE_POOLS_ENABLED", "false").lower() == "true"
+GENRE_POOL_REFRESH_INTERVAL = int(os.getenv("GENRE_POOL_REFRESH_INTERVAL", str(6 * 3600)))  # seconds
+GENRE_POOL_MAX_AGE = int(os.getenv("GENRE_POOL_MAX_AGE", str(48 * 3600)))  # older pools are ignored
+GENRE_POOL_SIZE = int(os.getenv("GENRE_POOL_SIZE", "80"))  # resolved candidates kept per pool
+GENRE_POOL_SEARCH_DELAY = float(os.getenv("GENRE_POOL_SEARCH_DELAY", "0.2"))  # seconds between Spotify searches
+GENRE_POOL_COLLECTION = "genre_pools"
+
+# "current" = no birth year given; decades = the era a listener grew up in
+ERA_BUCKETS = ["current", "1960s", "1970s", "1980s", "1990s", "2000s", "2010s"]
+
+
+def era_bucket_for(birth_year) -> str:
+    """Pool bucket for a listener: the decade they turned 18 in, clamped to the known buckets"""
+    try:
+        birth_year = int(birth_year)
+    except (TypeError, ValueError):
+        return "current"
+    decade = (birth_year + 18) // 10 * 10
+    if decade < 1960:
+        return "1960s"
+    if decade > 2010:
+        return "current"
+    return f"{decade}s"
+
+
+def era_weights_for_bucket(bucket: str) -> Optional[Dict[str, float]]:
+    """Era weights used to rank a bucket; None lets get_recommendations use the genre seeds' eras"""
+    if bucket == "current":
+        return None
+    # Someone who turned 18 mid-decade
+    return infer_era_from_age(int(bucket[:4]) + 5 - 18)
+
+
+def pool_doc_id(genre: str, bucket: str) -> str:
+    return f"{genre}__{bucket}"
+
+
+class GenrePoolStore:
+    """Genre x era-bucket candidate pools held in memory and mirrored to Firestore"""
+
+    def __init__(self, collection=GENRE_POOL_COLLECTION, max_age=GENRE_POOL_MAX_AGE):
+        self.collection = collection
+        self.max_age = max_age
+        self.pools: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+        self.last_refresh = None
+
+    def _fresh(self, pool) -> bool:
+        return bool(pool) and time.time() - pool.get("built_at_ts", 0) < self.max_age
+
+    def get(self, genre: str, birth_year=None, playlist_type: str = "clean") -> Optional[List[Dict]]:
+        """Ranked, resolved candidates for a genre-only build, or None if no fresh pool exists"""
+        genre = (genre or "").lower().strip()
+        if genre not in GENRE_ARTIST_SEEDS:
+            return None
+
+        doc_id = pool_doc_id(genre, era_bucket_for(birth_year))
+        with self.lock:
+            pool = self.pools.get(doc_id)
+
+        if not self._fresh(pool):
+            # Another worker may have refreshed it
+            pool = self._load(doc_id)
+
+        if not self._fresh(pool):
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+
+        tracks = pool.get("tracks", [])
+        if playlist_type.lower() == "clean":
+            tracks = [t for t in tracks if not t.get("explicit")]
+        elif playlist_type.lower() == "explicit":
+            tracks = [t for t in tracks if t.get("explicit")]
+
+        with self.lock:
+            self.counters["hits"] += 1
+        # Copies, so curation can annotate tracks without touching the shared pool
+        return [dict(t) for t in tracks]
+
+    def _load(self, doc_id) -> Optional[Dict]:
+        try:
+            doc = db.collection(self.collection).document(doc_id).get()
+        except Exception as e:
+            print(f"⚠️ Could not read genre pool {doc_id}: {e}")
+            return None
+        if not doc.exists:
+            return None
+        pool = doc.to_dict()
+        with self.lock:
+            self.pools[doc_id] = pool
+        return pool
+
+    def put(self, genre: str, bucket: str, tracks: List[Dict]):
+        now = time.time()
+        pool = {
+            "genre": genre,
+            "era_bucket": bucket,
+            "tracks": tracks,
+            "built_at": datetime.fromtimestamp(now).isoformat(),
+            "built_at_ts": now
+        }
+        doc_id = pool_doc_id(genre, bucket)
+        with self.lock:
+            self.pools[doc_id] = pool
+        try:
+            db.collection(self.collection).document(doc_id).set(pool)
+        except Exception as e:
+            print(f"⚠️ Could not persist genre pool {doc_id}: {e}")
+
+    def refresh_genre(self, genre: str, headers: Dict) -> int:
+        """Rebuild every era bucket for one genre; returns how many pools were stored"""
+        ranked_by_bucket = {}
+        for bucket in ERA_BUCKETS:
+            # Repeated Last.fm lookups across buckets are served by the response cache
+            ranked_by_bucket[bucket] = get_recommendations(
+                seed_artists=GENRE_ARTIST_SEEDS[genre],
+                genre=genre,
+                era_weights=era_weights_for_bucket(bucket),
+                limit=GENRE_POOL_SIZE
+            )
+
+        # Resolve each distinct track once, whichever buckets it appears in
+        resolved = {}
+        for recs in ranked_by_bucket.values():
+            for rec in recs:
+                key = (rec["artist"], rec["track"])
+                if key in resolved:
+                    continue
+                resolved[key] = search_spotify_track_ultra_robust(rec["artist"], rec["track"], headers,
+                                                                  playlist_type="any", max_retries=1)
+                time.sleep(GENRE_POOL_SEARCH_DELAY)
+
+        uris = [uri for uri in resolved.values() if uri]
+        details = {t["uri"]: t for t in get_tracks_with_duration(uris, headers)}
+
+        stored = 0
+        for bucket, recs in ranked_by_bucket.items():
+            tracks = []
+            for rec in recs:
+                uri = resolved.get((rec["artist"], rec["track"]))
+                if not uri:
+                    continue
+                detail = details.get(uri, {})
+                tracks.append({
+                    "artist": rec["artist"],
+                    "track": rec["track"],
+                    "era": rec.get("era"),
+                    "score": rec.get("score", 0.5),
+                    "source": "genre_pool",
+                    "uri": uri,
+                    "explicit": detail.get("explicit", False),
+                    "duration_ms": detail.get("duration_ms")
+                })
+            if tracks:
+                self.put(genre, bucket, tracks[:GENRE_POOL_SIZE])
+                stored += 1
+        return stored
+
+    def refresh_all(self, headers: Dict) -> int:
+        started = time.time()
+        stored = 0
+        for genre in GENRE_ARTIST_SEEDS:
+            try:
+                stored += self.refresh_genre(genre, headers)
+            except Exception as e:
+                with self.lock:
+                    self.counters["refresh_errors"] += 1
+                print(f"❌ Genre pool refresh failed for {genre}: {e}")
+        with self.lock:
+            self.counters["refreshes"] += 1
+            self.last_refresh = datetime.now().isoformat()
+        print(f"🎛️ Refreshed {stored} genre pools in {time.time() - started:.0f}s")
+        return stored
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["pools_in_memory"] = len(self.pools)
+            stats["last_refresh"] = self.last_refresh
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_genre_pool_store() -> GenrePoolStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = GenrePoolStore()
+    return _store
+
+
+def get_genre_pool(genre: str, birth_year=None, playlist_type: str = "clean") -> Optional[List[Dict]]:
+    """Precomputed candidates for a genre-only build (None -> discover the usual way)"""
+    return get_genre_pool_store().get(genre, birth_year, playlist_type)
+
+
+_refresher = None
+_refresher_lock_fd = None
+
+
+def _claim_refresher_lock() -> bool:
+    """Only one worker per host runs the refresher; the others read pools from Firestore"""
+    global _refresher_lock_fd
+    if fcntl is None:
+        return True
+    fd = os.open(os.path.join(tempfile.gettempdir(), "moodque_genre_pools.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _refresher_lock_fd = fd  # held for the life of the process
+    return True
+
+
+def _refresh_loop(interval):
+    from moodque_auth import get_spotify_access_token
+    store = get_genre_pool_store()
+    while True:
+        try:
+            headers = {"Authorization": f"Bearer {get_spotify_access_token()}"}
+            store.refresh_all(headers)
+        except Exception as e:
+            print(f"❌ Genre pool refresher error: {e}")
+        time.sleep(interval)
+
+
+def start_genre_pool_refresher(interval=GENRE_POOL_REFRESH_INTERVAL) -> bool:
+    """Start the background refresher thread (once per host); returns True if this process runs it"""
+    global _refresher
+    if _refresher is not None:
+        return True
+    if not _claim_refresher_lock():
+        print("🎛️ Genre pool refresher already running in another worker")
+        return False
+    _refresher = threading.Thread(target=_refresh_loop, args=(interval,), name="genre-pools", daemon=True)
+    _refresher.start()
+    print(f"🎛️ Genre pool refresher started (every {interval}s)")
+    return True
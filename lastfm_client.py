@@ -0,0 +1,635 @@
+# lastfm_client.py - Shared Last.fm API client with pluggable transports (live, recorded fixtures, in-memory)
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Dict, Callable, Iterable, List, Tuple
+
+import requests
+from cachetools import LRUCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from moodque_logging import get_logger
+from rate_limiter import SharedTokenBucket
+from single_flight import SingleFlight
+
+LASTFM_API_URL = "https://ws.audioscrobbler.com/2.0/"
+
+# Connection / retry policy (overridable per deployment)
+LASTFM_POOL_SIZE = int(os.getenv("LASTFM_POOL_SIZE", "10"))              # keep-alive connections kept open
+LASTFM_CONNECT_TIMEOUT = float(os.getenv("LASTFM_CONNECT_TIMEOUT", "3"))  # seconds
+LASTFM_READ_TIMEOUT = float(os.getenv("LASTFM_READ_TIMEOUT", "8"))        # seconds
+LASTFM_MAX_RETRIES = int(os.getenv("LASTFM_MAX_RETRIES", "2"))
+LASTFM_BACKOFF_FACTOR = float(os.getenv("LASTFM_BACKOFF_FACTOR", "0.3"))
+
+# Concurrency - max in-flight Last.fm requests per process, and the wall-clock budget for discovery
+LASTFM_MAX_CONCURRENCY = int(os.getenv("LASTFM_MAX_CONCURRENCY", str(LASTFM_POOL_SIZE)))
+LASTFM_DISCOVERY_DEADLINE = float(os.getenv("LASTFM_DISCOVERY_DEADLINE", "20"))  # seconds
+
+# Host-wide request budget for our API key (Last.fm asks for <= 5 req/s averaged)
+LASTFM_RATE_LIMIT = float(os.getenv("LASTFM_RATE_LIMIT", "5"))     # requests per second
+LASTFM_RATE_BURST = float(os.getenv("LASTFM_RATE_BURST", "10"))
+LASTFM_RATE_LIMIT_RETRIES = int(os.getenv("LASTFM_RATE_LIMIT_RETRIES", "3"))
+LASTFM_RATE_LIMIT_BACKOFF = float(os.getenv("LASTFM_RATE_LIMIT_BACKOFF", "1.0"))  # seconds, doubled per retry
+LASTFM_RATE_LIMIT_QUEUE_TIMEOUT = float(os.getenv("LASTFM_RATE_LIMIT_QUEUE_TIMEOUT", "15"))  # max seconds queued
+
+# Last.fm error codes we act on
+LASTFM_ERROR_NOT_FOUND = 6
+LASTFM_ERROR_RATE_LIMIT = 29
+
+# Transport: "http" (live API), "fixture" (replay LASTFM_FIXTURE_PATH offline) or "record" (live, saving to it)
+LASTFM_TRANSPORT = os.getenv("LASTFM_TRANSPORT", "http").lower()
+LASTFM_FIXTURE_PATH = os.getenv("LASTFM_FIXTURE_PATH", "lastfm_fixtures.json")
+
+# Response cache - memory tier always on, persistent tier only when LASTFM_CACHE_DB is set
+LASTFM_CACHE_ENABLED = os.getenv("LASTFM_CACHE_ENABLED", "true").lower() != "false"
+LASTFM_CACHE_MAX_ENTRIES = int(os.getenv("LASTFM_CACHE_MAX_ENTRIES", "5000"))
+LASTFM_CACHE_DB = os.getenv("LASTFM_CACHE_DB")  # e.g. /tmp/moodque_lastfm_cache.sqlite
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# How long each method's responses stay fresh. Methods not listed are never cached.
+LASTFM_CACHE_TTLS = {
+    "artist.getsimilar": 7 * DAY,
+    "artist.gettoptracks": 12 * HOUR,
+    "artist.gettopalbums": 3 * DAY,
+    "artist.gettoptags": 7 * DAY,
+    "album.getinfo": 30 * DAY,
+    "track.getinfo": 3 * DAY,
+}
+
+log = get_logger("moodque.lastfm_client")
+
+
+def normalize_cache_params(params):
+    """Lowercase/strip string params and sort them so equivalent requests share a key"""
+    normalized = []
+    for key, value in sorted(params.items()):
+        if key in ("api_key", "format") or value is None:
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        normalized.append((key, str(value)))
+    return normalized
+
+
+def make_cache_key(method, params):
+    parts = [f"{k}={v}" for k, v in normalize_cache_params(params)]
+    return method.lower() + "?" + "&".join(parts)
+
+
+class LastFMResponseCache:
+    """
+    Two-tier cache for decoded Last.fm responses.
+    Memory tier: per-process LRU. Persistent tier: optional SQLite file shared by
+    every worker on the host, so a restart or a new worker starts warm.
+    """
+
+    def __init__(self, ttls=None, max_entries=LASTFM_CACHE_MAX_ENTRIES, db_path=LASTFM_CACHE_DB):
+        self.ttls = {k.lower(): v for k, v in (ttls or LASTFM_CACHE_TTLS).items()}
+        self.memory = LRUCache(maxsize=max_entries)
+        self.lock = threading.Lock()
+        self.db_path = db_path
+        self.db = None
+        self.counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0, "expired": 0}
+
+        if db_path:
+            try:
+                self.db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS lastfm_cache ("
+                    "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, body TEXT NOT NULL)"
+                )
+                self.db.commit()
+            except sqlite3.Error as e:
+                log.warning("⚠️ Last.fm persistent cache disabled (%s): %s", db_path, e)
+                self.db = None
+
+    def ttl_for(self, method):
+        return self.ttls.get(method.lower())
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                expires_at, data = entry
+                if expires_at > now:
+                    self.counters["memory_hits"] += 1
+                    return data
+                self.memory.pop(key, None)
+                self.counters["expired"] += 1
+
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        "SELECT expires_at, body FROM lastfm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    log.warning("⚠️ Last.fm cache read error: %s", e)
+                    row = None
+
+                if row and row[0] > now:
+                    data = json.loads(row[1])
+                    self.memory[key] = (row[0], data)
+                    self.counters["persistent_hits"] += 1
+                    return data
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key, data, ttl):
+        expires_at = time.time() + ttl
+        with self.lock:
+            self.memory[key] = (expires_at, data)
+            self.counters["stores"] += 1
+
+            if self.db is not None:
+                try:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO lastfm_cache (key, expires_at, body) VALUES (?, ?, ?)",
+                        (key, expires_at, json.dumps(data))
+                    )
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    log.warning("⚠️ Last.fm cache write error: %s", e)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM lastfm_cache")
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self.memory)
+        hits = stats["memory_hits"] + stats["persistent_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["persistent"] = self.db is not None
+        return stats
+
+
+# --- response parsing (shared by every caller, sync or async) ---
+
+def _as_list(value):
+    """Last.fm returns a bare dict instead of a one-item list when there is a single result"""
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, dict)]
+    if isinstance(value, dict):
+        return [value]
+    return []
+
+
+def _as_number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return cast(0)
+
+
+def parse_similar_artists(data) -> List[Tuple[str, float]]:
+    """artist.getsimilar -> [(name, match 0..1)] in Last.fm's order"""
+    if not isinstance(data, dict):
+        return []
+    similar = data.get("similarartists")
+    if not isinstance(similar, dict):
+        return []
+    return [(a["name"], _as_number(a.get("match"))) for a in _as_list(similar.get("artist")) if a.get("name")]
+
+
+def parse_top_tracks(data, artist_name: str) -> List[Tuple[str, str]]:
+    """artist.gettoptracks -> [(track, artist)] credited to the artist we asked about"""
+    if not isinstance(data, dict):
+        return []
+    top_tracks = data.get("toptracks")
+    if not isinstance(top_tracks, dict):
+        return []
+    return [(t["name"], artist_name) for t in _as_list(top_tracks.get("track")) if t.get("name")]
+
+
+def parse_top_albums(data) -> List[str]:
+    """artist.gettopalbums -> album names in chart order"""
+    if not isinstance(data, dict):
+        return []
+    top_albums = data.get("topalbums")
+    if not isinstance(top_albums, dict):
+        return []
+    return [a["name"] for a in _as_list(top_albums.get("album")) if a.get("name")]
+
+
+def parse_top_tags(data) -> List[Tuple[str, int]]:
+    """artist.gettoptags -> [(tag, weight 0..100)] strongest first"""
+    if not isinstance(data, dict):
+        return []
+    top_tags = data.get("toptags")
+    if not isinstance(top_tags, dict):
+        return []
+    return [(t["name"], _as_number(t.get("count"), int)) for t in _as_list(top_tags.get("tag")) if t.get("name")]
+
+
+def parse_album_tracks(data, artist_name: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+    """album.getinfo -> [(track, artist)] in tracklist order"""
+    if not isinstance(data, dict):
+        return []
+    album = data.get("album")
+    if not isinstance(album, dict) or not isinstance(album.get("tracks"), dict):
+        return []
+    tracks = [(t["name"], artist_name) for t in _as_list(album["tracks"].get("track")) if t.get("name")]
+    return tracks[:limit] if limit is not None else tracks
+
+
+def parse_track_info(data) -> Optional[Dict]:
+    """track.getinfo -> compact track summary"""
+    if not isinstance(data, dict) or not isinstance(data.get("track"), dict):
+        return None
+    track = data["track"]
+    artist = track.get("artist")
+    toptags = track.get("toptags")
+    return {
+        "name": track.get("name"),
+        "artist": artist.get("name") if isinstance(artist, dict) else artist,
+        "playcount": _as_number(track.get("playcount"), int),
+        "listeners": _as_number(track.get("listeners"), int),
+        "tags": [t.get("name") for t in _as_list(toptags.get("tag") if isinstance(toptags, dict) else None)],
+        "duration_ms": _as_number(track.get("duration"), int)
+    }
+
+
+# --- transports ---
+
+class RequestsTransport:
+    """Live Last.fm API over one keep-alive connection pool"""
+
+    def __init__(self, pool_size=LASTFM_POOL_SIZE, max_retries=LASTFM_MAX_RETRIES,
+                 backoff_factor=LASTFM_BACKOFF_FACTOR):
+        self.session = requests.Session()
+
+        # Last.fm only sees GETs from us, so every retry is safe
+        retry_strategy = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False
+        )
+
+        adapter = HTTPAdapter(
+            pool_connections=1,  # single host
+            pool_maxsize=pool_size,
+            max_retries=retry_strategy
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": "moodQue/2.0"})
+
+    def get(self, query, timeout=None):
+        """Return (status_code, decoded body or None)"""
+        res = self.session.get(LASTFM_API_URL, params=query, timeout=timeout)
+        return res.status_code, (res.json() if res.status_code == 200 else None)
+
+    def close(self):
+        self.session.close()
+
+
+def _query_key(query):
+    params = {k: v for k, v in query.items() if k != "method"}
+    return make_cache_key(query["method"], params)
+
+
+class InMemoryTransport:
+    """
+    Canned responses keyed like the response cache (method + normalized params).
+    Unknown requests get Last.fm's "not found" error. Every request key is kept in `calls`.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = dict(responses or {})
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def add(self, method, body, **params):
+        self.responses[make_cache_key(method, params)] = body
+
+    def get(self, query, timeout=None):
+        key = _query_key(query)
+        with self.lock:
+            self.calls.append(key)
+            body = self.responses.get(key)
+        if body is None:
+            return 200, {"error": LASTFM_ERROR_NOT_FOUND, "message": f"No recorded response for {key}"}
+        return 200, body
+
+    def close(self):
+        pass
+
+
+class FixtureTransport(InMemoryTransport):
+    """
+    Replays responses from a JSON fixture file, for offline runs and benchmarks.
+    With `record_from` set, requests missing from the file go to that transport and
+    successful answers are written back, so one live run records a reusable fixture.
+    """
+
+    def __init__(self, path=LASTFM_FIXTURE_PATH, record_from=None):
+        super().__init__(self._load(path))
+        self.path = path
+        self.record_from = record_from
+
+    @staticmethod
+    def _load(path):
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def get(self, query, timeout=None):
+        key = _query_key(query)
+        with self.lock:
+            recorded = key in self.responses
+        if recorded or self.record_from is None:
+            return super().get(query, timeout)
+
+        status, body = self.record_from.get(query, timeout)
+        if status == 200 and isinstance(body, dict) and "error" not in body:
+            with self.lock:
+                self.responses[key] = body
+            self.save()
+        return status, body
+
+    def save(self):
+        with self.lock:
+            payload = json.dumps(self.responses, sort_keys=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        if self.record_from is not None:
+            self.record_from.close()
+
+
+def build_transport(mode=LASTFM_TRANSPORT, fixture_path=LASTFM_FIXTURE_PATH):
+    """Transport for a LASTFM_TRANSPORT mode"""
+    if mode == "fixture":
+        return FixtureTransport(fixture_path)
+    if mode == "record":
+        return FixtureTransport(fixture_path, record_from=RequestsTransport())
+    if mode != "http":
+        log.warning("⚠️ Unknown LASTFM_TRANSPORT '%s' - using the live API", mode)
+    return RequestsTransport()
+
+
+# Sentinel returned by _fetch when Last.fm says we are over our rate limit
+RATE_LIMITED = object()
+
+
+class LastFMClient:
+    """
+    Last.fm API client: response cache, single-flight, rate limiting and parsed
+    per-method helpers on top of a pluggable transport (live pool, fixtures, in-memory fake).
+    """
+
+    def __init__(self, api_key=None, pool_size=LASTFM_POOL_SIZE,
+                 connect_timeout=LASTFM_CONNECT_TIMEOUT, read_timeout=LASTFM_READ_TIMEOUT,
+                 max_retries=LASTFM_MAX_RETRIES, backoff_factor=LASTFM_BACKOFF_FACTOR,
+                 cache=None, max_concurrency=LASTFM_MAX_CONCURRENCY, rate_limiter=None,
+                 transport=None):
+        self.api_key = api_key if api_key is not None else os.environ.get("LASTFM_API_KEY")
+        self.timeout = (connect_timeout, read_timeout)
+        self.transport = transport or RequestsTransport(pool_size, max_retries, backoff_factor)
+        self.cache = cache
+        # Shared limit on in-flight requests, however many fan-outs are running
+        self.concurrency = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiter = rate_limiter
+        self.single_flight = SingleFlight("lastfm")
+        self.rate_limited_responses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.api_key)
+
+    @property
+    def session(self):
+        """Underlying requests session (live transport only)"""
+        return getattr(self.transport, "session", None)
+
+    def call(self, method: str, timeout=None, use_cache=True, **params) -> Optional[Dict]:
+        """
+        Call a Last.fm API method and return the decoded JSON body.
+        Returns None for missing key, non-200 responses and Last.fm error payloads.
+        Network errors (after retries) and rate_limiter.RateLimitTimeout are raised to the caller.
+        Successful responses for methods with a TTL are served from the response cache.
+        """
+        if not self.api_key:
+            return None
+
+        ttl = self.cache.ttl_for(method) if (self.cache and use_cache) else None
+        request_key = make_cache_key(method, params)
+        if ttl:
+            cached = self.cache.get(request_key)
+            if cached is not None:
+                return cached
+
+        # Concurrent identical requests share one network call and its result
+        return self.single_flight.do(request_key, self._fetch_and_store, method, timeout, params, request_key, ttl)
+
+    def cached(self, method: str, **params) -> Optional[Dict]:
+        """The cached response for a call, or None - never touches the network"""
+        if not self.api_key or not self.cache or not self.cache.ttl_for(method):
+            return None
+        return self.cache.get(make_cache_key(method, params))
+
+    def _fetch_and_store(self, method, timeout, params, request_key, ttl):
+        data = self._fetch_with_backoff(method, timeout, params)
+        if data is not None and ttl:
+            self.cache.set(request_key, data, ttl)
+        return data
+
+    def _fetch_with_backoff(self, method, timeout, params):
+        """Take a host-wide rate token, fetch, and back off + retry on Last.fm rate-limit errors"""
+        for attempt in range(LASTFM_RATE_LIMIT_RETRIES + 1):
+            if self.rate_limiter:
+                # Queue for a token before taking a concurrency slot, so queued calls don't hold one
+                self.rate_limiter.acquire(timeout=LASTFM_RATE_LIMIT_QUEUE_TIMEOUT)
+
+            with self.concurrency:
+                data = self._fetch(method, timeout, params)
+
+            if data is not RATE_LIMITED:
+                return data
+
+            self.rate_limited_responses += 1
+            if attempt == LASTFM_RATE_LIMIT_RETRIES:
+                break
+
+            backoff = LASTFM_RATE_LIMIT_BACKOFF * (2 ** attempt)
+            log.warning("⏳ Last.fm rate limit hit (%s) - backing off %.1fs (retry %s)", method, backoff, attempt + 1)
+            if self.rate_limiter:
+                # Pause the shared bucket so every worker on the host slows down, not just this thread
+                self.rate_limiter.pause_for(backoff)
+            else:
+                time.sleep(backoff)
+
+        log.warning("❌ Last.fm %s still rate limited after %s retries", method, LASTFM_RATE_LIMIT_RETRIES)
+        return None
+
+    def _fetch(self, method, timeout, params):
+        status, data = self.transport.get(self.build_query(method, params), timeout=timeout or self.timeout)
+        return self.interpret_response(method, status, data)
+
+    def build_query(self, method, params) -> Dict:
+        query = {"method": method, "api_key": self.api_key, "format": "json"}
+        query.update({k: v for k, v in params.items() if v is not None})
+        return query
+
+    def interpret_response(self, method, status, data):
+        """Decoded body, None for failures and error payloads, or RATE_LIMITED"""
+        if status == 429:
+            return RATE_LIMITED
+        if status != 200:
+            log.warning("❌ Last.fm %s failed: HTTP %s", method, status)
+            return None
+
+        if data.get("error") == LASTFM_ERROR_RATE_LIMIT:
+            return RATE_LIMITED
+        if "error" in data:
+            log.warning("❌ Last.fm API Error %s (%s): %s", data['error'], method, data.get('message', 'Unknown error'))
+            return None
+
+        return data
+
+    # --- parsed per-method helpers ---
+
+    def similar_artists(self, artist_name: str, limit: int = 5) -> List[Tuple[str, float]]:
+        data = self.call("artist.getsimilar", artist=artist_name.strip(), limit=limit)
+        return parse_similar_artists(data)
+
+    def top_tracks(self, artist_name: str, limit: int = 15) -> List[Tuple[str, str]]:
+        data = self.call("artist.gettoptracks", artist=artist_name.strip(), limit=limit)
+        return parse_top_tracks(data, artist_name)
+
+    def top_albums(self, artist_name: str, limit: int = 10) -> List[str]:
+        data = self.call("artist.gettopalbums", artist=artist_name.strip(), limit=limit)
+        return parse_top_albums(data)
+
+    def top_tags(self, artist_name: str, cached_only: bool = False) -> Optional[List[Tuple[str, int]]]:
+        """Tags for an artist; with cached_only, None means the response cache has no answer yet"""
+        if cached_only:
+            data = self.cached("artist.gettoptags", artist=artist_name.strip())
+            return None if data is None else parse_top_tags(data)
+        data = self.call("artist.gettoptags", artist=artist_name.strip())
+        return parse_top_tags(data)
+
+    def album_tracks(self, artist_name: str, album_name: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        data = self.call("album.getinfo", artist=artist_name.strip(), album=album_name.strip())
+        return parse_album_tracks(data, artist_name, limit)
+
+    def track_info(self, artist_name: str, track_name: str) -> Optional[Dict]:
+        data = self.call("track.getInfo", artist=artist_name.strip(), track=track_name.strip())
+        return parse_track_info(data)
+
+    def test_connection(self, artists=("Beatles", "Taylor Swift", "Drake")) -> bool:
+        """True once any well-known artist returns similar artists"""
+        log.info("🧪 Testing Last.fm API connection...")
+        if not self.enabled:
+            log.warning("❌ No LASTFM_API_KEY found!")
+            return False
+
+        for artist in artists:
+            try:
+                similar = self.similar_artists(artist, limit=2)
+            except requests.exceptions.RequestException as e:
+                log.warning("❌ Last.fm request failed for %s: %s", artist, e)
+                continue
+            if similar:
+                log.info("✅ Success! %s -> %s", artist, [name for name, _ in similar])
+                return True
+            log.warning("❌ Failed for %s", artist)
+
+        log.warning("❌ All Last.fm tests failed!")
+        return False
+
+    def cache_stats(self):
+        stats = self.cache.stats() if self.cache else {}
+        stats["single_flight"] = self.single_flight.stats()
+        return stats
+
+    def rate_limit_stats(self):
+        """Queueing delay and rate-limit counters for this worker"""
+        stats = self.rate_limiter.stats() if self.rate_limiter else {}
+        stats["rate_limited_responses"] = self.rate_limited_responses
+        return stats
+
+    def close(self):
+        self.transport.close()
+
+
+def deadline_after(seconds=LASTFM_DISCOVERY_DEADLINE):
+    """Absolute deadline (time.monotonic based) for a discovery stage"""
+    return time.monotonic() + seconds
+
+
+def fan_out(fn: Callable, items: Iterable, deadline: Optional[float] = None,
+            default=None, max_workers: int = LASTFM_MAX_CONCURRENCY) -> List:
+    """
+    Run fn(item) for every item concurrently and return the results in input order.
+    Items that raise, or are still running when the deadline passes, yield `default`
+    so callers can merge whatever finished in their usual priority order.
+    Network concurrency is bounded by the client's semaphore, not by this pool,
+    so nested fan-outs cannot starve each other.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    results = [default] * len(items)
+    executor = ThreadPoolExecutor(max_workers=min(len(items), max_workers), thread_name_prefix="lastfm")
+    try:
+        futures = {executor.submit(fn, item): i for i, item in enumerate(items)}
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, not_done = wait(futures, timeout=timeout)
+
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                log.warning("❌ Last.fm fan-out task failed: %s", e)
+
+        if not_done:
+            log.warning("⏰ Last.fm deadline reached - dropping %s/%s pending lookups", len(not_done), len(items))
+    finally:
+        # Don't block the build on stragglers; they finish (or time out) in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_lastfm_client() -> LastFMClient:
+    """Process-wide Last.fm client (created lazily, shared by all threads)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cache = LastFMResponseCache() if LASTFM_CACHE_ENABLED else None
+                if LASTFM_TRANSPORT == "fixture":
+                    # Offline replay needs neither a real key nor the shared API budget
+                    _client = LastFMClient(api_key=os.environ.get("LASTFM_API_KEY") or "fixture",
+                                           cache=cache, transport=build_transport())
+                else:
+                    limiter = SharedTokenBucket("lastfm", rate=LASTFM_RATE_LIMIT, capacity=LASTFM_RATE_BURST)
+                    _client = LastFMClient(cache=cache, rate_limiter=limiter, transport=build_transport())
+    return _client
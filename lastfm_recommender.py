@@ -1,11 +1,20 @@
 # Enhanced lastfm_recommender.py with real Last.fm API integration
 
 from datetime import datetime
-from typing import List, Optional, Dict, Set
+from typing import List, Optional, Dict, Set, Tuple
 from collections import Counter
-import requests
+from functools import lru_cache
 import os
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lastfm_client import get_lastfm_client, fan_out
+from artist_graph import get_artist_graph, ARTIST_GRAPH_FETCH_LIMIT
+from era_index import ArtistEraIndex, normalize_artist_name, eras_from_tags
+from moodque_logging import get_logger
+
+log = get_logger("moodque.lastfm_recommender")
 
 # Get Last.fm API key
 LASTFM_API_KEY = os.environ.get("LASTFM_API_KEY")
@@ -62,6 +71,15 @@ ARTIST_ERA_MAP = {
     "Norah Jones": ["2000s", "2010s", "2020s"]
 }
 
+# Normalized lookup over ARTIST_ERA_MAP, extended at runtime from Last.fm tags
+ERA_INDEX = ArtistEraIndex(ARTIST_ERA_MAP)
+
+# Tag lookups for artists the index is missing run here, off the build path
+ERA_LEARNING_WORKERS = int(os.getenv("ERA_LEARNING_WORKERS", "2"))
+_era_learning_executor = ThreadPoolExecutor(max_workers=ERA_LEARNING_WORKERS, thread_name_prefix="era-learning")
+_era_learning_queued: Set[str] = set()
+_era_learning_lock = threading.Lock()
+
 # Genre-to-artist seed mapping for when no favorite artist is provided
 GENRE_ARTIST_SEEDS = {
     "pop": ["Taylor Swift", "Dua Lipa", "Harry Styles", "Olivia Rodrigo"],
@@ -83,87 +101,49 @@ GENRE_ARTIST_SEEDS = {
     "grunge": ["Nirvana", "Pearl Jam", "Soundgarden"]
 }
 
-# Standard timeout for all API calls
+# Standard timeout for all API calls (read timeout of the shared Last.fm client)
 API_TIMEOUT = 8  # seconds
 
 def get_lastfm_top_tracks(artist_name: str, limit: int = 15) -> List[tuple]:
     """Get top tracks for an artist from Last.fm API"""
-    if not LASTFM_API_KEY:
+    client = get_lastfm_client()
+    if not client.enabled:
         return []
     
-    url = "https://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "artist.gettoptracks",
-        "artist": artist_name.strip(),
-        "api_key": LASTFM_API_KEY,
-        "format": "json",
-        "limit": limit
-    }
-    
     try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        if res.status_code == 200:
-            data = res.json()
-            if "error" in data:
-                return []
-            
-            top_tracks = data.get("toptracks", {})
-            if isinstance(top_tracks, dict):
-                tracks_list = top_tracks.get("track", [])
-                if isinstance(tracks_list, list):
-                    return [(t["name"], artist_name) for t in tracks_list if isinstance(t, dict) and "name" in t]
-                elif isinstance(tracks_list, dict):
-                    track_name = tracks_list.get("name")
-                    return [(track_name, artist_name)] if track_name else []
-        return []
+        return client.top_tracks(artist_name, limit=limit)
     except Exception as e:
-        print(f"❌ Error fetching top tracks for {artist_name}: {e}")
+        log.warning("❌ Error fetching top tracks for %s: %s", artist_name, e)
         return []
 
 def get_lastfm_similar_artists(artist_name: str, limit: int = 5) -> List[str]:
-    """Get similar artists from Last.fm API"""
-    if not LASTFM_API_KEY:
-        print("⚠️ No LASTFM_API_KEY found")
+    """Get similar artists, from the local similarity graph when possible, else from Last.fm"""
+    graph = get_artist_graph()
+    if graph.has_fresh_neighbors(artist_name):
+        return [name for name, _ in graph.neighbors(artist_name, limit=limit)]
+    
+    client = get_lastfm_client()
+    if not client.enabled:
+        log.warning("⚠️ No LASTFM_API_KEY found")
         return []
     
-    url = "https://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "artist.getsimilar",
-        "artist": artist_name.strip(),
-        "api_key": LASTFM_API_KEY,
-        "format": "json",
-        "limit": limit
-    }
-    
     try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        if res.status_code == 200:
-            data = res.json()
-            if "error" in data:
-                print(f"❌ Last.fm API Error: {data.get('message', 'Unknown error')}")
-                return []
-            
-            similar_artists = data.get("similarartists", {})
-            if isinstance(similar_artists, dict):
-                artists_list = similar_artists.get("artist", [])
-                if isinstance(artists_list, list):
-                    return [a.get("name") for a in artists_list if isinstance(a, dict) and "name" in a]
-                elif isinstance(artists_list, dict):
-                    name = artists_list.get("name")
-                    return [name] if name else []
-        return []
+        # Ask for a full neighbor list once so later lookups (any limit) stay local
+        neighbors = client.similar_artists(artist_name, limit=max(limit, ARTIST_GRAPH_FETCH_LIMIT))
+        graph.add_similar(artist_name, neighbors)
+        return [name for name, _ in neighbors[:limit]]
     except Exception as e:
-        print(f"❌ Error fetching similar artists: {e}")
+        log.warning("❌ Error fetching similar artists: %s", e)
         return []
 
 def search_tracks_by_artist(artist_name, limit=20):
     """
     Get tracks for a specific artist from Last.fm with BATCHING to prevent timeouts
     """
-    print(f"🎤 Searching for tracks by artist: '{artist_name}' (limit: {limit})")
+    log.debug("🎤 Searching for tracks by artist: '%s' (limit: %s)", artist_name, limit)
     
-    if not LASTFM_API_KEY:
-        print("❌ LASTFM_API_KEY not found in environment variables")
+    if not get_lastfm_client().enabled:
+        log.warning("❌ LASTFM_API_KEY not found in environment variables")
         return []
     
     all_tracks = []
@@ -172,14 +152,14 @@ def search_tracks_by_artist(artist_name, limit=20):
     try:
         top_tracks = get_lastfm_top_tracks(artist_name, limit=min(limit, 15))
         all_tracks.extend(top_tracks)
-        print(f"🎵 Found {len(top_tracks)} top tracks for {artist_name}")
+        log.debug("🎵 Found %s top tracks for %s", len(top_tracks), artist_name)
     except Exception as e:
-        print(f"❌ Error getting top tracks for {artist_name}: {e}")
+        log.warning("❌ Error getting top tracks for %s: %s", artist_name, e)
     
     # Strategy 2: Only add similar artists if we have very few tracks
     if len(all_tracks) < 10 and len(all_tracks) < limit:
         try:
-            print(f"🔗 Getting similar artists for {artist_name} (limited)...")
+            log.debug("🔗 Getting similar artists for %s (limited)...", artist_name)
             similar_artists = get_lastfm_similar_artists(artist_name, limit=2)
             for similar_artist in similar_artists[:1]:  # Only use 1 similar artist
                 if len(all_tracks) >= limit:
@@ -190,11 +170,14 @@ def search_tracks_by_artist(artist_name, limit=20):
                         break
                     if track not in all_tracks:
                         all_tracks.append(track)
-            print(f"🔗 Added tracks from similar artists to {artist_name}")
+            log.debug("🔗 Added tracks from similar artists to %s", artist_name)
         except Exception as e:
-            print(f"❌ Error getting similar artist tracks for {artist_name}: {e}")
+            log.warning("❌ Error getting similar artist tracks for %s: %s", artist_name, e)
     
-    # Convert tuples to dict format expected by the engine
+    return _format_artist_tracks(artist_name, all_tracks, limit)
+
+def _format_artist_tracks(artist_name, all_tracks, limit):
+    """Convert (track, artist) tuples to the dict format expected by the engine"""
     formatted_tracks = []
     for track_tuple in all_tracks:
         if isinstance(track_tuple, tuple) and len(track_tuple) >= 2:
@@ -205,155 +188,202 @@ def search_tracks_by_artist(artist_name, limit=20):
                 "source": "artist_search"
             })
     
-    print(f"✅ Total tracks found for {artist_name}: {len(formatted_tracks)}")
+    log.debug("✅ Total tracks found for %s: %s", artist_name, len(formatted_tracks))
     return formatted_tracks[:limit]
 
-def get_artist_album_tracks(artist_name, limit=30):
+async def search_tracks_by_artist_async(client, artist_name, limit=20):
+    """search_tracks_by_artist on an async_clients.AsyncLastFMClient"""
+    if not client.enabled:
+        return []
+    
+    all_tracks = []
+    try:
+        all_tracks.extend(await client.top_tracks(artist_name, limit=min(limit, 15)))
+    except Exception as e:
+        log.warning("❌ Error getting top tracks for %s: %s", artist_name, e)
+    
+    if len(all_tracks) < 10 and len(all_tracks) < limit:
+        try:
+            graph = get_artist_graph()
+            if graph.has_fresh_neighbors(artist_name):
+                similar_artists = [name for name, _ in graph.neighbors(artist_name, limit=1)]
+            else:
+                neighbors = await client.similar_artists(artist_name, limit=ARTIST_GRAPH_FETCH_LIMIT)
+                graph.add_similar(artist_name, neighbors)
+                similar_artists = [name for name, _ in neighbors[:1]]
+            for similar_artist in similar_artists:
+                for track in await client.top_tracks(similar_artist, limit=3):
+                    if len(all_tracks) >= limit:
+                        break
+                    if track not in all_tracks:
+                        all_tracks.append(track)
+        except Exception as e:
+            log.warning("❌ Error getting similar artist tracks for %s: %s", artist_name, e)
+    
+    return _format_artist_tracks(artist_name, all_tracks, limit)
+
+def get_artist_album_tracks(artist_name, limit=30, deadline=None):
     """Get tracks from an artist's albums using Last.fm API"""
-    if not LASTFM_API_KEY:
+    client = get_lastfm_client()
+    if not client.enabled:
         return []
     
-    print(f"💿 Getting album tracks for: '{artist_name}'")
+    log.debug("💿 Getting album tracks for: '%s'", artist_name)
     
     try:
-        # First get the artist's top albums
-        url = "https://ws.audioscrobbler.com/2.0/"
-        params = {
-            "method": "artist.gettopalbums",
-            "artist": artist_name.strip(),
-            "api_key": LASTFM_API_KEY,
-            "format": "json",
-            "limit": 10  # Get top 10 albums
-        }
-        
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        if res.status_code != 200:
-            print(f"❌ Failed to get albums for {artist_name}: {res.status_code}")
+        # First get the artist's top albums (top 10)
+        album_names = client.top_albums(artist_name, limit=10)
+        if not album_names:
+            log.warning("❌ Failed to get albums for %s", artist_name)
             return []
         
-        data = res.json()
-        if "error" in data:
-            print(f"❌ Last.fm API Error: {data.get('message', 'Unknown error')}")
-            return []
+        # Limit to top 5 albums to avoid too many API calls
+        album_names = album_names[:5]
         
-        albums = data.get("topalbums", {}).get("album", [])
-        if not isinstance(albums, list):
-            albums = [albums] if albums else []
+        # Fetch albums concurrently, then merge in chart order
+        album_results = fan_out(lambda name: get_album_tracks(artist_name, name), album_names,
+                                deadline=deadline, default=[])
         
         all_album_tracks = []
-        
-        # Get tracks from each album
-        for album in albums[:5]:  # Limit to top 5 albums to avoid too many API calls
+        for album_tracks in album_results:
+            all_album_tracks.extend(album_tracks)
             if len(all_album_tracks) >= limit:
                 break
-                
-            album_name = album.get("name", "")
-            if not album_name:
-                continue
-                
-            try:
-                album_tracks = get_album_tracks(artist_name, album_name)
-                all_album_tracks.extend(album_tracks)
-                if len(all_album_tracks) >= limit:
-                    break
-            except Exception as e:
-                print(f"❌ Error getting tracks from album '{album_name}': {e}")
-                continue
         
-        print(f"💿 Found {len(all_album_tracks)} album tracks for {artist_name}")
+        log.debug("💿 Found %s album tracks for %s", len(all_album_tracks), artist_name)
         return all_album_tracks[:limit]
         
     except Exception as e:
-        print(f"❌ Error getting album tracks for {artist_name}: {e}")
+        log.warning("❌ Error getting album tracks for %s: %s", artist_name, e)
         return []
 
 def get_album_tracks(artist_name, album_name, limit=20):
     """Get tracks from a specific album"""
-    if not LASTFM_API_KEY:
+    client = get_lastfm_client()
+    if not client.enabled:
         return []
     
     try:
-        url = "https://ws.audioscrobbler.com/2.0/"
-        params = {
-            "method": "album.getinfo",
-            "artist": artist_name.strip(),
-            "album": album_name.strip(),
-            "api_key": LASTFM_API_KEY,
-            "format": "json"
-        }
-        
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        if res.status_code != 200:
-            return []
-        
-        data = res.json()
-        if "error" in data:
-            return []
-        
-        album_info = data.get("album", {})
-        tracks = album_info.get("tracks", {}).get("track", [])
-        
-        if not isinstance(tracks, list):
-            tracks = [tracks] if tracks else []
-        
-        track_tuples = []
-        for track in tracks[:limit]:
-            if isinstance(track, dict) and "name" in track:
-                track_tuples.append((track["name"], artist_name))
-        
-        return track_tuples
-        
+        return client.album_tracks(artist_name, album_name, limit=limit)
     except Exception as e:
-        print(f"❌ Error getting album info for '{album_name}': {e}")
+        log.warning("❌ Error getting album info for '%s': %s", album_name, e)
         return []
 
+def get_artist_eras(artist: str) -> Tuple[str, ...]:
+    """Eras for an artist, or the current decade when the index doesn't know them"""
+    return ERA_INDEX.get(artist) or (_current_decade(),)
+
+def _current_decade() -> str:
+    return f"{datetime.now().year//10*10}s"
+
+def _record_artist_tags(artist: str, tags) -> bool:
+    eras = eras_from_tags(tags)
+    if not eras:
+        ERA_INDEX.mark_unknown(artist)
+        return False
+    log.debug("📅 Learned eras for %s from Last.fm tags: %s", artist, eras)
+    return ERA_INDEX.add(artist, eras)
+
+def learn_artist_eras(artist: str) -> bool:
+    """Add an unknown artist to the era index from their Last.fm tags (may call Last.fm)"""
+    if ERA_INDEX.is_settled(artist):
+        return artist in ERA_INDEX
+    client = get_lastfm_client()
+    if not client.enabled:
+        return False
+    try:
+        tags = client.top_tags(artist)
+    except Exception as e:
+        log.warning("❌ Error fetching tags for %s: %s", artist, e)
+        return False
+    return _record_artist_tags(artist, tags)
+
+def _era_learning_job(artist: str):
+    try:
+        learn_artist_eras(artist)
+    finally:
+        with _era_learning_lock:
+            _era_learning_queued.discard(artist)
+
+def queue_era_learning(artist: str) -> bool:
+    """Look an artist's tags up in the background; False if already queued"""
+    with _era_learning_lock:
+        if artist in _era_learning_queued:
+            return False
+        _era_learning_queued.add(artist)
+    _era_learning_executor.submit(_era_learning_job, artist)
+    return True
+
+def learn_unknown_artist_eras(artists: List[str]):
+    """
+    Fill era index gaps on the build path without waiting on Last.fm: tags already in the
+    response cache are used now, every other unknown artist is queued for background lookup.
+    """
+    client = get_lastfm_client()
+    if not client.enabled:
+        return
+    for artist in dict.fromkeys(artists):
+        if not artist or ERA_INDEX.is_settled(artist):
+            continue
+        tags = client.top_tags(artist, cached_only=True)
+        if tags is None:
+            queue_era_learning(artist)
+        else:
+            _record_artist_tags(artist, tags)
+
 def find_era_overlap(seed_artists: List[str]) -> Dict[str, float]:
     """
     Find overlapping eras between multiple artists with intelligent fallback.
     Returns weighted eras based on overlap strength.
+    Memoized per set of normalized artist names and era index version.
     """
     if not seed_artists:
         return {}
     
-    print(f"🎵 Analyzing era overlap for artists: {seed_artists}")
+    artist_keys = frozenset(normalize_artist_name(a) for a in seed_artists)
+    return dict(_era_overlap(artist_keys, ERA_INDEX.version))
+
+@lru_cache(maxsize=4096)
+def _era_overlap(artist_keys: frozenset, index_version: int) -> Tuple[Tuple[str, float], ...]:
+    # index_version is only part of the cache key: entries from older index versions are never hit again
+    names = sorted(ERA_INDEX.display_name(k) for k in artist_keys)
+    log.debug("🎵 Analyzing era overlap for artists: %s", names)
     
-    if len(seed_artists) == 1:
+    if len(artist_keys) == 1:
         # Single artist - use their primary eras with decreasing weights
-        artist = seed_artists[0]
-        eras = ARTIST_ERA_MAP.get(artist, [])
+        key = next(iter(artist_keys))
+        eras = ERA_INDEX.get_key(key)
         if not eras:
-            print(f"⚠️ Unknown artist: {artist}. Using current era.")
-            current_decade = f"{datetime.now().year//10*10}s"
-            return {current_decade: 1.0}
+            log.debug("⚠️ Unknown artist: %s. Using current era.", names[0])
+            return ((_current_decade(), 1.0),)
         
         # Weight recent eras higher for single artists
         era_weights = {}
         for i, era in enumerate(reversed(eras)):  # Start from most recent
             era_weights[era] = 1.0 - (i * 0.2)  # Decreasing weight
-        print(f"✅ Single artist era weights: {era_weights}")
-        return era_weights
+        log.debug("✅ Single artist era weights: %s", era_weights)
+        return tuple(era_weights.items())
     
     # Multiple artists - find overlaps
     artist_eras = []
-    for artist in seed_artists:
-        eras = ARTIST_ERA_MAP.get(artist, [])
+    for key in artist_keys:
+        eras = ERA_INDEX.get_key(key)
         if eras:
             artist_eras.append(set(eras))
-            print(f"  📅 {artist}: {eras}")
+            log.debug("  📅 %s: %s", ERA_INDEX.display_name(key), list(eras))
         else:
-            print(f"  ⚠️ Unknown artist: {artist}")
+            log.debug("  ⚠️ Unknown artist: %s", ERA_INDEX.display_name(key))
     
     if not artist_eras:
-        current_decade = f"{datetime.now().year//10*10}s"
-        return {current_decade: 1.0}
+        return ((_current_decade(), 1.0),)
     
     # Find intersection of all artists
     overlap = set.intersection(*artist_eras)
     
     if overlap:
         # Strong overlap found - weight these eras highly
-        print(f"✅ Perfect era overlap found: {overlap}")
-        return {era: 1.0 for era in overlap}
+        log.debug("✅ Perfect era overlap found: %s", overlap)
+        return tuple((era, 1.0) for era in sorted(overlap))
     
     # No perfect overlap - find the most common eras
     era_count = Counter()
@@ -365,25 +395,24 @@ def find_era_overlap(seed_artists: List[str]) -> Dict[str, float]:
         max_count = max(era_count.values())
         # Weight eras by how many artists share them
         era_weights = {}
-        for era, count in era_count.items():
+        for era, count in sorted(era_count.items()):
             if count >= 2:  # At least 2 artists share this era
                 era_weights[era] = count / max_count
-            elif len(seed_artists) <= 2:  # For 2 artists, include individual eras with lower weight
+            elif len(artist_keys) <= 2:  # For 2 artists, include individual eras with lower weight
                 era_weights[era] = 0.3
         
         if era_weights:
-            print(f"✅ Partial era overlap: {era_weights}")
-            return era_weights
+            log.debug("✅ Partial era overlap: %s", era_weights)
+            return tuple(era_weights.items())
     
     # Last resort - treat each artist individually
-    print(f"⚠️ No era overlap found. Using individual artist eras.")
+    log.debug("⚠️ No era overlap found. Using individual artist eras.")
     era_weights = {}
-    for artist in seed_artists:
-        eras = ARTIST_ERA_MAP.get(artist, [])
-        for era in eras:
-            era_weights[era] = era_weights.get(era, 0) + (1.0 / len(seed_artists))
+    for key in artist_keys:
+        for era in ERA_INDEX.get_key(key):
+            era_weights[era] = era_weights.get(era, 0) + (1.0 / len(artist_keys))
     
-    return era_weights
+    return tuple(sorted(era_weights.items()))
 
 def get_genre_seed_artists(genre: str, limit: int = 3) -> List[str]:
     """Get seed artists for a genre when no favorite artist is provided"""
@@ -392,19 +421,19 @@ def get_genre_seed_artists(genre: str, limit: int = 3) -> List[str]:
     # Direct match
     if genre_clean in GENRE_ARTIST_SEEDS:
         artists = GENRE_ARTIST_SEEDS[genre_clean][:limit]
-        print(f"🎵 Found genre seed artists for '{genre}': {artists}")
+        log.debug("🎵 Found genre seed artists for '%s': %s", genre, artists)
         return artists
     
     # Fuzzy matching
     for genre_key, artists in GENRE_ARTIST_SEEDS.items():
         if genre_clean in genre_key or genre_key in genre_clean:
             selected = artists[:limit]
-            print(f"🎵 Fuzzy matched '{genre}' to '{genre_key}': {selected}")
+            log.debug("🎵 Fuzzy matched '%s' to '%s': %s", genre, genre_key, selected)
             return selected
     
     # Default fallback to pop
     fallback = GENRE_ARTIST_SEEDS["pop"][:limit]
-    print(f"⚠️ No genre match for '{genre}', using pop artists: {fallback}")
+    log.warning("⚠️ No genre match for '%s', using pop artists: %s", genre, fallback)
     return fallback
 
 def get_similar_artists(artist_name: str, limit: int = 10) -> List[str]:
@@ -416,9 +445,11 @@ def get_recommendations(seed_artists: Optional[List[str]] = None,
                        birth_year: Optional[int] = None,
                        era_weights: Optional[Dict[str, float]] = None,
                        limit: int = 20,
-                       return_artists_only: bool = False) -> List[Dict]:
+                       return_artists_only: bool = False,
+                       deadline: Optional[float] = None) -> List[Dict]:
     """
-    Enhanced recommendation system with Last.fm integration and era overlap logic
+    Enhanced recommendation system with Last.fm integration and era overlap logic.
+    Last.fm lookups fan out concurrently; `deadline` (time.monotonic) bounds the whole stage.
     """
     # Handle string input for seed_artists
     if isinstance(seed_artists, str):
@@ -427,20 +458,21 @@ def get_recommendations(seed_artists: Optional[List[str]] = None,
     # If no seed artists provided, get them from genre
     if not seed_artists:
         seed_artists = get_genre_seed_artists(genre, limit=2)
-        print(f"🎵 No seed artists provided, using genre-based seeds: {seed_artists}")
+        log.debug("🎵 No seed artists provided, using genre-based seeds: %s", seed_artists)
     
-    print(f"🎵 Getting recommendations for artists: {seed_artists}")
-    print(f"🎼 Genre: {genre}")
-    print(f"🎂 Birth year: {birth_year}")
+    log.debug("🎵 Getting recommendations for artists: %s", seed_artists)
+    log.debug("🎼 Genre: %s", genre)
+    log.debug("🎂 Birth year: %s", birth_year)
     
     # Use provided era weights or calculate them
     if not era_weights:
+        learn_unknown_artist_eras(seed_artists)
         era_weights = find_era_overlap(seed_artists)
         
         # If no artist-based eras and we have birth year, use age-based inference
         if not era_weights and birth_year:
             era_weights = infer_era_from_age(birth_year)
-            print(f"🎂 Using age-based era weights: {era_weights}")
+            log.debug("🎂 Using age-based era weights: %s", era_weights)
     
     # Default fallback for current trends
     if not era_weights:
@@ -449,20 +481,25 @@ def get_recommendations(seed_artists: Optional[List[str]] = None,
             era_weights = {"2020s": 1.0, "2010s": 0.7}
         else:
             era_weights = {"2010s": 1.0, "2000s": 0.8}
-        print(f"🔄 Using default era weights: {era_weights}")
+        log.debug("🔄 Using default era weights: %s", era_weights)
+    
+    # Get expanded artist list using Last.fm (seeds first, then similar artists in seed order)
+    similar_lists = fan_out(lambda a: get_lastfm_similar_artists(a, limit=3), seed_artists,
+                            deadline=deadline, default=[])
+    expanded_artists = list(dict.fromkeys(seed_artists))
+    for artist, similar in zip(seed_artists, similar_lists):
+        expanded_artists.extend(a for a in similar if a and a not in expanded_artists)
+        log.debug("🔗 Similar to %s: %s", artist, similar)
     
-    # Get expanded artist list using Last.fm
-    expanded_artists = set(seed_artists)
-    for artist in seed_artists:
-        similar = get_lastfm_similar_artists(artist, limit=3)
-        expanded_artists.update(similar)
-        print(f"🔗 Similar to {artist}: {similar}")
+    # Look each artist's eras up once instead of inside every scoring loop
+    learn_unknown_artist_eras(expanded_artists)
+    artist_era_lookup = {artist: get_artist_eras(artist) for artist in expanded_artists}
     
     # If return_artists_only is True, return artist list with scores
     if return_artists_only:
         artist_recommendations = []
         for artist in expanded_artists:
-            artist_eras = ARTIST_ERA_MAP.get(artist, [f"{datetime.now().year//10*10}s"])
+            artist_eras = artist_era_lookup[artist]
             max_score = 0
             best_era = None
             
@@ -486,12 +523,20 @@ def get_recommendations(seed_artists: Optional[List[str]] = None,
     # Get track recommendations
     recommendations = []
     tracks_per_artist = max(1, limit // max(len(expanded_artists), 1))
+    similar_only = [a for a in expanded_artists if a not in seed_artists]
+    
+    # Fetch every artist's top tracks at once; seeds get a slightly bigger share
+    fetch_plan = [(a, tracks_per_artist + 1) for a in seed_artists] + \
+                 [(a, max(1, tracks_per_artist // 2)) for a in similar_only]
+    fetched = fan_out(lambda job: get_lastfm_top_tracks(job[0], limit=job[1]), fetch_plan,
+                      deadline=deadline, default=[])
+    seed_track_lists = fetched[:len(seed_artists)]
+    similar_track_lists = fetched[len(seed_artists):]
     
     # Get tracks from seed artists (higher priority)
-    for artist in seed_artists:
-        tracks = get_lastfm_top_tracks(artist, limit=tracks_per_artist + 1)
+    for tracks in seed_track_lists:
         for track_name, artist_name in tracks:
-            artist_eras = ARTIST_ERA_MAP.get(artist_name, [f"{datetime.now().year//10*10}s"])
+            artist_eras = artist_era_lookup.get(artist_name) or get_artist_eras(artist_name)
             for era in artist_eras:
                 era_weight = era_weights.get(era, 0.1)
                 genre_match = 1.0 if genre.lower() in track_name.lower() else 0.8
@@ -509,10 +554,9 @@ def get_recommendations(seed_artists: Optional[List[str]] = None,
                 })
     
     # Get tracks from similar artists
-    for artist in expanded_artists - set(seed_artists):
-        tracks = get_lastfm_top_tracks(artist, limit=max(1, tracks_per_artist // 2))
+    for tracks in similar_track_lists:
         for track_name, artist_name in tracks:
-            artist_eras = ARTIST_ERA_MAP.get(artist_name, [f"{datetime.now().year//10*10}s"])
+            artist_eras = artist_era_lookup.get(artist_name) or get_artist_eras(artist_name)
             for era in artist_eras:
                 era_weight = era_weights.get(era, 0.1)
                 genre_match = 1.0 if genre.lower() in track_name.lower() else 0.8
@@ -541,9 +585,10 @@ def get_recommendations(seed_artists: Optional[List[str]] = None,
     
     unique_recommendations.sort(key=lambda x: x["score"], reverse=True)
     
-    print(f"🎯 Top recommendations:")
+    log.debug("🎯 Top recommendations:")
     for i, rec in enumerate(unique_recommendations[:min(10, len(unique_recommendations))]):
-        print(f"  {i+1}. {rec['artist']} - {rec['track']} (Era: {rec['era']}, Score: {rec['score']}, Source: {rec['source']})")
+        log.debug("  %s. %s - %s (Era: %s, Score: %s, Source: %s)",
+                  i + 1, rec['artist'], rec['track'], rec['era'], rec['score'], rec['source'])
     
     return unique_recommendations[:limit]
 
@@ -574,56 +619,17 @@ def infer_era_from_age(birth_year: int) -> Dict[str, float]:
 
 def get_lastfm_track_info(artist: str, track: str) -> Optional[Dict]:
     """Get detailed track information from Last.fm"""
-    if not LASTFM_API_KEY:
+    client = get_lastfm_client()
+    if not client.enabled:
         return None
     
-    url = "https://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "track.getInfo",
-        "artist": artist.strip(),
-        "track": track.strip(),
-        "api_key": LASTFM_API_KEY,
-        "format": "json"
-    }
-    
     try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        if res.status_code == 200:
-            data = res.json()
-            if "error" not in data and "track" in data:
-                track_data = data["track"]
-                return {
-                    "name": track_data.get("name"),
-                    "artist": track_data.get("artist", {}).get("name"),
-                    "playcount": int(track_data.get("playcount", 0)),
-                    "listeners": int(track_data.get("listeners", 0)),
-                    "tags": [tag.get("name") for tag in track_data.get("toptags", {}).get("tag", [])],
-                    "duration_ms": int(track_data.get("duration", 0))
-                }
+        return client.track_info(artist, track)
     except Exception as e:
-        print(f"❌ Error getting track info: {e}")
+        log.warning("❌ Error getting track info: %s", e)
     
     return None
 
 def test_lastfm_connection():
     """Test function to verify Last.fm API is working"""
-    print("🧪 Testing Last.fm API connection...")
-    
-    if not LASTFM_API_KEY:
-        print("❌ No LASTFM_API_KEY found!")
-        return False
-    
-    # Test with a very simple, guaranteed artist
-    test_artists = ["Beatles", "Taylor Swift", "Drake"]
-    
-    for artist in test_artists:
-        print(f"\n🎯 Testing with: {artist}")
-        similar = get_similar_artists(artist, limit=2)
-        if similar:
-            print(f"✅ Success! Found similar artists: {similar}")
-            return True
-        else:
-            print(f"❌ Failed for {artist}")
-    
-    print("❌ All Last.fm tests failed!")
-    return False
\ No newline at end of file
+    return get_lastfm_client().test_connection()
@@ -1,6 +1,5 @@
 import os
 import json
-import logging
 import requests
 import urllib.parse
 import time
@@ -19,7 +18,11 @@ from firebase_admin_init import db
 
 # Now import other modules
 from moodque_engine import build_smart_playlist_enhanced
+from build_result import BuildResult
+from moodque_logging import LazyFields, LazyJSON, RequestSummary, configure_logging, get_logger
 from tracking import track_interaction
+from spotify_client import spotify_request
+from token_provider import get_system_token_provider, get_user_token_provider
 from moodque_utilities import (
     get_spotify_access_token,
     get_user_tokens,
@@ -36,7 +39,26 @@ def prepare_response_data(row_id, playlist_info, user_id=None, processing_time_s
     if processing_time_start:
         processing_duration = round((datetime.now() - processing_time_start).total_seconds(), 2)
 
-    if playlist_info and isinstance(playlist_info, str):
+    if isinstance(playlist_info, BuildResult):
+        response_data = {
+            "row_id": row_id,
+            "user_id": user_id or "unknown",
+            "has_code": "true",
+            "playlist_id": playlist_info.playlist_id,
+            "spotify_url": playlist_info.url,
+            "track_count": str(playlist_info.track_count),
+            "duration_minutes": playlist_info.duration_minutes,
+            "duration_partial": str(playlist_info.duration_partial).lower(),
+            "spotify_code_url": playlist_info.spotify_code_url,
+            "status": "completed",
+            "error_message": "",
+            "processing_time_seconds": processing_duration,
+            "created_at": datetime.now().isoformat(),
+            "play_count": 0,
+            "like_count": 0,
+            "share_count": 0
+        }
+    elif playlist_info and isinstance(playlist_info, str):
         playlist_id = playlist_info.split('/')[-1] if '/' in playlist_info else ""
         response_data = {
             "row_id": row_id,
@@ -89,15 +111,25 @@ def prepare_response_data(row_id, playlist_info, user_id=None, processing_time_s
             "share_count": 0
         }
 
-    logger.info(f"📦 Prepared response data: {json.dumps(response_data, indent=2)}")
+    logger.debug("📦 Prepared response data: %s", LazyJSON(response_data, indent=2))
     return response_data
 
 # --- Setup ---
 app = Flask(__name__)
-logger = logging.getLogger("moodQueSocial_webhook")
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+configure_logging()
+logger = get_logger("moodQueSocial_webhook")
 app.register_blueprint(auth_bp)
 
+# Keep genre-only candidate pools warm in the background (opt-in)
+from genre_pools import GENRE_POOLS_ENABLED, start_genre_pool_refresher
+if GENRE_POOLS_ENABLED:
+    start_genre_pool_refresher()
+
+# Refresh recently active users' tokens ahead of expiry (opt-in)
+from token_refresher import TOKEN_REFRESHER_ENABLED, start_token_refresher, get_token_refresher
+if TOKEN_REFRESHER_ENABLED:
+    start_token_refresher()
+
 # --- FIXED SPOTIFY OAUTH CALLBACK ---
 # Updated Spotify OAuth callback in moodQueSocial_webhook_service.py
 # Replace the existing callback function with this updated version
@@ -208,7 +240,7 @@ def spotify_callback():
     
     try:
         print("🔄 Exchanging code for tokens...")
-        token_resp = requests.post(token_url, headers=token_headers, data=token_payload, timeout=10)
+        token_resp = spotify_request("POST", token_url, headers=token_headers, data=token_payload, timeout=10)
         
         if token_resp.status_code != 200:
             print(f"❌ Token exchange failed: {token_resp.status_code}")
@@ -245,8 +277,8 @@ def spotify_callback():
             "Content-Type": "application/json"
         }
         
-        profile_resp = requests.get(
-            "https://api.spotify.com/v1/me",
+        profile_resp = spotify_request(
+            "GET", "https://api.spotify.com/v1/me",
             headers=profile_headers,
             timeout=10
         )
@@ -361,8 +393,15 @@ def spotify_callback():
             }
             
             db.collection("users").document(spotify_user_id).set(user_doc, merge=True)
+            get_user_token_provider().remember(spotify_user_id, access_token, time.time() + expires_in,
+                                                spotify_user_id=spotify_user_id)
             print(f"✅ User data saved: {spotify_user_id}")
             
+            # First taste snapshot, fetched off the request with the token we just got
+            from taste_snapshots import get_taste_snapshot_store
+            get_taste_snapshot_store().refresh_in_background(
+                spotify_user_id, {"Authorization": f"Bearer {access_token}"})
+            
         except Exception as e:
             print(f"❌ Firebase save failed: {e}")
             webhook_data["jsonBody"]["error_message"] += f" | Firebase error: {str(e)}"
@@ -509,7 +548,7 @@ def spotify_connection_status():
 @app.route('/glide_social', methods=['POST'])
 def glide_social():
     data = request.get_json()
-    logger.info(f"📥 Glide social data received: {json.dumps(data, indent=2)}")
+    logger.debug("📥 Glide social data received: %s", LazyJSON(data, indent=2))
 
     # Extract row_id more thoroughly and DO NOT generate fallback
     row_id = None
@@ -565,9 +604,8 @@ def glide_social():
         }
         return jsonify(error_response), 400
     
-    logger.info(f"🔑 Found row_id: {row_id}")
-    
     user_id = data.get("user_id") or data.get("userId") or "anonymous"
+    summary = RequestSummary(logger, "glide_social", row_id, user_id=user_id)
     
     # Handle nested data structure if present
     body_data = data.get("body", {}) if isinstance(data.get("body"), dict) else {}
@@ -587,6 +625,7 @@ def glide_social():
     playlist_type = data.get("playlist_type", body_data.get("playlist_type", "clean"))
     birth_year = data.get("birth_year") or body_data.get("birth_year")
     search_keywords = data.get("search_keywords") or body_data.get("search_keywords")
+    curation_strategy = data.get("curation_strategy") or body_data.get("curation_strategy")
     
     # Get webhook URL properly
     webhook_return_url = (data.get("webhook_return_url") or 
@@ -594,19 +633,14 @@ def glide_social():
                          os.environ.get("GLIDE_RETURN_WEBHOOK_URL"))
 
     # Log all extracted parameters for debugging
-    logger.info(f"🔍 Extracted parameters:")
-    logger.info(f"  row_id: {row_id}")
-    logger.info(f"  user_id: {user_id}")
-    logger.info(f"  genre: {genre}")
-    logger.info(f"  artist: {artist}")
-    logger.info(f"  mood: {mood}")
-    logger.info(f"  event: {event}")
-    logger.info(f"  time: {time_duration}")
-    logger.info(f"  playlist_type: {playlist_type}")
-    logger.info(f"  birth_year: {birth_year}")
+    logger.debug("🔍 Extracted parameters: %s", LazyFields({
+        "row_id": row_id, "user_id": user_id, "genre": genre, "artist": artist, "mood": mood,
+        "event": event, "time": time_duration, "playlist_type": playlist_type,
+        "birth_year": birth_year, "curation_strategy": curation_strategy
+    }))
+    summary.update(genre=genre, time=time_duration, playlist_type=playlist_type)
 
     processing_start = datetime.now()
-    track_count = 0
 
     try:
         # Pass the exact row_id from Glide as request_id
@@ -621,25 +655,15 @@ def glide_social():
             playlist_type=playlist_type,
             request_id=row_id,
             birth_year=birth_year,
-            streaming_service="spotify"
+            streaming_service="spotify",
+            curation_strategy=curation_strategy
         )
         
         if playlist_result:
-            logger.info(f"✅ Playlist created: {playlist_result}")
-            try:
-                # Get actual track count from Spotify
-                from moodque_auth import get_spotify_access_token
-                token = get_spotify_access_token()
-                headers = {"Authorization": f"Bearer {token}"}
-                playlist_id = playlist_result.split('/')[-1]
-                playlist_url = f"https://api.spotify.com/v1/playlists/{playlist_id}"
-                response = requests.get(playlist_url, headers=headers)
-                if response.status_code == 200:
-                    playlist_data = response.json()
-                    track_count = playlist_data.get("tracks", {}).get("total", 0)
-                    logger.info(f"📊 Actual track count from Spotify: {track_count}")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not fetch track count: {e}")
+            # Track count, duration and stage timings come with the result - no Spotify round trip
+            summary.update(playlist_id=playlist_result.playlist_id, track_count=playlist_result.track_count,
+                           duration_minutes=playlist_result.duration_minutes,
+                           stages={stage: stats.get("seconds") for stage, stats in playlist_result.stage_stats.items()})
         else:
             logger.error(f"❌ Playlist creation returned None")
         
@@ -647,6 +671,7 @@ def glide_social():
         logger.error(f"❌ Playlist creation failed: {e}")
         import traceback
         traceback.print_exc()
+        summary.update(error=str(e))
         playlist_result = None
 
     # Use the exact row_id from Glide in response
@@ -654,33 +679,33 @@ def glide_social():
         row_id=row_id,
         playlist_info=playlist_result,
         user_id=user_id,
-        processing_time_start=processing_start,
-        track_count=track_count
+        processing_time_start=processing_start
     )
 
     # Post response back to Glide webhook if available
     if webhook_return_url:
         try:
-            logger.info(f"📤 Sending playlist result to Glide return webhook: {webhook_return_url}")
-            logger.info(f"🔑 Response data row_id: {response_data.get('row_id')}")
+            logger.debug("📤 Sending playlist result for row %s to Glide return webhook: %s", row_id, webhook_return_url)
             post_response = post_data_back_to_glide(webhook_return_url, response_data)
-            if post_response and post_response.status_code == 200:
-                logger.info("✅ Successfully posted to Glide webhook")
-            else:
+            summary.update(glide_webhook=post_response.status_code if post_response else "no response")
+            if not post_response or post_response.status_code != 200:
                 logger.warning(f"⚠️ Glide webhook returned status: {post_response.status_code if post_response else 'no response'}")
         except Exception as e:
+            summary.update(glide_webhook="error")
             logger.error(f"❌ Failed to send to Glide webhook: {e}")
 
+    summary.finish(status=response_data["status"])
     return jsonify(response_data)
 
 # --- Legacy Playlist Builder ---
 @app.route('/webhook', methods=['POST'])
 def playlist_webhook():
     data = request.get_json()
-    logger.info(f"📥 Legacy webhook data received: {json.dumps(data, indent=2)}")
+    logger.debug("📥 Legacy webhook data received: %s", LazyJSON(data, indent=2))
     
     row_id = data.get("row_id")
     user_id = data.get("user_id")
+    summary = RequestSummary(logger, "webhook", row_id, user_id=user_id)
     genre = data.get("genre")
     artist = data.get("artist")
     mood = data.get("mood")
@@ -691,7 +716,7 @@ def playlist_webhook():
     processing_start = datetime.now()
 
     try:
-        playlist_url = build_smart_playlist_enhanced(
+        playlist_result = build_smart_playlist_enhanced(
             event_name=event or "My Playlist",
             genre=genre,
             time=time_duration,
@@ -703,22 +728,25 @@ def playlist_webhook():
             request_id=row_id
         )
         
-        logger.info(f"✅ Legacy playlist created: {playlist_url}")
+        if playlist_result:
+            summary.update(playlist_id=playlist_result.playlist_id, track_count=playlist_result.track_count)
         
     except Exception as e:
         logger.error(f"❌ Legacy playlist build failed: {e}")
         import traceback
         traceback.print_exc()
-        playlist_url = None
+        summary.update(error=str(e))
+        playlist_result = None
 
-    response_data = prepare_response_data(row_id, playlist_url, user_id=user_id, processing_time_start=processing_start)
+    response_data = prepare_response_data(row_id, playlist_result, user_id=user_id, processing_time_start=processing_start)
+    summary.finish(status=response_data["status"])
     return jsonify(response_data)
 
 # --- Social Interaction Tracker ---
 @app.route("/track", methods=["POST"])
 def track_event():
     payload = request.get_json()
-    logger.info(f"📊 Tracking event: {json.dumps(payload, indent=2)}")
+    logger.debug("📊 Tracking event: %s", LazyJSON(payload, indent=2))
     
     try:
         track_interaction(
@@ -735,7 +763,7 @@ def track_event():
 @app.route('/feedback', methods=['POST'])
 def ml_feedback():
     payload = request.get_json()
-    logger.info(f"🤖 ML feedback received: {json.dumps(payload, indent=2)}")
+    logger.debug("🤖 ML feedback received: %s", LazyJSON(payload, indent=2))
     
     try:
         result = record_ml_feedback(payload)
@@ -975,7 +1003,7 @@ def health_detailed():
             from moodque_auth import get_spotify_access_token
             token = get_spotify_access_token()
             headers = {"Authorization": f"Bearer {token}"}
-            res = requests.get("https://api.spotify.com/v1/me", headers=headers, timeout=5)
+            res = spotify_request("GET", "https://api.spotify.com/v1/me", headers=headers, timeout=5)
             if res.status_code in [200, 401]:  # 401 is expected for app tokens
                 health_status["components"]["spotify_api"] = "healthy"
             else:
@@ -995,6 +1023,52 @@ def health_detailed():
         except Exception as e:
             health_status["components"]["lastfm_api"] = f"error: {str(e)}"
         
+        # Last.fm response cache hit/miss counters
+        try:
+            from lastfm_client import get_lastfm_client
+            health_status["components"]["lastfm_cache"] = get_lastfm_client().cache_stats()
+            health_status["components"]["lastfm_rate_limit"] = get_lastfm_client().rate_limit_stats()
+        except Exception as e:
+            health_status["components"]["lastfm_cache"] = f"error: {str(e)}"
+        
+        try:
+            from artist_graph import get_artist_graph
+            health_status["components"]["artist_graph"] = get_artist_graph().stats()
+        except Exception as e:
+            health_status["components"]["artist_graph"] = f"error: {str(e)}"
+        
+        try:
+            from spotify_client import get_spotify_scheduler
+            health_status["components"]["spotify_rate_limit"] = get_spotify_scheduler().stats()
+        except Exception as e:
+            health_status["components"]["spotify_rate_limit"] = f"error: {str(e)}"
+        
+        try:
+            from moodque_utilities import spotify_breakers
+            health_status["components"]["spotify_circuit_breakers"] = spotify_breakers.stats()
+        except Exception as e:
+            health_status["components"]["spotify_circuit_breakers"] = f"error: {str(e)}"
+        
+        try:
+            from genre_pools import get_genre_pool_store
+            health_status["components"]["genre_pools"] = get_genre_pool_store().stats()
+        except Exception as e:
+            health_status["components"]["genre_pools"] = f"error: {str(e)}"
+        
+        try:
+            from taste_snapshots import get_taste_snapshot_store
+            health_status["components"]["taste_snapshots"] = get_taste_snapshot_store().stats()
+        except Exception as e:
+            health_status["components"]["taste_snapshots"] = f"error: {str(e)}"
+        
+        try:
+            health_status["components"]["system_token"] = get_system_token_provider().stats()
+            health_status["components"]["user_tokens"] = get_user_token_provider().stats()
+            if TOKEN_REFRESHER_ENABLED:
+                health_status["components"]["token_refresher"] = get_token_refresher().stats()
+        except Exception as e:
+            health_status["components"]["system_token"] = f"error: {str(e)}"
+        
         status_code = 200 if health_status["overall_status"] == "healthy" else 503
         return jsonify(health_status), status_code
         
@@ -1141,6 +1215,7 @@ def disconnect_spotify():
                 "spotify_connected": False,
                 "disconnected_at": datetime.now().isoformat()
             })
+            get_user_token_provider().invalidate(user_doc.id)
             
             logger.info(f"✅ Disconnected Spotify for user: {user_email}")
             
@@ -1764,8 +1839,8 @@ def approve_pending_user(user_email):
             }), 400
         
         print(f"🔄 Testing profile access for {user_email}")
-        profile_resp = requests.get(
-            "https://api.spotify.com/v1/me",
+        profile_resp = spotify_request(
+            "GET", "https://api.spotify.com/v1/me",
             headers={"Authorization": f"Bearer {access_token}"},
             timeout=10
         )
@@ -1888,8 +1963,8 @@ def retry_all_pending_users():
                     results["errors"].append({"email": user_email, "error": "No access token"})
                     continue
                 
-                profile_resp = requests.get(
-                    "https://api.spotify.com/v1/me",
+                profile_resp = spotify_request(
+                    "GET", "https://api.spotify.com/v1/me",
                     headers={"Authorization": f"Bearer {access_token}"},
                     timeout=5
                 )
@@ -15,6 +15,8 @@ load_dotenv()
 from flask import Blueprint, request, jsonify, redirect
 import firebase_admin
 from firebase_admin import credentials, firestore
+from spotify_client import spotify_request, SPOTIFY_TOKEN_URL
+from token_provider import get_system_access_token
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -67,25 +69,9 @@ db = firestore.client()
 
 def get_spotify_access_token():
     """
-    Fetches a new access token using the app's stored refresh token.
+    The app account's access token, shared process-wide by token_provider.
     """
-    auth_header = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
-    headers = {
-        "Authorization": f"Basic {auth_header}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    data = {
-        "grant_type": "refresh_token",
-        "refresh_token": SPOTIFY_REFRESH_TOKEN
-    }
-    response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
-
-    if response.status_code != 200:
-        print("❌ Failed to refresh app access token", response.text)
-        raise Exception("Spotify token refresh failed")
-
-    token_info = response.json()
-    return token_info["access_token"]
+    return get_system_access_token()
 
 def refresh_token_with_spotify(refresh_token):
     """
@@ -102,7 +88,7 @@ def refresh_token_with_spotify(refresh_token):
         "refresh_token": refresh_token
     }
 
-    response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
+    response = spotify_request("POST", SPOTIFY_TOKEN_URL, headers=headers, data=data)
     if response.status_code != 200:
         print("❌ Failed to refresh user token", response.text)
         raise Exception("Spotify user token refresh failed")
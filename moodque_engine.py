@@ -10,7 +10,13 @@ def get_user_id_from_spotify_id(spotify_user_id):
         return doc.id
     return None
 
-from lastfm_recommender import get_recommendations, get_similar_artists, get_genre_seed_artists, search_tracks_by_artist
+from lastfm_recommender import (
+    get_recommendations, get_similar_artists, get_genre_seed_artists,
+    search_tracks_by_artist, search_tracks_by_artist_async
+)
+from lastfm_client import fan_out, deadline_after, LASTFM_DISCOVERY_DEADLINE
+from async_clients import run_coroutine, get_async_spotify_client, get_async_lastfm_client
+from build_result import BuildResult
 
 import os
 import requests
@@ -18,8 +24,8 @@ import base64
 import random
 import uuid
 import json
-import traceback
 import time
+import asyncio
 import hashlib
 from datetime import datetime, timedelta
 from collections import defaultdict
@@ -32,14 +38,32 @@ from firebase_admin_init import db
 # Import tracking
 from tracking import track_interaction
 
+# Level-gated logging for per-track events
+from moodque_logging import LazyFields, get_logger, log_track_event
+
+# Cached app and user tokens (and their Spotify user IDs)
+from token_provider import get_system_token_provider, get_user_token_provider
+
+# Precomputed candidates for genre-only builds
+from genre_pools import get_genre_pool
+from taste_snapshots import get_taste_seed_artists
+
+# Import curation strategies
+from curation_strategies import (
+    DEFAULT_CURATION_STRATEGY,
+    get_curation_strategy
+)
+
 # Import utilities
 from moodque_utilities import (
     get_valid_access_token,
-    get_spotify_user_id,
     create_new_playlist,
     add_tracks_to_playlist,
     calculate_playlist_duration,
-    search_spotify_track_ultra_robust
+    search_spotify_track_ultra_robust,
+    cached_track_durations,
+    remember_track_metadata,
+    spotify_breakers
 )
 
 # Load .env only in local dev
@@ -51,10 +75,18 @@ if os.environ.get("RAILWAY_ENVIRONMENT") is None:
     except ImportError:
         logging.warning("⚠️ dotenv not installed – skipping .env load")
 
+log = get_logger("moodque.engine")
+
 client_id = os.getenv("SPOTIFY_CLIENT_ID")
 client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
 refresh_token = os.getenv("SPOTIFY_REFRESH_TOKEN")
 
+# Run discovery and Spotify resolution on the asyncio engine loop (httpx, HTTP/2)
+ENGINE_ASYNC_ENABLED = os.getenv("ENGINE_ASYNC_ENABLED", "false").lower() == "true"
+
+# Firestore allows 500 writes per batch
+TRACK_CACHE_BATCH_SIZE = int(os.getenv("TRACK_CACHE_BATCH_SIZE", "400"))
+
 # OFFICIAL SPOTIFY GENRE SEEDS (verified working)
 SPOTIFY_VALID_GENRES = [
     "acoustic", "afrobeat", "alt-rock", "alternative", "ambient", "anime", 
@@ -120,8 +152,13 @@ class TrackCache:
         key_string = f"{service}_{artist_clean}_{track_clean}"
         return hashlib.md5(key_string.encode()).hexdigest()
     
-    def get_track_id(self, artist, track, service="spotify"):
-        """Get cached track ID if it exists"""
+    def get_track_id(self, artist, track, service="spotify", playlist_type=None):
+        """Get cached track ID if it exists, preferring the clean/explicit variant the playlist needs"""
+        entry = self.get_track_entry(artist, track, service, playlist_type)
+        return entry["track_id"] if entry else None
+    
+    def get_track_entry(self, artist, track, service="spotify", playlist_type=None):
+        """Cached {"track_id", "duration_ms"} for a track, or None; duration_ms is None for older entries"""
         try:
             cache_key = self._get_cache_key(artist, track, service)
             doc_ref = db.collection(self.cache_collection).document(cache_key)
@@ -134,13 +171,15 @@ class TrackCache:
                 if cached_date:
                     cached_datetime = datetime.fromisoformat(cached_date)
                     if datetime.now() - cached_datetime < timedelta(days=30):
-                        print(f"💾 Cache HIT: {artist} - {track} ({service})")
-                        return cache_data.get("track_id")
+                        track_id = self._pick_variant(cache_data, playlist_type)
+                        if track_id:
+                            log_track_event(log, "💾 Cache HIT: %s - %s (%s)", artist, track, service)
+                            return {"track_id": track_id, "duration_ms": cache_data.get("duration_ms")}
             
             return None
             
         except Exception as e:
-            print(f"❌ Cache read error: {e}")
+            log.warning("❌ Cache read error: %s", e)
             return None
     
     def store_track_id(self, artist, track, track_id, service="spotify"):
@@ -157,154 +196,79 @@ class TrackCache:
             }
             
             db.collection(self.cache_collection).document(cache_key).set(cache_data)
-            print(f"💾 Cache STORE: {artist} - {track} ({service})")
+            log_track_event(log, "💾 Cache STORE: %s - %s (%s)", artist, track, service)
             
         except Exception as e:
-            print(f"❌ Cache store error: {e}")
-
-class SmartTrackCurator:
-    """Curates tracks based on mood, valence, and playlist requirements before streaming service search"""
-    
-    # Mood to musical characteristics mapping
-    MOOD_CHARACTERISTICS = {
-        "happy": {"energy": "high", "valence": "positive", "tempo": "upbeat"},
-        "energetic": {"energy": "very_high", "valence": "positive", "tempo": "fast"},
-        "hype": {"energy": "very_high", "valence": "very_positive", "tempo": "very_fast"},
-        "party": {"energy": "very_high", "valence": "very_positive", "tempo": "danceable"},
-        "workout": {"energy": "high", "valence": "positive", "tempo": "driving"},
-        "chill": {"energy": "low", "valence": "neutral", "tempo": "slow"},
-        "relaxed": {"energy": "very_low", "valence": "positive", "tempo": "slow"},
-        "calm": {"energy": "very_low", "valence": "neutral", "tempo": "very_slow"},
-        "focus": {"energy": "low", "valence": "neutral", "tempo": "steady"},
-        "romantic": {"energy": "low", "valence": "positive", "tempo": "slow"},
-        "melancholy": {"energy": "low", "valence": "negative", "tempo": "slow"},
-        "sad": {"energy": "very_low", "valence": "negative", "tempo": "slow"},
-        "upbeat": {"energy": "high", "valence": "positive", "tempo": "fast"},
-        "groovy": {"energy": "medium", "valence": "positive", "tempo": "rhythmic"}
-    }
-    
-    # Genre characteristics
-    GENRE_CHARACTERISTICS = {
-        "grunge": {"energy": "high", "rawness": "high", "era_weight": 1.5},
-        "alternative": {"energy": "medium", "complexity": "high", "era_weight": 1.3},
-        "rock": {"energy": "high", "intensity": "high", "era_weight": 1.2},
-        "pop": {"energy": "medium", "accessibility": "high", "era_weight": 1.0},
-        "hip-hop": {"energy": "high", "rhythm": "strong", "era_weight": 1.1},
-        "jazz": {"energy": "medium", "sophistication": "high", "era_weight": 1.4},
-        "electronic": {"energy": "high", "synthetic": "high", "era_weight": 0.9}
-    }
-    
-    def __init__(self, mood_tags, genre, time_minutes, playlist_type="clean"):
-        self.mood_tags = mood_tags.lower() if isinstance(mood_tags, str) else ""
-        self.genre = genre.lower() if genre else "alternative"
-        self.time_minutes = time_minutes
-        self.playlist_type = playlist_type
-        self.target_track_count = max(8, min(25, time_minutes // 2))  # 8-25 tracks based on time
-        
-    def score_track(self, track_info):
-        """Score a track based on mood, genre, and characteristics"""
-        score = 1.0
-        
-        # Base scoring
-        artist = track_info.get("artist", "").lower()
-        track_name = track_info.get("track", "").lower()
-        source = track_info.get("source", "")
-        
-        # Artist bonus (seed artists get priority)
-        if source == "artist_search":
-            score *= 1.5
-        
-        # Mood matching
-        mood_characteristics = self.MOOD_CHARACTERISTICS.get(self.mood_tags, {})
-        
-        # Energy level inference from track name
-        energy_keywords = {
-            "high": ["rock", "pump", "power", "energy", "wild", "crazy", "loud", "heavy"],
-            "low": ["soft", "quiet", "gentle", "calm", "peaceful", "slow", "rest"],
-            "medium": ["groove", "smooth", "easy", "flow", "steady"]
+            log.warning("❌ Cache store error: %s", e)
+
+    @staticmethod
+    def _pick_variant(cache_data, playlist_type):
+        """Entries written before variants were tracked carry no 'explicit' flag and always match"""
+        playlist_type = (playlist_type or "").lower()
+        if playlist_type in ("clean", "explicit"):
+            variant_id = cache_data.get(f"{playlist_type}_track_id")
+            if variant_id:
+                return variant_id
+            if "explicit" in cache_data and cache_data["explicit"] != (playlist_type == "explicit"):
+                return None
+        return cache_data.get("track_id")
+
+    def entry_from_search_item(self, item):
+        """Cache entry for a raw Spotify search item, keyed by its own artist and title"""
+        artists = item.get("artists") or []
+        if not item.get("uri") or not item.get("name") or not artists:
+            return None
+        return {
+            "artist": artists[0].get("name", ""),
+            "track": item["name"],
+            "track_id": item["uri"],
+            "explicit": bool(item.get("explicit")),
+            "duration_ms": item.get("duration_ms")
         }
-        
-        expected_energy = mood_characteristics.get("energy", "medium")
-        for energy_level, keywords in energy_keywords.items():
-            if any(keyword in track_name for keyword in keywords):
-                if energy_level == expected_energy:
-                    score *= 1.3
-                break
-        
-        # Genre matching
-        genre_characteristics = self.GENRE_CHARACTERISTICS.get(self.genre, {})
-        genre_weight = genre_characteristics.get("era_weight", 1.0)
-        score *= genre_weight
-        
-        # Special grunge characteristics
-        if self.genre == "grunge":
-            grunge_indicators = ["unplugged", "live", "acoustic", "raw", "demo"]
-            if any(indicator in track_name for indicator in grunge_indicators):
-                score *= 1.2
-        
-        # Valence (positivity) matching
-        expected_valence = mood_characteristics.get("valence", "neutral")
-        positive_words = ["love", "happy", "good", "great", "beautiful", "shine", "light"]
-        negative_words = ["pain", "hurt", "sad", "dark", "broken", "lost", "alone", "die"]
-        
-        if expected_valence in ["positive", "very_positive"]:
-            if any(word in track_name for word in positive_words):
-                score *= 1.2
-        elif expected_valence in ["negative"]:
-            if any(word in track_name for word in negative_words):
-                score *= 1.2
-        
-        # Avoid explicit content for clean playlists
-        explicit_indicators = ["explicit", "parental", "dirty", "fuck", "shit", "bitch"]
-        if self.playlist_type == "clean":
-            if any(indicator in track_name.lower() for indicator in explicit_indicators):
-                score *= 0.3
-        
-        # Randomization to avoid same tracks every time
-        score *= random.uniform(0.8, 1.2)
-        
-        return score
-    
-    def curate_tracks(self, all_tracks):
-        """Curate the best tracks for this playlist"""
-        print(f"🎯 Curating tracks for {self.mood_tags} {self.genre} playlist ({self.time_minutes} min)")
-        
-        # Score all tracks
-        scored_tracks = []
-        for track in all_tracks:
-            if isinstance(track, dict):
-                score = self.score_track(track)
-                track["curation_score"] = score
-                scored_tracks.append(track)
-        
-        # Sort by score
-        scored_tracks.sort(key=lambda x: x["curation_score"], reverse=True)
-        
-        # Artist diversity - don't have too many tracks from same artist
-        curated_tracks = []
-        artist_count = defaultdict(int)
-        max_per_artist = max(2, self.target_track_count // 8)  # Max 2-3 tracks per artist
-        
-        for track in scored_tracks:
-            artist = track.get("artist", "").lower()
-            
-            if artist_count[artist] < max_per_artist:
-                curated_tracks.append(track)
-                artist_count[artist] += 1
-                
-                if len(curated_tracks) >= self.target_track_count:
-                    break
-        
-        # If we don't have enough, fill with remaining tracks
-        if len(curated_tracks) < self.target_track_count:
-            remaining = [t for t in scored_tracks if t not in curated_tracks]
-            curated_tracks.extend(remaining[:self.target_track_count - len(curated_tracks)])
-        
-        print(f"🎵 Curated {len(curated_tracks)} tracks from {len(all_tracks)} candidates")
-        print(f"📊 Top artists: {list(dict.fromkeys([t.get('artist', 'Unknown')[:20] for t in curated_tracks[:5]]))}")
-        print(f"🎯 Average curation score: {sum(t['curation_score'] for t in curated_tracks) / len(curated_tracks):.2f}")
-        
-        return curated_tracks
+
+    def store_many(self, entries, service="spotify"):
+        """
+        Store several track IDs in one Firestore batch. Each entry is a dict with artist,
+        track and track_id, plus optional explicit/duration_ms. Writes merge, so the clean
+        and explicit versions of a title accumulate under the same key.
+        """
+        stored = 0
+        try:
+            batch = db.batch()
+            pending = 0
+            for entry in entries:
+                if not entry or not entry.get("artist") or not entry.get("track") or not entry.get("track_id"):
+                    continue
+                cache_key = self._get_cache_key(entry["artist"], entry["track"], service)
+                cache_data = {
+                    "artist": entry["artist"],
+                    "track": entry["track"],
+                    "track_id": entry["track_id"],
+                    "service": service,
+                    "cached_at": datetime.now().isoformat(),
+                    "cache_key": cache_key
+                }
+                if entry.get("explicit") is not None:
+                    cache_data["explicit"] = entry["explicit"]
+                    variant = "explicit" if entry["explicit"] else "clean"
+                    cache_data[f"{variant}_track_id"] = entry["track_id"]
+                if entry.get("duration_ms"):
+                    cache_data["duration_ms"] = entry["duration_ms"]
+
+                batch.set(db.collection(self.cache_collection).document(cache_key), cache_data, merge=True)
+                pending += 1
+                stored += 1
+                if pending == TRACK_CACHE_BATCH_SIZE:
+                    batch.commit()
+                    batch = db.batch()
+                    pending = 0
+            if pending:
+                batch.commit()
+            if stored:
+                log.debug("💾 Cache STORE: %s entries (%s)", stored, service)
+        except Exception as e:
+            log.error("❌ Cache batch store error: %s", e)
+        return stored
 
 class StreamingServiceAdapter:
     """Abstract adapter for streaming services (Spotify, YouTube Music, Apple Music)"""
@@ -317,6 +281,11 @@ class StreamingServiceAdapter:
         """Override in subclasses"""
         raise NotImplementedError
     
+    def resolve_track(self, artist, track, playlist_type="clean"):
+        """{"uri", "duration_ms"} for a track, or None; adapters that know durations override this"""
+        uri = self.search_track(artist, track, playlist_type)
+        return {"uri": uri, "duration_ms": None} if uri else None
+    
     def create_playlist(self, name, description, track_ids):
         """Override in subclasses"""
         raise NotImplementedError
@@ -330,21 +299,35 @@ class SpotifyAdapter(StreamingServiceAdapter):
     
     def search_track(self, artist, track, playlist_type="clean"):
         """Search for track on Spotify with caching"""
+        resolved = self.resolve_track(artist, track, playlist_type)
+        return resolved["uri"] if resolved else None
+    
+    def resolve_track(self, artist, track, playlist_type="clean"):
+        """Search with caching, keeping the duration the cache entry or search item carries"""
         # Check cache first
-        cached_id = self.cache.get_track_id(artist, track, "spotify")
-        if cached_id:
-            return cached_id
+        cached = self.cache.get_track_entry(artist, track, "spotify", playlist_type)
+        if cached:
+            return {"uri": cached["track_id"], "duration_ms": cached.get("duration_ms")}
         
         # Search Spotify
         try:
-            track_uri = search_spotify_track_ultra_robust(artist, track, self.headers, playlist_type, max_retries=1)
+            items = []
+            track_uri = search_spotify_track_ultra_robust(artist, track, self.headers, playlist_type,
+                                                          max_retries=1, harvest=items.extend)
+            
+            # Every returned item (twins, other versions) is cached under its own name,
+            # plus the pick under the name we searched for - all in one batch write
+            entries = [self.cache.entry_from_search_item(item) for item in items]
+            chosen = {}
+            if track_uri:
+                chosen = next((e for e in entries if e and e["track_id"] == track_uri), {})
+                entries.append({**chosen, "artist": artist, "track": track, "track_id": track_uri})
+            self.cache.store_many(entries, "spotify")
             
             if track_uri:
-                # Store in cache
-                self.cache.store_track_id(artist, track, track_uri, "spotify")
-                return track_uri
+                return {"uri": track_uri, "duration_ms": chosen.get("duration_ms")}
         except Exception as e:
-            print(f"❌ Spotify search error for {artist} - {track}: {e}")
+            log.warning("❌ Spotify search error for %s - %s: %s", artist, track, e)
         
         return None
     
@@ -353,11 +336,12 @@ class SpotifyAdapter(StreamingServiceAdapter):
         try:
             playlist_id = create_new_playlist(self.headers, user_id, name, description)
             if playlist_id and track_uris:
-                success = add_tracks_to_playlist(self.headers, user_id, playlist_id, track_uris)
+                # Freshly created playlist: nothing to read back before appending
+                success = add_tracks_to_playlist(self.headers, user_id, playlist_id, track_uris, existing_total=0)
                 if success:
                     return f"https://open.spotify.com/playlist/{playlist_id}"
         except Exception as e:
-            print(f"❌ Spotify playlist creation error: {e}")
+            log.error("❌ Spotify playlist creation error: %s", e)
         return None
 
 # Future adapters for other services
@@ -366,12 +350,12 @@ class YouTubeMusicAdapter(StreamingServiceAdapter):
     
     def search_track(self, artist, track, playlist_type="clean"):
         # TODO: Implement YouTube Music search
-        print(f"🎵 YouTube Music search: {artist} - {track} (Coming Soon)")
+        log.debug("🎵 YouTube Music search: %s - %s (Coming Soon)", artist, track)
         return None
     
     def create_playlist(self, name, description, track_ids):
         # TODO: Implement YouTube Music playlist creation
-        print(f"🎵 YouTube Music playlist creation (Coming Soon)")
+        log.debug("🎵 YouTube Music playlist creation (Coming Soon)")
         return None
 
 class AppleMusicAdapter(StreamingServiceAdapter):
@@ -379,12 +363,12 @@ class AppleMusicAdapter(StreamingServiceAdapter):
     
     def search_track(self, artist, track, playlist_type="clean"):
         # TODO: Implement Apple Music search
-        print(f"🎵 Apple Music search: {artist} - {track} (Coming Soon)")
+        log.debug("🎵 Apple Music search: %s - %s (Coming Soon)", artist, track)
         return None
     
     def create_playlist(self, name, description, track_ids):
         # TODO: Implement Apple Music playlist creation
-        print(f"🎵 Apple Music playlist creation (Coming Soon)")
+        log.debug("🎵 Apple Music playlist creation (Coming Soon)")
         return None
 
 class MoodQueEngine:
@@ -405,6 +389,7 @@ class MoodQueEngine:
         self.birth_year = request_data.get('birth_year', None)
         self.request_id = request_data.get('request_id', 'unknown')
         self.preferred_service = request_data.get('streaming_service', 'spotify')  # Future: user choice
+        self.curation_strategy = request_data.get('curation_strategy') or DEFAULT_CURATION_STRATEGY
         
         # Add logger prefix for consistent logging
         self.logger_prefix = f"[{self.request_id}]"
@@ -424,12 +409,17 @@ class MoodQueEngine:
         self.discovered_tracks = []
         self.curated_tracks = []
         self.final_playlist = []
+        self.search_stats = {}
+        self.resolved_tracks = []  # {"uri", "duration_ms"} per track found in step 4
+        self.stage_stats = {}
 
     def discover_tracks_from_lastfm(self, favorite_artist=None, mood_tags=None, genre=None, keywords=None):
         """Step 1: Discover tracks from Last.fm"""
-        print(f"{self.logger_prefix} 🔍 Step 1: Discovering tracks from Last.fm...")
+        log.debug("%s 🔍 Step 1: Discovering tracks from Last.fm...", self.logger_prefix)
         
         all_tracks = []
+        # One wall-clock budget for the whole discovery stage, however many artists we fan out to
+        deadline = deadline_after()
         
         try:
             # Parse favorite artists if it's a string
@@ -440,57 +430,144 @@ class MoodQueEngine:
             else:
                 artists = []
             
-            # Get tracks from favorite artists
+            # No favorite artist given: seed from the user's stored taste snapshot
+            if not artists:
+                artists = self.taste_seed_artists()
+            
+            # Genre-only builds use the precomputed pool: no Last.fm calls, no Spotify searches
+            if not artists:
+                pool = get_genre_pool(genre or self.genre, self.birth_year, self.playlist_type)
+                if pool:
+                    self.discovered_tracks = pool
+                    log.info("%s 🎛️ Step 1 Complete: Using %s precomputed '%s' candidates",
+                             self.logger_prefix, len(pool), genre or self.genre)
+                    return pool
+            
+            # Get tracks from favorite artists (fetched concurrently, merged in the order given)
             if artists:
-                for artist in artists:
-                    print(f"{self.logger_prefix} 🎤 Getting tracks for favorite artist: {artist}")
-                    artist_tracks = search_tracks_by_artist(artist, limit=20)
+                log.debug("%s 🎤 Getting tracks for favorite artists: %s", self.logger_prefix, artists)
+                artist_results = fan_out(lambda a: search_tracks_by_artist(a, limit=20), artists,
+                                         deadline=deadline, default=[])
+                for artist, artist_tracks in zip(artists, artist_results):
                     all_tracks.extend(artist_tracks)
-                    print(f"{self.logger_prefix} ✅ Found {len(artist_tracks)} tracks for {artist}")
+                    log.debug("%s ✅ Found %s tracks for %s", self.logger_prefix, len(artist_tracks), artist)
                     
                     if len(all_tracks) >= 80:  # Get more tracks for better curation
                         break
             
             # Add variety with recommendations
             if len(all_tracks) < 60:
-                print(f"{self.logger_prefix} 🔄 Adding variety with similar artists...")
+                log.debug("%s 🔄 Adding variety with similar artists...", self.logger_prefix)
                 similar_tracks = get_recommendations(
                     seed_artists=artists or get_genre_seed_artists(genre or self.genre, limit=2),
                     genre=genre or self.genre,
                     birth_year=self.birth_year,
-                    limit=40
+                    limit=40,
+                    deadline=deadline
                 )
                 all_tracks.extend(similar_tracks)
-                print(f"{self.logger_prefix} ✅ Added {len(similar_tracks)} variety tracks")
+                log.debug("%s ✅ Added %s variety tracks", self.logger_prefix, len(similar_tracks))
             
             if not all_tracks:
-                print(f"{self.logger_prefix} ⚠️ No tracks found, using genre fallback...")
+                log.warning("%s ⚠️ No tracks found, using genre fallback...", self.logger_prefix)
                 fallback_artists = get_genre_seed_artists(genre or self.genre, limit=1)
                 all_tracks = get_recommendations(
                     seed_artists=fallback_artists,
                     genre=genre or self.genre,
-                    limit=20
+                    limit=20,
+                    deadline=deadline
                 )
             
             self.discovered_tracks = all_tracks
-            print(f"{self.logger_prefix} 🎯 Step 1 Complete: Discovered {len(all_tracks)} tracks from Last.fm")
+            log.info("%s 🎯 Step 1 Complete: Discovered %s tracks from Last.fm", self.logger_prefix, len(all_tracks))
             return all_tracks
             
         except Exception as e:
-            print(f"{self.logger_prefix} ❌ Error in Last.fm discovery: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("%s ❌ Error in Last.fm discovery: %s", self.logger_prefix, e)
             return []
 
+    def taste_seed_artists(self):
+        """Seed artists from the user's taste snapshot; reads Firestore at most, never Spotify"""
+        try:
+            seeds = get_taste_seed_artists(self.user_id)
+        except Exception as e:
+            log.warning("%s ⚠️ Taste snapshot unavailable: %s", self.logger_prefix, e)
+            return []
+        if seeds:
+            log.debug("%s 🧑‍🎤 No favorite artist given - seeding from taste snapshot: %s", self.logger_prefix, seeds)
+        return seeds
+
+    async def discover_tracks_async(self):
+        """Step 1 on the event loop: favorite-artist lookups run concurrently over httpx"""
+        log.debug("%s 🔍 Step 1: Discovering tracks from Last.fm (async)...", self.logger_prefix)
+        deadline = deadline_after()
+        
+        if isinstance(self.favorite_artist, str) and self.favorite_artist:
+            artists = [a.strip() for a in self.favorite_artist.split(",") if a.strip()]
+        elif self.favorite_artist:
+            artists = [self.favorite_artist]
+        else:
+            artists = []
+        if not artists:
+            artists = await asyncio.to_thread(self.taste_seed_artists)
+        
+        # Everything outside the favorite-artist fan-out is the same as the sync path
+        if not artists:
+            return await asyncio.to_thread(self.discover_tracks_from_lastfm, None, self.mood_tags,
+                                           self.genre, self.search_keywords)
+        
+        all_tracks = []
+        try:
+            lastfm = get_async_lastfm_client()
+            lookups = [asyncio.ensure_future(search_tracks_by_artist_async(lastfm, a, limit=20)) for a in artists]
+            done, pending = await asyncio.wait(lookups, timeout=LASTFM_DISCOVERY_DEADLINE)
+            for task in pending:
+                task.cancel()
+            if pending:
+                log.warning("%s ⏰ Last.fm deadline reached - dropping %s/%s artists",
+                            self.logger_prefix, len(pending), len(artists))
+            
+            for artist, task in zip(artists, lookups):
+                if task not in done or task.exception():
+                    continue
+                artist_tracks = task.result()
+                all_tracks.extend(artist_tracks)
+                log.debug("%s ✅ Found %s tracks for %s", self.logger_prefix, len(artist_tracks), artist)
+                if len(all_tracks) >= 80:
+                    break
+            
+            if len(all_tracks) < 60:
+                log.debug("%s 🔄 Adding variety with similar artists...", self.logger_prefix)
+                similar_tracks = await asyncio.to_thread(
+                    get_recommendations,
+                    seed_artists=artists,
+                    genre=self.genre,
+                    birth_year=self.birth_year,
+                    limit=40,
+                    deadline=deadline
+                )
+                all_tracks.extend(similar_tracks)
+                log.debug("%s ✅ Added %s variety tracks", self.logger_prefix, len(similar_tracks))
+        except Exception as e:
+            log.exception("%s ❌ Error in async Last.fm discovery: %s", self.logger_prefix, e)
+        
+        self.discovered_tracks = all_tracks
+        log.info("%s 🎯 Step 1 Complete: Discovered %s tracks from Last.fm", self.logger_prefix, len(all_tracks))
+        return all_tracks
+
     def curate_optimal_playlist(self):
         """Step 2: Curate optimal tracks using mood/valence analysis"""
-        print(f"{self.logger_prefix} 🎯 Step 2: Curating optimal playlist...")
+        log.debug("%s 🎯 Step 2: Curating optimal playlist...", self.logger_prefix)
         
         if not self.discovered_tracks:
-            print(f"{self.logger_prefix} ❌ No discovered tracks to curate")
+            log.error("%s ❌ No discovered tracks to curate", self.logger_prefix)
             return []
         
-        curator = SmartTrackCurator(
+        strategy_cls = get_curation_strategy(self.curation_strategy)
+        self.curation_strategy = strategy_cls.name
+        log.debug("%s 🧩 Using curation strategy: %s", self.logger_prefix, self.curation_strategy)
+        
+        curator = strategy_cls(
             mood_tags=self.mood_tags,
             genre=self.genre,
             time_minutes=self.time_minutes,
@@ -498,37 +575,40 @@ class MoodQueEngine:
         )
         
         self.curated_tracks = curator.curate_tracks(self.discovered_tracks)
-        print(f"{self.logger_prefix} ✨ Step 2 Complete: Curated {len(self.curated_tracks)} optimal tracks")
+        log.info("%s ✨ Step 2 Complete: Curated %s optimal tracks", self.logger_prefix, len(self.curated_tracks))
         return self.curated_tracks
 
     def setup_streaming_services(self):
         """Step 3: Setup streaming service adapters"""
-        print(f"{self.logger_prefix} 🔧 Step 3: Setting up streaming services...")
+        log.debug("%s 🔧 Step 3: Setting up streaming services...", self.logger_prefix)
         
         # Setup Spotify adapter
         if self.headers:
             self.streaming_adapters['spotify'] = SpotifyAdapter(self.headers, self.cache)
-            print(f"{self.logger_prefix} ✅ Spotify adapter ready")
+            log.debug("%s ✅ Spotify adapter ready", self.logger_prefix)
         
         # Setup future adapters
         # self.streaming_adapters['youtube_music'] = YouTubeMusicAdapter(self.cache)
         # self.streaming_adapters['apple_music'] = AppleMusicAdapter(self.cache)
         
-        print(f"{self.logger_prefix} 🔧 Step 3 Complete: {len(self.streaming_adapters)} streaming services ready")
+        log.debug("%s 🔧 Step 3 Complete: %s streaming services ready", self.logger_prefix, len(self.streaming_adapters))
 
     def search_streaming_services(self):
         """Step 4: Search streaming services for curated tracks"""
-        print(f"{self.logger_prefix} 🔍 Step 4: Searching streaming services for {len(self.curated_tracks)} curated tracks...")
+        log.debug("%s 🔍 Step 4: Searching streaming services for %s curated tracks...",
+                  self.logger_prefix, len(self.curated_tracks))
         
         found_tracks = []
+        self.resolved_tracks = []
         adapter = self.streaming_adapters.get(self.preferred_service)
         
         if not adapter:
-            print(f"{self.logger_prefix} ❌ No adapter for {self.preferred_service}")
+            log.error("%s ❌ No adapter for %s", self.logger_prefix, self.preferred_service)
             return []
         
         cache_hits = 0
         api_searches = 0
+        pre_resolved = 0
         
         for track in self.curated_tracks:
             artist = track.get("artist", "")
@@ -537,36 +617,110 @@ class MoodQueEngine:
             if not artist or not track_name:
                 continue
             
+            # Genre pool candidates already carry their Spotify URI
+            if track.get("uri") and self.preferred_service == "spotify":
+                found_tracks.append(track["uri"])
+                self.resolved_tracks.append({"uri": track["uri"], "duration_ms": track.get("duration_ms")})
+                pre_resolved += 1
+                continue
+            
             # Check if this will be a cache hit
-            cached_id = self.cache.get_track_id(artist, track_name, self.preferred_service)
+            cached_id = self.cache.get_track_id(artist, track_name, self.preferred_service, self.playlist_type)
             if cached_id:
                 cache_hits += 1
             else:
                 api_searches += 1
             
-            track_id = adapter.search_track(artist, track_name, self.playlist_type)
+            resolved = adapter.resolve_track(artist, track_name, self.playlist_type)
             
-            if track_id:
-                found_tracks.append(track_id)
-                print(f"{self.logger_prefix} ✅ Found: {artist} - {track_name}")
+            if resolved:
+                found_tracks.append(resolved["uri"])
+                self.resolved_tracks.append(resolved)
+                log_track_event(log, "%s ✅ Found: %s - %s", self.logger_prefix, artist, track_name)
             else:
-                print(f"{self.logger_prefix} ❌ Not found: {artist} - {track_name}")
+                log_track_event(log, "%s ❌ Not found: %s - %s", self.logger_prefix, artist, track_name)
         
-        print(f"{self.logger_prefix} 📊 Search Stats: {cache_hits} cache hits, {api_searches} API searches")
-        print(f"{self.logger_prefix} 🔍 Step 4 Complete: Found {len(found_tracks)}/{len(self.curated_tracks)} tracks")
+        self.search_stats = {"pre_resolved": pre_resolved, "cache_hits": cache_hits, "api_searches": api_searches}
+        log.info("%s 📊 Search Stats: %s pre-resolved, %s cache hits, %s API searches",
+                 self.logger_prefix, pre_resolved, cache_hits, api_searches)
+        log.info("%s 🔍 Step 4 Complete: Found %s/%s tracks",
+                 self.logger_prefix, len(found_tracks), len(self.curated_tracks))
+        return found_tracks
+
+    async def search_streaming_services_async(self):
+        """Step 4 on the event loop: every curated track is resolved concurrently"""
+        if self.preferred_service != "spotify" or not self.headers:
+            return await asyncio.to_thread(self.search_streaming_services)
+        
+        log.debug("%s 🔍 Step 4: Resolving %s curated tracks on Spotify (async)...",
+                  self.logger_prefix, len(self.curated_tracks))
+        spotify = get_async_spotify_client(breakers=spotify_breakers)
+        
+        async def resolve(track):
+            artist = track.get("artist", "")
+            track_name = track.get("track", "")
+            if not artist or not track_name:
+                return None, "skipped", [], None
+            # Genre pool candidates already carry their Spotify URI
+            if track.get("uri"):
+                return track["uri"], "pre_resolved", [], track.get("duration_ms")
+            cached = await asyncio.to_thread(self.cache.get_track_entry, artist, track_name,
+                                             "spotify", self.playlist_type)
+            if cached:
+                return cached["track_id"], "cache_hit", [], cached.get("duration_ms")
+            track_uri, items = await spotify.search_track(artist, track_name, self.headers, self.playlist_type)
+            duration_ms = next((item.get("duration_ms") for item in items if item.get("uri") == track_uri), None)
+            return track_uri, "api_search", items, duration_ms
+        
+        results = await asyncio.gather(*(resolve(t) for t in self.curated_tracks), return_exceptions=True)
+        
+        found_tracks = []
+        self.resolved_tracks = []
+        stats = defaultdict(int)
+        cache_entries = []
+        for track, result in zip(self.curated_tracks, results):
+            if isinstance(result, Exception):
+                log.warning("%s ❌ Spotify search error for %s - %s: %s", self.logger_prefix,
+                            track.get("artist"), track.get("track"), result)
+                continue
+            track_uri, source, items, duration_ms = result
+            stats[source] += 1
+            for item in items:
+                remember_track_metadata(item)
+                cache_entries.append(self.cache.entry_from_search_item(item))
+            if track_uri:
+                found_tracks.append(track_uri)
+                self.resolved_tracks.append({"uri": track_uri, "duration_ms": duration_ms})
+                if source == "api_search":
+                    chosen = next((e for e in cache_entries if e and e["track_id"] == track_uri), {})
+                    cache_entries.append({**chosen, "artist": track["artist"], "track": track["track"],
+                                          "track_id": track_uri})
+            elif source != "skipped":
+                log_track_event(log, "%s ❌ Not found: %s - %s", self.logger_prefix, track.get("artist"), track.get("track"))
+        
+        # One batched cache write for the whole build
+        if cache_entries:
+            await asyncio.to_thread(self.cache.store_many, cache_entries, "spotify")
+        
+        self.search_stats = {"pre_resolved": stats["pre_resolved"], "cache_hits": stats["cache_hit"],
+                             "api_searches": stats["api_search"]}
+        log.info("%s 📊 Search Stats: %s pre-resolved, %s cache hits, %s API searches", self.logger_prefix,
+                 stats["pre_resolved"], stats["cache_hit"], stats["api_search"])
+        log.info("%s 🔍 Step 4 Complete: Found %s/%s tracks",
+                 self.logger_prefix, len(found_tracks), len(self.curated_tracks))
         return found_tracks
 
     def create_streaming_playlist(self, track_ids):
         """Step 5: Create playlist on streaming service"""
-        print(f"{self.logger_prefix} 🎵 Step 5: Creating playlist with {len(track_ids)} tracks...")
+        log.debug("%s 🎵 Step 5: Creating playlist with %s tracks...", self.logger_prefix, len(track_ids))
         
         if not track_ids:
-            print(f"{self.logger_prefix} ❌ No track IDs to create playlist")
+            log.error("%s ❌ No track IDs to create playlist", self.logger_prefix)
             return None
         
         adapter = self.streaming_adapters.get(self.preferred_service)
         if not adapter:
-            print(f"{self.logger_prefix} ❌ No adapter for {self.preferred_service}")
+            log.error("%s ❌ No adapter for %s", self.logger_prefix, self.preferred_service)
             return None
         
         playlist_url = adapter.create_playlist(
@@ -577,15 +731,15 @@ class MoodQueEngine:
         )
         
         if playlist_url:
-            print(f"{self.logger_prefix} 🎵 Step 5 Complete: Playlist created successfully")
+            log.info("%s 🎵 Step 5 Complete: Playlist created successfully", self.logger_prefix)
         else:
-            print(f"{self.logger_prefix} ❌ Step 5 Failed: Playlist creation failed")
+            log.error("%s ❌ Step 5 Failed: Playlist creation failed", self.logger_prefix)
         
         return playlist_url
 
     def authenticate_spotify(self):
         """Handle Spotify authentication with proper fallback"""
-        print(f"{self.logger_prefix} 🔐 Authenticating with Spotify...")
+        log.debug("%s 🔐 Authenticating with Spotify...", self.logger_prefix)
         
         # Try user token first if we have a user_id
         if self.user_id and self.user_id != 'unknown' and self.user_id != 'anonymous':
@@ -593,73 +747,169 @@ class MoodQueEngine:
                 from spotify_token_manager import refresh_access_token
                 self.access_token = refresh_access_token(self.user_id)
                 if self.access_token:
-                    print(f"{self.logger_prefix} ✅ User token authenticated for {self.user_id}")
+                    log.debug("%s ✅ User token authenticated for %s", self.logger_prefix, self.user_id)
                     self.headers = {"Authorization": f"Bearer {self.access_token}"}
-                    self.spotify_user_id = get_spotify_user_id(self.headers)
+                    # Cached with the token and stored on the users doc - no /me per build
+                    self.spotify_user_id = get_user_token_provider().spotify_user_id(self.user_id)
                     return True
             except Exception as e:
-                print(f"{self.logger_prefix} ⚠️ User token failed: {e}")
+                log.warning("%s ⚠️ User token failed: %s", self.logger_prefix, e)
         
         # Fallback to system token
         try:
             from moodque_auth import get_spotify_access_token
             self.access_token = get_spotify_access_token()
             if self.access_token:
-                print(f"{self.logger_prefix} ✅ System token authenticated")
+                log.debug("%s ✅ System token authenticated", self.logger_prefix)
                 self.headers = {"Authorization": f"Bearer {self.access_token}"}
-                self.spotify_user_id = get_spotify_user_id(self.headers)
+                self.spotify_user_id = get_system_token_provider().spotify_user_id()
                 return True
         except Exception as e:
-            print(f"{self.logger_prefix} ❌ System token failed: {e}")
+            log.error("%s ❌ System token failed: %s", self.logger_prefix, e)
         
         return False
 
     def build_playlist(self):
         """Main playlist building workflow - NEW 5-STEP PROCESS"""
-        print(f"{self.logger_prefix} 🚀 Starting MoodQue v2.0 playlist build process...")
+        if ENGINE_ASYNC_ENABLED:
+            # Flask routes stay synchronous; the build runs on the shared engine loop
+            return run_coroutine(self.build_playlist_async())
+        
+        log.debug("%s 🚀 Starting MoodQue v2.0 playlist build process...", self.logger_prefix)
 
         # Step 0: Authenticate with streaming services
+        started = time.perf_counter()
         if not self.authenticate_spotify():
-            print(f"{self.logger_prefix} ❌ Streaming service authentication failed")
+            log.error("%s ❌ Streaming service authentication failed", self.logger_prefix)
             return None
+        self.record_stage("auth", started)
 
         # Step 1: Discover tracks from Last.fm
+        started = time.perf_counter()
         discovered_tracks = self.discover_tracks_from_lastfm(
             favorite_artist=self.favorite_artist,
             mood_tags=self.mood_tags,
             genre=self.genre,
             keywords=self.search_keywords
         )
+        self.record_stage("discovery", started, tracks=len(discovered_tracks))
 
         if not discovered_tracks:
-            print(f"{self.logger_prefix} ❌ No tracks discovered from Last.fm")
+            log.error("%s ❌ No tracks discovered from Last.fm", self.logger_prefix)
             return None
 
         # Step 2: Curate optimal playlist
+        started = time.perf_counter()
         curated_tracks = self.curate_optimal_playlist()
+        self.record_stage("curation", started, tracks=len(curated_tracks), strategy=self.curation_strategy)
 
         if not curated_tracks:
-            print(f"{self.logger_prefix} ❌ No tracks curated")
+            log.error("%s ❌ No tracks curated", self.logger_prefix)
             return None
 
         # Step 3: Setup streaming services
         self.setup_streaming_services()
 
         # Step 4: Search streaming services for curated tracks
+        started = time.perf_counter()
         track_ids = self.search_streaming_services()
+        self.record_stage("search", started, tracks=len(track_ids), **self.search_stats)
 
         if not track_ids:
-            print(f"{self.logger_prefix} ❌ No tracks found on streaming services")
+            log.error("%s ❌ No tracks found on streaming services", self.logger_prefix)
             return None
 
         # Step 5: Create playlist
+        started = time.perf_counter()
         playlist_url = self.create_streaming_playlist(track_ids)
+        self.record_stage("create_playlist", started)
 
         if not playlist_url:
-            print(f"{self.logger_prefix} ❌ Playlist creation failed")
+            log.error("%s ❌ Playlist creation failed", self.logger_prefix)
             return None
 
         # Step 6: Track the interaction
+        self.track_build(playlist_url, discovered_tracks, curated_tracks, track_ids)
+
+        log.info("%s ✅ MoodQue v2.0 playlist build completed successfully!", self.logger_prefix)
+        return self.build_result(playlist_url, track_ids)
+
+    async def build_playlist_async(self):
+        """build_playlist with Last.fm discovery and Spotify resolution running concurrently on the event loop"""
+        log.debug("%s 🚀 Starting MoodQue v2.0 playlist build process (async)...", self.logger_prefix)
+
+        started = time.perf_counter()
+        if not await asyncio.to_thread(self.authenticate_spotify):
+            log.error("%s ❌ Streaming service authentication failed", self.logger_prefix)
+            return None
+        self.record_stage("auth", started)
+
+        started = time.perf_counter()
+        discovered_tracks = await self.discover_tracks_async()
+        self.record_stage("discovery", started, tracks=len(discovered_tracks))
+        if not discovered_tracks:
+            log.error("%s ❌ No tracks discovered from Last.fm", self.logger_prefix)
+            return None
+
+        started = time.perf_counter()
+        curated_tracks = self.curate_optimal_playlist()
+        self.record_stage("curation", started, tracks=len(curated_tracks), strategy=self.curation_strategy)
+        if not curated_tracks:
+            log.error("%s ❌ No tracks curated", self.logger_prefix)
+            return None
+
+        self.setup_streaming_services()
+
+        started = time.perf_counter()
+        track_ids = await self.search_streaming_services_async()
+        self.record_stage("search", started, tracks=len(track_ids), **self.search_stats)
+        if not track_ids:
+            log.error("%s ❌ No tracks found on streaming services", self.logger_prefix)
+            return None
+
+        started = time.perf_counter()
+        playlist_url = await asyncio.to_thread(self.create_streaming_playlist, track_ids)
+        self.record_stage("create_playlist", started)
+        if not playlist_url:
+            log.error("%s ❌ Playlist creation failed", self.logger_prefix)
+            return None
+
+        await asyncio.to_thread(self.track_build, playlist_url, discovered_tracks, curated_tracks, track_ids)
+
+        log.info("%s ✅ MoodQue v2.0 playlist build completed successfully!", self.logger_prefix)
+        return await asyncio.to_thread(self.build_result, playlist_url, track_ids)
+
+    def record_stage(self, stage, started, **counters):
+        """Wall time (perf_counter start) and counters for one build stage"""
+        self.stage_stats[stage] = {"seconds": round(time.perf_counter() - started, 3), **counters}
+
+    def build_result(self, playlist_url, track_ids):
+        """
+        BuildResult for the finished playlist, with no extra API calls: durations are the ones
+        step 4 resolved, gaps are filled from the in-memory track metadata cache, and any
+        still unknown are counted in missing_durations instead of being taken as 0.
+        """
+        durations = {t["uri"]: t.get("duration_ms") for t in self.resolved_tracks}
+        unknown = [uri for uri in track_ids if not durations.get(uri)]
+        if unknown:
+            durations.update(cached_track_durations(unknown))
+        known = [durations[uri] for uri in track_ids if durations.get(uri)]
+        missing_durations = len(track_ids) - len(known)
+        if missing_durations:
+            log.debug("%s ⏱️ Duration unknown for %s/%s tracks - total is partial",
+                      self.logger_prefix, missing_durations, len(track_ids))
+        return BuildResult.from_url(
+            playlist_url,
+            uris=list(track_ids),
+            duration_ms=sum(known),
+            missing_durations=missing_durations,
+            stage_stats=dict(self.stage_stats),
+            request_id=self.request_id,
+            service=self.preferred_service
+        )
+
+    def track_build(self, playlist_url, discovered_tracks, curated_tracks, track_ids):
+        """Step 6: record the build as a user interaction"""
         try:
             track_interaction(
                 user_id=self.user_id,
@@ -672,29 +922,27 @@ class MoodQueEngine:
                     "track_count": len(track_ids),
                     "duration_minutes": self.time_minutes,
                     "streaming_service": self.preferred_service,
-                    "curation_strategy": "smart_mood_valence_v2",
+                    "curation_strategy": self.curation_strategy,
                     "discovered_tracks": len(discovered_tracks),
                     "curated_tracks": len(curated_tracks),
                     "found_tracks": len(track_ids)
                 }
             )
         except Exception as e:
-            print(f"{self.logger_prefix} ⚠️ Failed to track interaction: {e}")
-
-        print(f"{self.logger_prefix} ✅ MoodQue v2.0 playlist build completed successfully!")
-        return playlist_url
+            log.warning("%s ⚠️ Failed to track interaction: %s", self.logger_prefix, e)
 
 # Main function to replace build_smart_playlist_enhanced
 def build_smart_playlist_enhanced(event_name, genre, time, mood_tags, search_keywords,
                                   favorite_artist, user_id=None, playlist_type="clean",
-                                  request_id=None, birth_year=None, streaming_service="spotify"):
+                                  request_id=None, birth_year=None, streaming_service="spotify",
+                                  curation_strategy=None):
     """
-    Enhanced playlist builder using the new MoodQue Engine v2.0
+    Enhanced playlist builder using the new MoodQue Engine v2.0.
+    Returns a BuildResult, or None if the build failed.
     """
     # CRITICAL: request_id is now required - do not generate fallback
     if not request_id:
-        error_msg = "❌ CRITICAL: request_id is required but not provided to build_smart_playlist_enhanced"
-        print(error_msg)
+        log.error("❌ CRITICAL: request_id is required but not provided to build_smart_playlist_enhanced")
         raise ValueError("request_id parameter is required")
     
     # Handle user_id properly
@@ -726,13 +974,12 @@ def build_smart_playlist_enhanced(event_name, genre, time, mood_tags, search_key
         'playlist_type': playlist_type,
         'request_id': request_id,
         'birth_year': birth_year,
-        'streaming_service': streaming_service  # NEW: Support for multiple services
+        'streaming_service': streaming_service,  # NEW: Support for multiple services
+        'curation_strategy': curation_strategy
     }
     
     # Log the request data for debugging
-    print(f"[{request_id}] 🔧 Building MoodQue v2.0 playlist with parameters:")
-    for key, value in request_data.items():
-        print(f"[{request_id}]   {key}: {value}")
+    log.debug("[%s] 🔧 Building MoodQue v2.0 playlist with parameters: %s", request_id, LazyFields(request_data))
     
     # Initialize and run engine
     try:
@@ -740,15 +987,14 @@ def build_smart_playlist_enhanced(event_name, genre, time, mood_tags, search_key
         result = engine.build_playlist()
         
         if result:
-            print(f"[{request_id}] ✅ MoodQue v2.0 playlist build completed successfully")
+            log.info("[%s] ✅ MoodQue v2.0 playlist build completed successfully: %s tracks, %s min",
+                     request_id, result.track_count, result.duration_minutes)
         else:
-            print(f"[{request_id}] ❌ MoodQue v2.0 playlist build failed")
+            log.error("[%s] ❌ MoodQue v2.0 playlist build failed", request_id)
             
         return result
         
     except Exception as e:
-        print(f"[{request_id}] ❌ Critical error in MoodQue v2.0 playlist builder: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("[%s] ❌ Critical error in MoodQue v2.0 playlist builder: %s", request_id, e)
         
         return None
\ No newline at end of file
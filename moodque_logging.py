@@ -0,0 +1,140 @@
+# moodque_logging.py - Level-gated, structured logging for the request hot path
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+
+# Root level, per-logger overrides ("moodque.engine=DEBUG,moodque.utilities=WARNING") and output format
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json" (one object per line)
+# Share of per-track events still logged when their logger is above DEBUG
+TRACK_LOG_SAMPLE_RATE = float(os.getenv("TRACK_LOG_SAMPLE_RATE", "0.01"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class LazyJSON:
+    """Serializes its payload only if a handler actually formats the record"""
+
+    __slots__ = ("payload", "indent")
+
+    def __init__(self, payload, indent=None):
+        self.payload = payload
+        self.indent = indent
+
+    def __str__(self):
+        try:
+            return json.dumps(self.payload, indent=self.indent, default=str, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return repr(self.payload)
+
+
+class LazyFields:
+    """Renders a dict as key=value pairs, only when the record is formatted"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(f"{key}={value}" for key, value in self.fields.items())
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; structured fields passed as extra={"fields": {...}} are merged in"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def parse_levels(spec: str):
+    """'a=DEBUG,b.c=warning' -> {'a': 'DEBUG', 'b.c': 'WARNING'}; malformed entries are ignored"""
+    levels = {}
+    for part in spec.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=None, levels=None, fmt=None):
+    """Install the root handler and per-logger levels once per process"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else logging.Formatter(TEXT_FORMAT))
+        root = logging.getLogger()
+        root.handlers[:] = [handler]
+        root.setLevel(level or LOG_LEVEL)
+        for name, logger_level in (levels if levels is not None else parse_levels(LOG_LEVELS)).items():
+            logging.getLogger(name).setLevel(logger_level)
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def log_track_event(logger, msg, *args, rate=None):
+    """
+    Per-track events (search hits, misses, cache reads). All of them at DEBUG; otherwise a
+    sample at INFO so production still sees a trickle. Skipped events cost one level check.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args)
+        return
+    rate = TRACK_LOG_SAMPLE_RATE if rate is None else rate
+    if rate > 0 and random.random() < rate and logger.isEnabledFor(logging.INFO):
+        logger.info(msg, *args, extra={"fields": {"sampled": rate}})
+
+
+class RequestSummary:
+    """
+    Collects fields while a request runs and logs them as one record keyed by row_id when
+    it finishes, instead of a line per step. Only the first finish() logs.
+    """
+
+    def __init__(self, logger, event, row_id, **fields):
+        self.logger = logger
+        self.event = event
+        self.fields = {"row_id": row_id, **fields}
+        self.started = time.time()
+        self.finished = False
+
+    def update(self, **fields):
+        self.fields.update(fields)
+
+    def finish(self, **fields):
+        if self.finished:
+            return
+        self.finished = True
+        self.fields.update(fields)
+        self.fields.setdefault("status", "ok")
+        self.fields["elapsed_ms"] = round((time.time() - self.started) * 1000)
+        level = logging.ERROR if self.fields["status"] in ("error", "failed") else logging.INFO
+        self.logger.log(level, "📋 %s %s", self.event, LazyFields(self.fields),
+                        extra={"fields": {"event": self.event, **self.fields}})
+
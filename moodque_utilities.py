@@ -1,12 +1,11 @@
 import os
-import base64
 import requests
 import time
 import re
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
+from cachetools import TTLCache
 
 
 # Only load .env if running locally (Railway sets env vars automatically)
@@ -18,6 +17,13 @@ if os.getenv("RAILWAY_ENVIRONMENT") is None:
         pass  # dotenv not available in production
 
 from firebase_admin_init import db
+from rate_limiter import RateLimitTimeout
+from spotify_client import spotify_request, spotify_get, spotify_breakers, parse_retry_after, CircuitOpenError
+from track_matcher import TrackMatcher
+from token_provider import get_system_access_token, get_system_token_provider
+from moodque_logging import get_logger, log_track_event
+
+log = get_logger("moodque.utilities")
 
 # Example variable usage
 client_id = os.getenv("SPOTIFY_CLIENT_ID")
@@ -25,59 +31,27 @@ client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
 refresh_token = os.getenv("SPOTIFY_REFRESH_TOKEN")
 
 def refresh_access_token():
-    """Refresh the system Spotify access token"""
-    url = "https://accounts.spotify.com/api/token"
-    client_creds = f"{client_id}:{client_secret}"
-    client_creds_b64 = base64.b64encode(client_creds.encode()).decode()
-
-    headers = {
-        "Authorization": f"Basic {client_creds_b64}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    payload = {
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token
-    }
-    res = requests.post(url, headers=headers, data=payload)
-    if res.status_code != 200:
-        print("❌ Error refreshing token:", res.json())
-        exit()
-    return res.json()["access_token"]
+    """The system Spotify access token (cached by token_provider, refreshed before expiry)"""
+    return get_system_access_token()
 
 def get_spotify_access_token():
     """
-    Fetches a new access token using the app's stored refresh token.
+    The app account's access token, shared process-wide by token_provider.
     """
-    auth_header = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
-    headers = {
-        "Authorization": f"Basic {auth_header}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    data = {
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token
-    }
-    response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
-
-    if response.status_code != 200:
-        print("❌ Failed to refresh app access token", response.text)
-        raise Exception("Spotify token refresh failed")
-
-    token_info = response.json()
-    return token_info["access_token"]
+    return get_system_access_token()
 
 def get_spotify_user_id(headers):
     """Get the current user's Spotify ID"""
     try:
-        res = requests.get("https://api.spotify.com/v1/me", headers=headers)
+        res = spotify_get("https://api.spotify.com/v1/me", headers=headers)
         if res.status_code == 200:
             data = res.json()
             return data.get("id")
         else:
-            print(f"❌ Failed to get user ID: {res.status_code}")
+            log.error("❌ Failed to get user ID: %s", res.status_code)
             return None
     except Exception as e:
-        print(f"❌ Error getting user ID: {e}")
+        log.error("❌ Error getting user ID: %s", e)
         return None  
 
 def create_new_playlist(headers, user_id, name, description=""):
@@ -91,50 +65,160 @@ def create_new_playlist(headers, user_id, name, description=""):
             "description": description,
             "public": False
         }
-        res = requests.post(url, headers=headers, json=data)
+        res = spotify_request("POST", url, headers=headers, json=data)
         if res.status_code == 201:
             return res.json()["id"]
         else:
-            print(f"❌ Failed to create playlist: {res.status_code} - {res.text}")
+            log.error("❌ Failed to create playlist: %s - %s", res.status_code, res.text)
             return None
     except Exception as e:
-        print(f"❌ Exception creating playlist: {e}")
+        log.error("❌ Exception creating playlist: %s", e)
+        return None
+
+# Spotify accepts at most 100 URIs per add/replace request
+PLAYLIST_CHUNK_SIZE = 100
+PLAYLIST_CHUNK_RETRIES = int(os.getenv("PLAYLIST_CHUNK_RETRIES", "2"))
+PLAYLIST_RETRY_BACKOFF = float(os.getenv("PLAYLIST_RETRY_BACKOFF", "0.5"))  # seconds, doubled per retry
+
+def _clean_track_uris(track_uris):
+    """Accept URI strings or track dicts and keep only Spotify track URIs"""
+    if not isinstance(track_uris, list):
+        return []
+    clean_uris = []
+    for t in track_uris:
+        if isinstance(t, dict) and "uri" in t:
+            clean_uris.append(t["uri"])
+        elif isinstance(t, str) and "spotify:track:" in t:
+            clean_uris.append(t)
+    return clean_uris
+
+def get_playlist_total(headers, playlist_id):
+    """Number of items currently in a playlist, or None if it can't be read"""
+    res = spotify_get(f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+                      headers=headers, params={"fields": "total", "limit": 1})
+    if res.status_code == 200:
+        return res.json().get("total")
+    return None
+
+def _read_playlist_total(headers, playlist_id):
+    """get_playlist_total that reports a failed read as None instead of raising"""
+    try:
+        return get_playlist_total(headers, playlist_id)
+    except (requests.exceptions.RequestException, RateLimitTimeout, ValueError) as e:
+        log.warning("⚠️ Couldn't read playlist total: %s", e)
         return None
 
-def add_tracks_to_playlist(headers, user_id, playlist_id, track_uris):
+def populate_playlist(headers, playlist_id, track_uris, replace=False, existing_total=None,
+                      max_retries=PLAYLIST_CHUNK_RETRIES):
+    """
+    Write track_uris to a playlist in order, 100 per request.
+    replace=True swaps the playlist's contents (first chunk via PUT) instead of appending.
+    Each POST names its position, so order holds even if a chunk is retried; when a
+    request fails ambiguously (timeout, 5xx) the playlist total is checked before
+    retrying, so a chunk that actually landed is never added twice. If the current
+    total can't be read, chunks are appended without a position and an ambiguous
+    failure stops population instead of risking a duplicate.
+    Retries back off exponentially; a 429 waits out its Retry-After instead.
+    Returns stats: ok, added, chunks, snapshot_id, chunk_latency_ms, retries.
+    """
+    stats = {"ok": False, "added": 0, "chunks": 0, "snapshot_id": None,
+             "chunk_latency_ms": [], "retries": 0, "verified_after_error": 0}
+
+    clean_uris = _clean_track_uris(track_uris)
+    if not clean_uris:
+        log.error("❌ No valid track URIs to add")
+        return stats
+
+    url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
+    chunks = [clean_uris[i:i + PLAYLIST_CHUNK_SIZE] for i in range(0, len(clean_uris), PLAYLIST_CHUNK_SIZE)]
+
+    if replace:
+        base_total = 0
+    elif existing_total is not None:
+        base_total = existing_total
+    else:
+        base_total = _read_playlist_total(headers, playlist_id)
+        if base_total is None:
+            log.warning("⚠️ Playlist total unknown - appending chunks without positions")
+
+    for index, chunk in enumerate(chunks):
+        method = "PUT" if replace and index == 0 else "POST"
+        payload = {"uris": chunk}
+        if method == "POST" and base_total is not None:
+            payload["position"] = base_total + stats["added"]
+            expected_total = base_total + stats["added"] + len(chunk)
+
+        started = time.perf_counter()
+        applied = False
+        delay = 0.0
+        for attempt in range(max_retries + 1):
+            if attempt:
+                stats["retries"] += 1
+                time.sleep(delay)
+            try:
+                res = spotify_request(method, url, headers=headers, json=payload)
+            except (RateLimitTimeout, CircuitOpenError) as e:
+                # Never sent, so it's safe to send again
+                log.warning("⚠️ Chunk %s/%s not sent: %s", index + 1, len(chunks), e)
+                delay = PLAYLIST_RETRY_BACKOFF * (2 ** attempt)
+                continue
+            except requests.exceptions.RequestException as e:
+                log.warning("⚠️ Chunk %s/%s request failed: %s", index + 1, len(chunks), e)
+                res = None
+
+            if res is not None and res.status_code in (200, 201):
+                stats["snapshot_id"] = res.json().get("snapshot_id", stats["snapshot_id"])
+                applied = True
+                break
+
+            if res is not None and res.status_code < 500 and res.status_code != 429:
+                log.error("❌ Error adding tracks (chunk %s/%s): %s %s",
+                          index + 1, len(chunks), res.status_code, res.text)
+                break
+
+            if res is not None and res.status_code == 429:
+                # Rejected outright, so nothing landed; wait as long as Spotify asked
+                delay = parse_retry_after(res.headers.get("Retry-After"))
+                continue
+
+            delay = PLAYLIST_RETRY_BACKOFF * (2 ** attempt)
+            if method == "PUT":
+                continue  # replacing again is harmless
+
+            # Timeout / 5xx: the write may still have landed - check before sending it again
+            if base_total is None:
+                log.error("❌ Chunk %s/%s failed ambiguously with no known position - not retrying",
+                          index + 1, len(chunks))
+                break
+            if _read_playlist_total(headers, playlist_id) == expected_total:
+                stats["verified_after_error"] += 1
+                applied = True
+                break
+
+        stats["chunk_latency_ms"].append(round((time.perf_counter() - started) * 1000, 1))
+        if not applied:
+            log.error("❌ Playlist population stopped at chunk %s/%s (%s/%s tracks written)",
+                      index + 1, len(chunks), stats["added"], len(clean_uris))
+            return stats
+
+        stats["added"] += len(chunk)
+        stats["chunks"] += 1
+
+    stats["ok"] = True
+    log.info("✅ Successfully added %s tracks to playlist in %s chunk(s) - chunk latency ms: %s",
+             stats["added"], stats["chunks"], stats["chunk_latency_ms"])
+    return stats
+
+def add_tracks_to_playlist(headers, user_id, playlist_id, track_uris, replace=False, existing_total=None):
     """
     Add tracks to playlist - CORRECTED SIGNATURE to match engine expectations
     Note: user_id parameter is kept for compatibility but not used in API call
     """
     try:
-        url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-        
-        # Ensure track_uris is a list of strings
-        if isinstance(track_uris, list):
-            clean_uris = []
-            for t in track_uris:
-                if isinstance(t, dict) and "uri" in t:
-                    clean_uris.append(t["uri"])
-                elif isinstance(t, str) and "spotify:track:" in t:
-                    clean_uris.append(t)
-        else:
-            clean_uris = []
-
-        if not clean_uris:
-            print("❌ No valid track URIs to add")
-            return False
-
-        payload = {"uris": clean_uris}
-        res = requests.post(url, headers=headers, json=payload)
-
-        if res.status_code == 201:
-            print(f"✅ Successfully added {len(clean_uris)} tracks to playlist")
-            return True
-        else:
-            print(f"❌ Error adding tracks: {res.status_code} {res.text}")
-            return False
+        return populate_playlist(headers, playlist_id, track_uris, replace=replace,
+                                 existing_total=existing_total)["ok"]
     except Exception as e:
-        print(f"❌ Exception adding tracks: {e}")
+        log.error("❌ Exception adding tracks: %s", e)
         return False
 
 def calculate_playlist_duration(track_uris, headers):
@@ -144,205 +228,214 @@ def calculate_playlist_duration(track_uris, headers):
         total_ms = sum(track['duration_ms'] for track in track_data)
         return total_ms / 60000  # Convert to minutes
     except Exception as e:
-        print(f"❌ Error calculating duration: {e}")
+        log.error("❌ Error calculating duration: %s", e)
         return 0
 
+# Track metadata (duration, explicit, name, artist) by Spotify track ID
+TRACK_METADATA_CACHE_SIZE = int(os.getenv("TRACK_METADATA_CACHE_SIZE", "20000"))
+TRACK_METADATA_CACHE_TTL = int(os.getenv("TRACK_METADATA_CACHE_TTL", str(24 * 3600)))  # seconds
+TRACK_METADATA_CONCURRENCY = int(os.getenv("TRACK_METADATA_CONCURRENCY", "4"))
+TRACK_METADATA_TIMEOUT = float(os.getenv("TRACK_METADATA_TIMEOUT", "10"))  # seconds for the whole fetch
+TRACK_METADATA_BATCH_SIZE = 50  # Spotify /v1/tracks limit
+
+track_metadata_cache = TTLCache(maxsize=TRACK_METADATA_CACHE_SIZE, ttl=TRACK_METADATA_CACHE_TTL)
+track_metadata_lock = threading.Lock()
+
+def _track_id(uri):
+    return uri.split(":")[-1] if isinstance(uri, str) else None
+
+def remember_track_metadata(track):
+    """Cache the fields we need from a Spotify track object; returns its ID"""
+    if not isinstance(track, dict) or not track.get("id"):
+        return None
+    metadata = {
+        "duration_ms": track.get("duration_ms", 210000),
+        "name": track.get("name", "Unknown"),
+        "artist": (track.get("artists") or [{}])[0].get("name", "Unknown"),
+        "explicit": track.get("explicit", False)
+    }
+    # A relinked track answers for the ID we asked about, not its own
+    ids = {track["id"], (track.get("linked_from") or {}).get("id")}
+    with track_metadata_lock:
+        for track_id in ids - {None}:
+            track_metadata_cache[track_id] = metadata
+    return track["id"]
+
+def cached_track_durations(track_uris):
+    """duration_ms by URI for the tracks already in the metadata cache; never calls Spotify"""
+    durations = {}
+    with track_metadata_lock:
+        for uri in track_uris:
+            metadata = track_metadata_cache.get(_track_id(uri))
+            if metadata and metadata.get("duration_ms"):
+                durations[uri] = metadata["duration_ms"]
+    return durations
+
+def _fetch_track_batch(track_ids, headers):
+    res = spotify_get("https://api.spotify.com/v1/tracks",
+                      headers=headers,
+                      params={"ids": ",".join(track_ids)},
+                      shared=True)
+    if res.status_code != 200:
+        log.error("❌ Track metadata batch failed: HTTP %s", res.status_code)
+        return
+    for track in res.json().get("tracks", []):
+        remember_track_metadata(track)
+
 def get_tracks_with_duration(track_uris, headers):
-    """Get track duration information for a list of URIs including explicit info"""
+    """
+    Get duration/explicit info for a list of URIs, in input order.
+    Known tracks come from the metadata cache; the rest are fetched in concurrent
+    50-ID batches and matched back by track ID. Tracks Spotify doesn't return are left out.
+    """
     try:
+        uris = [uri for uri in track_uris if isinstance(uri, str)]
+        with track_metadata_lock:
+            missing = [tid for tid in dict.fromkeys(_track_id(uri) for uri in uris)
+                       if tid and tid not in track_metadata_cache]
+
+        if missing:
+            batches = [missing[i:i + TRACK_METADATA_BATCH_SIZE]
+                       for i in range(0, len(missing), TRACK_METADATA_BATCH_SIZE)]
+            executor = ThreadPoolExecutor(max_workers=min(len(batches), TRACK_METADATA_CONCURRENCY),
+                                          thread_name_prefix="track-metadata")
+            try:
+                futures = [executor.submit(_fetch_track_batch, batch, headers) for batch in batches]
+                done, not_done = wait(futures, timeout=TRACK_METADATA_TIMEOUT)
+                for future in done:
+                    if future.exception():
+                        log.error("❌ Track metadata batch error: %s", future.exception())
+                if not_done:
+                    log.warning("⏰ Track metadata timeout - %s/%s batches still pending",
+                                len(not_done), len(batches))
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
         track_data = []
-        
-        # Process in batches of 50 (Spotify API limit)
-        batch_size = 50
-        for i in range(0, len(track_uris), batch_size):
-            batch_uris = track_uris[i:i + batch_size]
-            track_ids = [uri.split(":")[-1] for uri in batch_uris if isinstance(uri, str)]
-            
-            if not track_ids:
-                continue
-            
-            res = requests.get("https://api.spotify.com/v1/tracks", 
-                              headers=headers, 
-                              params={"ids": ",".join(track_ids)})
-            
-            if res.status_code == 200:
-                data = res.json()
-                tracks = data.get("tracks", [])
-                
-                for j, track in enumerate(tracks):
-                    if track and isinstance(track, dict):
-                        track_info = {
-                            'uri': batch_uris[j] if j < len(batch_uris) else track.get("uri"),
-                            'duration_ms': track.get("duration_ms", 210000),
-                            'name': track.get("name", "Unknown"),
-                            'artist': track.get("artists", [{}])[0].get("name", "Unknown"),
-                            'explicit': track.get("explicit", False)
-                        }
-                        track_data.append(track_info)
-        
+        with track_metadata_lock:
+            for uri in uris:
+                metadata = track_metadata_cache.get(_track_id(uri))
+                if metadata:
+                    track_data.append(dict(metadata, uri=uri))
         return track_data
         
     except Exception as e:
-        print(f"❌ Error getting track durations: {e}")
+        log.error("❌ Error getting track durations: %s", e)
         return []
 
-def create_robust_session():
-    """Create a requests session with retry strategy"""
-    session = requests.Session()
-    
-    # Define retry strategy
-    retry_strategy = Retry(
-        total=3,  # Total number of retries
-        backoff_factor=1,  # Wait time between retries (1, 2, 4 seconds)
-        status_forcelist=[429, 500, 502, 503, 504],  # HTTP status codes to retry
-        allowed_methods=["HEAD", "GET", "OPTIONS"]  # Only retry safe methods
-    )
-    
-    # Mount adapter with retry strategy
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    
-    return session
-
-class CircuitBreaker:
-    def __init__(self, failure_threshold=5, recovery_timeout=60):
-        self.failure_threshold = failure_threshold
-        self.recovery_timeout = recovery_timeout
-        self.failure_count = 0
-        self.last_failure_time = None
-        self.state = 'CLOSED'  # CLOSED, OPEN, HALF_OPEN
-        self.lock = threading.Lock()
-    
-    def is_open(self):
-        with self.lock:
-            if self.state == 'OPEN':
-                if datetime.now() - self.last_failure_time > timedelta(seconds=self.recovery_timeout):
-                    self.state = 'HALF_OPEN'
-                    return False
-                return True
-            return False
-    
-    def record_success(self):
-        with self.lock:
-            self.failure_count = 0
-            self.state = 'CLOSED'
-    
-    def record_failure(self):
-        with self.lock:
-            self.failure_count += 1
-            self.last_failure_time = datetime.now()
-            if self.failure_count >= self.failure_threshold:
-                self.state = 'OPEN'
-
-# Global circuit breaker instance
-spotify_circuit_breaker = CircuitBreaker()
+# Search endpoint breaker, kept under its old name for existing callers
+spotify_circuit_breaker = spotify_breakers.for_endpoint("search")
 
-def search_spotify_track_ultra_robust(artist, title, headers, playlist_type="clean", max_retries=2):
+def search_spotify_track_ultra_robust(artist, title, headers, playlist_type="clean", max_retries=2, harvest=None):
     """
-    Ultra-robust Spotify search with circuit breaker pattern and aggressive fallback
+    Ultra-robust Spotify search with circuit breaker pattern and aggressive fallback.
+    Every returned item warms the track metadata cache; harvest(items), if given,
+    receives the raw items too so callers can cache the ones we didn't pick.
     """
-    import re
-    
-    # Check circuit breaker
-    if spotify_circuit_breaker.is_open():
-        print(f"⚡ Circuit breaker OPEN - skipping Spotify search for '{title}' by '{artist}'")
+    if not artist or not title or not headers:
         return None
-    
-    def clean_text(text):
-        text = re.sub(r"\(.*?\)|\[.*?\]", "", text)
-        text = text.replace("feat.", "").replace("featuring", "")
-        return text.strip().lower()
 
-    if not artist or not title or not headers:
+    # Check the search endpoint's and this token's circuit breakers
+    permit = spotify_breakers.admit("search", headers)
+    if permit is None:
+        log_track_event(log, "⚡ Circuit breaker OPEN - skipping Spotify search for '%s' by '%s'", title, artist)
         return None
 
-    cleaned_title = clean_text(title)
-    cleaned_artist = clean_text(artist)
+    matcher = TrackMatcher(artist, title)
 
     # Much simpler query strategy to reduce load
     simple_queries = [
         f'{artist} {title}',  # Simplest query first
     ]
 
-    for attempt in range(max_retries):
-        for query in simple_queries:
-            try:
-                params = {
-                    "q": query, 
-                    "type": "track", 
-                    "limit": 3,  # Much smaller limit
-                    "market": "US"
-                }
+    # Outcome is reported to the breakers once, however many attempts the search takes
+    outcome = None
+    try:
+        for attempt in range(max_retries):
+            for query in simple_queries:
+                try:
+                    params = {
+                        "q": query, 
+                        "type": "track", 
+                        "limit": 3,  # Much smaller limit
+                        "market": "US"
+                    }
                 
-                # Very aggressive timeout
-                response = requests.get(
-                    "https://api.spotify.com/v1/search", 
-                    headers=headers, 
-                    params=params,
-                    timeout=(3, 5)  # Very short timeouts: 3s connect, 5s read
-                )
-
-                if response.status_code == 200:
-                    spotify_circuit_breaker.record_success()  # Record success
+                    # Very aggressive timeout
+                    response = spotify_get(
+                        "https://api.spotify.com/v1/search", 
+                        headers=headers, 
+                        params=params,
+                        timeout=(3, 5),  # Very short timeouts: 3s connect, 5s read
+                        shared=True,
+                        breaker=False  # admitted above; the outcome is reported once below
+                    )
+
+                    if response.status_code == 200:
+                        outcome = "success"
                     
-                    data = response.json()
-                    tracks = data.get("tracks", {}).get("items", [])
+                        data = response.json()
+                        tracks = data.get("tracks", {}).get("items", [])
+                        for track in tracks:
+                            remember_track_metadata(track)
+                        if harvest and tracks:
+                            harvest(tracks)
                     
-                    for track in tracks:
-                        # Very basic matching - just check if artist is somewhat similar
-                        t_name = clean_text(track.get("name", ""))
-                        t_artist = clean_text(track.get("artists", [{}])[0].get("name", ""))
-                        is_explicit = track.get("explicit", False)
-                        
-                        # Looser matching criteria
-                        if (cleaned_artist[:5] in t_artist or t_artist[:5] in cleaned_artist) and \
-                           (cleaned_title[:5] in t_name or t_name[:5] in cleaned_title):
-                            
-                            # Apply content filter
-                            if playlist_type.lower() == "clean" and is_explicit:
-                                continue
-                            elif playlist_type.lower() == "explicit" and not is_explicit:
-                                continue
-                            
-                            print(f"✅ Found track: '{track.get('name')}' by '{track.get('artists', [{}])[0].get('name')}'")
+                        # Rank every result; the best one above the threshold wins
+                        track = matcher.best(tracks, playlist_type)
+                        if track:
+                            log_track_event(log, "✅ Found track: '%s' by '%s'", track.get("name"),
+                                            track.get("artists", [{}])[0].get("name"))
                             return track["uri"]
                 
-                elif response.status_code == 429:
-                    # Rate limited - immediately break and record failure
-                    print(f"⏳ Rate limited - backing off")
-                    spotify_circuit_breaker.record_failure()
-                    time.sleep(5)
-                    return None
+                    elif response.status_code == 429:
+                        # The scheduler already waited out Retry-After and retried; a rate limit
+                        # is not an outage, so leave the circuit breaker alone
+                        log_track_event(log, "⏳ Still rate limited after scheduler retries - skipping '%s'", title)
+                        return None
                     
-                elif response.status_code in [401, 403]:
-                    print(f"🔐 Auth error: {response.status_code}")
-                    spotify_circuit_breaker.record_failure()
-                    return None
+                    elif response.status_code in [401, 403]:
+                        log.warning("🔐 Auth error: %s", response.status_code)
+                        outcome = "auth_failure"
+                        return None
                     
-            except requests.exceptions.Timeout:
-                print(f"⏰ Timeout on attempt {attempt + 1} - query: '{query[:20]}...'")
-                spotify_circuit_breaker.record_failure()
-                if attempt == max_retries - 1:
-                    return None
-                time.sleep(1)  # Short wait
-                continue
+                except requests.exceptions.Timeout:
+                    log.warning("⏰ Timeout on attempt %s - query: '%s...'", attempt + 1, query[:20])
+                    if attempt == max_retries - 1:
+                        outcome = "failure"
+                        return None
+                    time.sleep(1)  # Short wait
+                    continue
                 
-            except (requests.exceptions.ConnectionError, 
-                    requests.exceptions.RequestException) as e:
-                print(f"🌐 Network error: {str(e)[:50]}...")
-                spotify_circuit_breaker.record_failure()
-                if attempt == max_retries - 1:
+                except RateLimitTimeout:
+                    log_track_event(log, "⏳ Spotify queue full - skipping '%s'", title)
                     return None
-                time.sleep(1)
-                continue
                 
-            except Exception as e:
-                print(f"💥 Unexpected error: {str(e)[:50]}...")
-                spotify_circuit_breaker.record_failure()
-                return None
+                except (requests.exceptions.ConnectionError, 
+                        requests.exceptions.RequestException) as e:
+                    log.warning("🌐 Network error: %s...", str(e)[:50])
+                    if attempt == max_retries - 1:
+                        outcome = "failure"
+                        return None
+                    time.sleep(1)
+                    continue
+                
+                except Exception as e:
+                    log.warning("💥 Unexpected error: %s...", str(e)[:50])
+                    outcome = "failure"
+                    return None
 
-    return None
+        return None
+    finally:
+        if outcome == "success":
+            permit.success()
+        elif outcome == "auth_failure":
+            permit.failure(auth=True)
+        elif outcome == "failure":
+            permit.failure()
+        else:
+            # Rate limits and queue timeouts say nothing about endpoint health
+            permit.release()
 
 def batch_search_spotify_tracks_ultra_safe(track_list, headers, playlist_type="clean", batch_size=3):
     """
@@ -351,19 +444,19 @@ def batch_search_spotify_tracks_ultra_safe(track_list, headers, playlist_type="c
     found_tracks = []
     failed_tracks = []
     
-    print(f"🔄 Ultra-safe processing {len(track_list)} tracks in tiny batches of {batch_size}")
+    log.debug("🔄 Ultra-safe processing %s tracks in tiny batches of %s", len(track_list), batch_size)
     
     for i in range(0, len(track_list), batch_size):
         # Check if we should stop due to circuit breaker
         if spotify_circuit_breaker.is_open():
-            print(f"⚡ Circuit breaker OPEN - stopping batch processing")
+            log.warning("⚡ Circuit breaker OPEN - stopping batch processing")
             break
             
         batch = track_list[i:i + batch_size]
         batch_num = (i // batch_size) + 1
         total_batches = (len(track_list) + batch_size - 1) // batch_size
         
-        print(f"📦 Processing micro-batch {batch_num}/{total_batches}")
+        log.debug("📦 Processing micro-batch %s/%s", batch_num, total_batches)
         
         for track_info in batch:
             if isinstance(track_info, dict):
@@ -402,10 +495,10 @@ def batch_search_spotify_tracks_ultra_safe(track_list, headers, playlist_type="c
         
         # Longer delay between micro-batches
         if batch_num < total_batches:
-            print("⏳ Waiting between micro-batches...")
+            log.debug("⏳ Waiting between micro-batches...")
             time.sleep(2)  # 2 second delay
     
-    print(f"✅ Ultra-safe processing complete: {len(found_tracks)} found, {len(failed_tracks)} failed")
+    log.debug("✅ Ultra-safe processing complete: %s found, %s failed", len(found_tracks), len(failed_tracks))
     return found_tracks, failed_tracks
 
 # Batch processing function to handle multiple tracks efficiently
@@ -416,21 +509,21 @@ def batch_search_spotify_tracks(track_list, headers, playlist_type="clean", batc
     found_tracks = []
     failed_tracks = []
     
-    print(f"🔄 Processing {len(track_list)} tracks in batches of {batch_size}")
+    log.debug("🔄 Processing %s tracks in batches of %s", len(track_list), batch_size)
     
     for i in range(0, len(track_list), batch_size):
         batch = track_list[i:i + batch_size]
         batch_num = (i // batch_size) + 1
         total_batches = (len(track_list) + batch_size - 1) // batch_size
         
-        print(f"📦 Processing batch {batch_num}/{total_batches}")
+        log.debug("📦 Processing batch %s/%s", batch_num, total_batches)
         
         for track_info in batch:
             if isinstance(track_info, dict):
                 artist = track_info.get("artist", "")
                 track_name = track_info.get("track", "")
             else:
-                print(f"⚠️ Skipping invalid track format: {track_info}")
+                log.warning("⚠️ Skipping invalid track format: %s", track_info)
                 continue
             
             if not artist or not track_name:
@@ -455,7 +548,7 @@ def batch_search_spotify_tracks(track_list, headers, playlist_type="clean", batc
                     })
                     
             except Exception as e:
-                print(f"❌ Error processing '{track_name}' by '{artist}': {e}")
+                log.warning("❌ Error processing '%s' by '%s': %s", track_name, artist, e)
                 failed_tracks.append({
                     "artist": artist,
                     "track": track_name,
@@ -464,10 +557,10 @@ def batch_search_spotify_tracks(track_list, headers, playlist_type="clean", batc
         
         # Small delay between batches
         if batch_num < total_batches:
-            print("⏳ Brief pause between batches...")
+            log.debug("⏳ Brief pause between batches...")
             time.sleep(1)
     
-    print(f"✅ Batch processing complete: {len(found_tracks)} found, {len(failed_tracks)} failed")
+    log.debug("✅ Batch processing complete: %s found, %s failed", len(found_tracks), len(failed_tracks))
     return found_tracks, failed_tracks
 
 def get_valid_access_token(user_id=None):
@@ -475,15 +568,12 @@ def get_valid_access_token(user_id=None):
     Returns access token for given user_id or falls back to MoodQue account
     """
     try:
-        if user_id:
-            token = get_spotify_access_token()
-            if token:
-                return token
-        # Fallback if no user_id or token fetch failed
-        return refresh_access_token()
+        return get_system_access_token()
     except Exception as e:
-        print(f"❌ Error getting access token: {e}")
-        return refresh_access_token()
+        # One more attempt with a fresh token, as before; a second failure propagates
+        log.error("❌ Error getting access token: %s", e)
+        get_system_token_provider().invalidate()
+        return get_system_access_token()
 
 # Firestore helper functions
 def get_user_tokens(user_id):
@@ -495,7 +585,7 @@ def get_user_tokens(user_id):
             return doc.to_dict()
         return None
     except Exception as e:
-        print(f"❌ Error getting user tokens: {e}")
+        log.error("❌ Error getting user tokens: %s", e)
         return None
 
 def save_user_tokens(user_id, access_token, refresh_token):
@@ -506,26 +596,26 @@ def save_user_tokens(user_id, access_token, refresh_token):
             "spotify_refresh_token": refresh_token,
             "spotify_token_expires_at": str(int(time.time()) + 3600)
         }, merge=True)
-        print(f"✅ Saved tokens for user {user_id}")
+        log.debug("✅ Saved tokens for user %s", user_id)
     except Exception as e:
-        print(f"❌ Error saving user tokens: {e}")
+        log.error("❌ Error saving user tokens: %s", e)
 
 def record_social_interaction(data):
     """Record social interaction in Firestore"""
     try:
         db.collection("social_interactions").add(data)
-        print("✅ Social interaction recorded")
+        log.debug("✅ Social interaction recorded")
     except Exception as e:
-        print(f"❌ Error recording social interaction: {e}")
+        log.error("❌ Error recording social interaction: %s", e)
 
 def record_ml_feedback(data):
     """Record ML feedback in Firestore"""
     try:
         db.collection("ml_feedback").add(data)
-        print("✅ ML feedback recorded")
+        log.debug("✅ ML feedback recorded")
         return {"status": "success"}
     except Exception as e:
-        print(f"❌ Error recording ML feedback: {e}")
+        log.error("❌ Error recording ML feedback: %s", e)
         return {"status": "error", "message": str(e)}
 
 def post_data_back_to_glide(webhook_url, data):
@@ -534,7 +624,7 @@ def post_data_back_to_glide(webhook_url, data):
         response = requests.post(webhook_url, json=data)
         return response
     except Exception as e:
-        print(f"❌ Error posting to Glide: {e}")
+        log.error("❌ Error posting to Glide: %s", e)
         return None
 
 # Additional utility functions needed by the new engine
@@ -548,13 +638,13 @@ def search_spotify_tracks_enhanced_with_duration(genre, headers, target_duration
     REMOVED CIRCULAR IMPORT - This function is now just a placeholder
     The new engine handles this logic internally
     """
-    print(f"⚠️ search_spotify_tracks_enhanced_with_duration called - this should be handled by the new engine")
+    log.warning("⚠️ search_spotify_tracks_enhanced_with_duration called - this should be handled by the new engine")
     return []
 
 def search_artist_popular_tracks(artist_name, headers, limit=10):
     """Search for an artist's popular tracks directly on Spotify"""
     try:
-        print(f"🎤 Searching for popular tracks by: {artist_name}")
+        log.debug("🎤 Searching for popular tracks by: %s", artist_name)
         
         # First find the artist
         search_url = "https://api.spotify.com/v1/search"
@@ -564,27 +654,27 @@ def search_artist_popular_tracks(artist_name, headers, limit=10):
             "limit": 1
         }
         
-        res = requests.get(search_url, headers=headers, params=params)
+        res = spotify_get(search_url, headers=headers, params=params, shared=True)
         if res.status_code != 200:
-            print(f"❌ Artist search failed: {res.status_code}")
+            log.error("❌ Artist search failed: %s", res.status_code)
             return []
         
         data = res.json()
         artists = data.get("artists", {}).get("items", [])
         if not artists:
-            print(f"❌ Artist not found: {artist_name}")
+            log.warning("❌ Artist not found: %s", artist_name)
             return []
         
         artist_id = artists[0]["id"]
-        print(f"✅ Found artist {artist_name} with ID: {artist_id}")
+        log.debug("✅ Found artist %s with ID: %s", artist_name, artist_id)
         
         # Get artist's top tracks
         top_tracks_url = f"https://api.spotify.com/v1/artists/{artist_id}/top-tracks"
         params = {"market": "US"}
         
-        res = requests.get(top_tracks_url, headers=headers, params=params)
+        res = spotify_get(top_tracks_url, headers=headers, params=params, shared=True)
         if res.status_code != 200:
-            print(f"❌ Top tracks request failed: {res.status_code}")
+            log.error("❌ Top tracks request failed: %s", res.status_code)
             return []
         
         data = res.json()
@@ -595,11 +685,11 @@ def search_artist_popular_tracks(artist_name, headers, limit=10):
             if isinstance(track, dict) and "uri" in track:
                 track_uris.append(track["uri"])
         
-        print(f"✅ Found {len(track_uris)} popular tracks for {artist_name}")
+        log.debug("✅ Found %s popular tracks for %s", len(track_uris), artist_name)
         return track_uris
         
     except Exception as e:
-        print(f"❌ Error searching artist popular tracks: {e}")
+        log.error("❌ Error searching artist popular tracks: %s", e)
         return []
 
 def extract_tracks_from_search(search_response, playlist_type="clean"):
@@ -637,26 +727,46 @@ def extract_tracks_from_search(search_response, playlist_type="clean"):
         return tracks
         
     except Exception as e:
-        print(f"❌ Error extracting tracks from search: {e}")
+        log.error("❌ Error extracting tracks from search: %s", e)
         return tracks
     
-def fetch_user_playback_data(headers):
-    endpoints = {
-        "top_artists": "https://api.spotify.com/v1/me/top/artists?limit=10&time_range=medium_term",
-        "top_tracks": "https://api.spotify.com/v1/me/top/tracks?limit=10&time_range=medium_term",
-        "recently_played": "https://api.spotify.com/v1/me/player/recently-played?limit=10",
-        "saved_tracks": "https://api.spotify.com/v1/me/tracks?limit=10",
-        "playlists": "https://api.spotify.com/v1/me/playlists?limit=10"
-    }
+# The /me endpoints behind a taste snapshot
+USER_PLAYBACK_ENDPOINTS = {
+    "top_artists": "https://api.spotify.com/v1/me/top/artists?limit=10&time_range=medium_term",
+    "top_tracks": "https://api.spotify.com/v1/me/top/tracks?limit=10&time_range=medium_term",
+    "recently_played": "https://api.spotify.com/v1/me/player/recently-played?limit=10",
+    "saved_tracks": "https://api.spotify.com/v1/me/tracks?limit=10",
+    "playlists": "https://api.spotify.com/v1/me/playlists?limit=10"
+}
+USER_PLAYBACK_TIMEOUT = float(os.getenv("USER_PLAYBACK_TIMEOUT", "15"))  # seconds for all five
+
+def _fetch_playback_endpoint(key, url, headers):
+    r = spotify_get(url, headers=headers)
+    if r.status_code != 200:
+        log.error("❌ Error fetching %s: HTTP %s", key, r.status_code)
+        return None
+    return r.json()
 
+def fetch_user_playback_data(headers):
+    """Top artists/tracks, recent plays, saved tracks and playlists, fetched concurrently"""
     data = {}
-    for key, url in endpoints.items():
-        try:
-            r = requests.get(url, headers=headers)
-            if r.status_code == 200:
-                data[key] = r.json()
-        except Exception as e:
-            print(f"❌ Error fetching {key}: {e}")
+    executor = ThreadPoolExecutor(max_workers=len(USER_PLAYBACK_ENDPOINTS), thread_name_prefix="user-playback")
+    try:
+        futures = {executor.submit(_fetch_playback_endpoint, key, url, headers): key
+                   for key, url in USER_PLAYBACK_ENDPOINTS.items()}
+        done, not_done = wait(futures, timeout=USER_PLAYBACK_TIMEOUT)
+        for future in done:
+            key = futures[future]
+            try:
+                result = future.result()
+                if result is not None:
+                    data[key] = result
+            except Exception as e:
+                log.error("❌ Error fetching %s: %s", key, e)
+        if not_done:
+            log.warning("⏰ User playback timeout - missing %s", sorted(futures[f] for f in not_done))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
     return data
     
 def bulk_search_spotify_tracks(track_list, headers):
@@ -684,7 +794,7 @@ def bulk_search_spotify_tracks(track_list, headers):
         else:
             not_found.append(track)
 
-    print(f"🔎 Bulk search complete: {len(matches)} found, {len(not_found)} not found")
+    log.debug("🔎 Bulk search complete: %s found, %s not found", len(matches), len(not_found))
     return matches
 
 def find_spotify_track_id(track_name, artist_name, access_token):
@@ -693,7 +803,7 @@ def find_spotify_track_id(track_name, artist_name, access_token):
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"q": query, "type": "track", "limit": 1, "market": "US"}
 
-    response = requests.get(url, headers=headers, params=params)
+    response = spotify_get(url, headers=headers, params=params, shared=True)
     if response.status_code == 200:
         results = response.json()
         items = results.get("tracks", {}).get("items", [])
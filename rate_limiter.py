@@ -0,0 +1,159 @@
+# rate_limiter.py - Token buckets shared by every thread and every gunicorn worker on the host
+
+import os
+import json
+import asyncio
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes - fall back to a per-process bucket
+    fcntl = None
+
+# Where bucket state files live; every worker on the host must see the same directory
+RATE_LIMIT_STATE_DIR = os.getenv("RATE_LIMIT_STATE_DIR", tempfile.gettempdir())
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a caller could not get a token within its timeout"""
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state (tokens, last refill, pause deadline) lives in a small
+    file guarded by flock. Threads serialize on a local lock first, then processes
+    serialize on the file lock, so the whole host draws from one budget.
+    """
+
+    def __init__(self, name, rate, capacity=None, state_dir=RATE_LIMIT_STATE_DIR):
+        self.name = name
+        self.rate = float(rate)                      # tokens per second
+        self.capacity = float(capacity or rate)      # burst size
+        self.path = os.path.join(state_dir, f"moodque_ratelimit_{name}.json")
+        self.local_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.counters = {"acquired": 0, "delayed": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+                         "timeouts": 0, "pauses": 0}
+        # In-process state, used when fcntl is unavailable
+        self._memory_state = None
+
+    @contextmanager
+    def _locked_state(self):
+        """Yield the bucket state dict under both locks and write it back afterwards"""
+        with self.local_lock:
+            if fcntl is None:
+                if self._memory_state is None:
+                    self._memory_state = self._initial_state()
+                yield self._memory_state
+                return
+
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.read(fd, 4096)
+                try:
+                    state = json.loads(raw) if raw else self._initial_state()
+                except ValueError:
+                    state = self._initial_state()
+
+                yield state
+
+                payload = json.dumps(state).encode()
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, payload)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _initial_state(self):
+        return {"tokens": self.capacity, "updated": time.time(), "paused_until": 0.0}
+
+    def _refill(self, state, now):
+        # Nothing accrues while paused, so a lifted pause doesn't release a full burst at once
+        elapsed = max(0.0, now - max(state["updated"], state.get("paused_until", 0.0)))
+        state["tokens"] = min(self.capacity, state["tokens"] + elapsed * self.rate)
+        state["updated"] = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; otherwise return how long to wait before retrying"""
+        with self._locked_state() as state:
+            now = time.time()
+            self._refill(state, now)
+
+            paused_for = state.get("paused_until", 0.0) - now
+            if paused_for > 0:
+                return paused_for
+
+            if state["tokens"] >= tokens:
+                state["tokens"] -= tokens
+                return 0.0
+
+            return (tokens - state["tokens"]) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are available; returns the seconds spent queued"""
+        started = time.monotonic()
+        while True:
+            wait_for = self.try_acquire(tokens)
+            if wait_for <= 0:
+                break
+            self._check_timeout(started, wait_for, timeout)
+            # Sleep in short slices so a pause lifted by another worker is noticed quickly
+            time.sleep(min(wait_for, 0.25))
+        return self._record_acquired(started)
+
+    async def acquire_async(self, tokens=1, timeout=None):
+        """acquire() for asyncio callers: waits without blocking the event loop"""
+        started = time.monotonic()
+        while True:
+            # try_acquire takes a blocking flock and does file I/O - keep it off the loop
+            wait_for = await asyncio.to_thread(self.try_acquire, tokens)
+            if wait_for <= 0:
+                break
+            self._check_timeout(started, wait_for, timeout)
+            await asyncio.sleep(min(wait_for, 0.25))
+        return self._record_acquired(started)
+
+    def _check_timeout(self, started, wait_for, timeout):
+        waited = time.monotonic() - started
+        if timeout is not None and waited + wait_for > timeout:
+            with self.stats_lock:
+                self.counters["timeouts"] += 1
+            raise RateLimitTimeout(f"{self.name}: no token within {timeout}s")
+
+    def _record_acquired(self, started):
+        queued = time.monotonic() - started
+        with self.stats_lock:
+            self.counters["acquired"] += 1
+            if queued > 0.001:
+                self.counters["delayed"] += 1
+                self.counters["wait_seconds_total"] += queued
+                self.counters["wait_seconds_max"] = max(self.counters["wait_seconds_max"], queued)
+        return queued
+
+    def pause_for(self, seconds):
+        """Stop handing out tokens to every caller on the host for `seconds`"""
+        return self.pause_until(time.time() + seconds)
+
+    def pause_until(self, deadline):
+        with self._locked_state() as state:
+            if deadline > state.get("paused_until", 0.0):
+                state["paused_until"] = deadline
+                state["tokens"] = 0.0
+        with self.stats_lock:
+            self.counters["pauses"] += 1
+        return deadline
+
+    def stats(self):
+        with self.stats_lock:
+            stats = dict(self.counters)
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 3)
+        stats["wait_seconds_max"] = round(stats["wait_seconds_max"], 3)
+        stats["wait_seconds_mean"] = round(stats["wait_seconds_total"] / stats["delayed"], 3) if stats["delayed"] else 0.0
+        stats["rate_per_second"] = self.rate
+        stats["shared"] = fcntl is not None
+        return stats
@@ -0,0 +1,238 @@
+# spotify_client.py - Shared, pooled and rate-scheduled client for every Spotify API call
+
+import os
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from circuit_breaker import CircuitBreakerRegistry, endpoint_family
+from moodque_logging import get_logger
+from rate_limiter import RateLimitTimeout, SharedTokenBucket
+from single_flight import SingleFlight
+
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+# Connection / retry policy (overridable per deployment)
+SPOTIFY_POOL_SIZE = int(os.getenv("SPOTIFY_POOL_SIZE", "20"))              # keep-alive connections per host
+SPOTIFY_CONNECT_TIMEOUT = float(os.getenv("SPOTIFY_CONNECT_TIMEOUT", "3"))  # seconds
+SPOTIFY_READ_TIMEOUT = float(os.getenv("SPOTIFY_READ_TIMEOUT", "10"))       # seconds
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "2"))
+SPOTIFY_BACKOFF_FACTOR = float(os.getenv("SPOTIFY_BACKOFF_FACTOR", "0.3"))
+
+# Host-wide request budget; Spotify enforces a rolling 30s window per app
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "8"))      # requests per second
+SPOTIFY_RATE_BURST = float(os.getenv("SPOTIFY_RATE_BURST", "20"))
+SPOTIFY_RATE_LIMIT_RETRIES = int(os.getenv("SPOTIFY_RATE_LIMIT_RETRIES", "3"))
+SPOTIFY_RETRY_AFTER_DEFAULT = float(os.getenv("SPOTIFY_RETRY_AFTER_DEFAULT", "1"))  # seconds, when the header is missing
+SPOTIFY_RETRY_AFTER_MAX = float(os.getenv("SPOTIFY_RETRY_AFTER_MAX", "60"))        # never pause longer than this
+SPOTIFY_QUEUE_TIMEOUT = float(os.getenv("SPOTIFY_QUEUE_TIMEOUT", "30"))            # max seconds a call waits for a token
+
+
+# Breakers per endpoint family and per user token, so one bad token or one failing
+# endpoint doesn't block everyone else
+spotify_breakers = CircuitBreakerRegistry("spotify")
+
+log = get_logger("moodque.spotify_client")
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending when the endpoint family's or the token's breaker is open"""
+
+
+def _retry_policy(allowed_methods):
+    """
+    Connection failures are always retried (the request never reached Spotify).
+    Read errors and 5xx are only retried for methods that are safe to repeat;
+    429s are left to the scheduler, which honours Retry-After.
+    """
+    return Retry(
+        total=SPOTIFY_MAX_RETRIES,
+        connect=SPOTIFY_MAX_RETRIES,
+        backoff_factor=SPOTIFY_BACKOFF_FACTOR,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=allowed_methods,
+        raise_on_status=False
+    )
+
+
+def build_spotify_session(pool_size=SPOTIFY_POOL_SIZE) -> requests.Session:
+    """Session with keep-alive pools for the Web API and the accounts service"""
+    session = requests.Session()
+
+    # Web API: GET/PUT/DELETE are idempotent; a repeated POST could add tracks twice
+    api_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=_retry_policy(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"]))
+    # Accounts service: a token request can be repeated safely
+    accounts_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(2, pool_size // 4),
+                                   max_retries=_retry_policy(["GET", "POST"]))
+
+    session.mount("https://api.spotify.com/", api_adapter)
+    session.mount("https://accounts.spotify.com/", accounts_adapter)
+    session.headers.update({"User-Agent": "moodQue/2.0"})
+    return session
+
+
+def parse_retry_after(value, default=SPOTIFY_RETRY_AFTER_DEFAULT) -> float:
+    """Retry-After as seconds to wait; accepts delta-seconds or an HTTP date"""
+    if value is None:
+        return default
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return default
+    return max(0.0, min(seconds, SPOTIFY_RETRY_AFTER_MAX))
+
+
+class SpotifyRequestScheduler:
+    """
+    Every Spotify request takes a token from one host-wide bucket first. A 429 pauses
+    the bucket until its Retry-After deadline, so all callers on the host queue behind
+    it, and the rate-limited call is retried once the pause lifts. With a breaker
+    registry, each call is also admitted by its endpoint family's and token's breakers.
+    """
+
+    def __init__(self, bucket: SharedTokenBucket, max_retries=SPOTIFY_RATE_LIMIT_RETRIES,
+                 queue_timeout=SPOTIFY_QUEUE_TIMEOUT, send=None,
+                 timeout=(SPOTIFY_CONNECT_TIMEOUT, SPOTIFY_READ_TIMEOUT),
+                 breakers: Optional[CircuitBreakerRegistry] = None):
+        self.bucket = bucket
+        self.breakers = breakers
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.session = None if send else build_spotify_session()
+        self.send = send or self.session.request
+        self.single_flight = SingleFlight("spotify")
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "rate_limited_responses": 0, "retries": 0, "retry_after_seconds_total": 0.0}
+
+    def request(self, method: str, url: str, breaker=True, **kwargs) -> requests.Response:
+        """
+        Send a request when its breakers and the host-wide budget allow it. Returns the
+        final response; a 429 is only returned once max_retries is exhausted.
+        Raises CircuitOpenError if a breaker is open and rate_limiter.RateLimitTimeout if
+        no token frees up within queue_timeout. breaker=False is for callers that admit
+        and report to the breakers themselves.
+        Calls without an explicit timeout get the client's (connect, read) default.
+        """
+        if self.breakers is None or not breaker:
+            return self._send_scheduled(method, url, **kwargs)
+
+        family = endpoint_family(url)
+        permit = self.breakers.admit(family, kwargs.get("headers"))
+        if permit is None:
+            raise CircuitOpenError(f"Spotify circuit breaker open for {family}")
+        try:
+            res = self._send_scheduled(method, url, **kwargs)
+        except RateLimitTimeout:
+            permit.release()
+            raise
+        except requests.exceptions.RequestException:
+            permit.failure()
+            raise
+        except Exception:
+            permit.release()
+            raise
+
+        if res.status_code in (401, 403):
+            permit.failure(auth=True)
+        elif res.status_code >= 500:
+            permit.failure()
+        elif res.status_code == 429:
+            # A rate limit is not an outage
+            permit.release()
+        else:
+            permit.success()
+        return res
+
+    def _send_scheduled(self, method: str, url: str, **kwargs) -> requests.Response:
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(timeout=self.queue_timeout)
+            res = self.send(method, url, **kwargs)
+            with self.lock:
+                self.counters["requests"] += 1
+
+            if res.status_code != 429:
+                return res
+
+            retry_after = parse_retry_after(res.headers.get("Retry-After"))
+            with self.lock:
+                self.counters["rate_limited_responses"] += 1
+                self.counters["retry_after_seconds_total"] += retry_after
+            if attempt == self.max_retries:
+                break
+
+            log.warning("⏳ Spotify rate limit on %s %s - pausing all callers %.1fs", method, url.split('?')[0], retry_after)
+            # Pausing the shared bucket also holds back every other thread and worker
+            self.bucket.pause_for(retry_after)
+            with self.lock:
+                self.counters["retries"] += 1
+
+        log.warning("❌ Spotify still rate limited after %s retries: %s %s", self.max_retries, method, url.split('?')[0])
+        return res
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get_shared(self, url: str, headers=None, params=None, timeout=None, shared=False,
+                   breaker=True) -> requests.Response:
+        """
+        GET that shares one in-flight request between concurrent identical calls.
+        shared=True marks catalog endpoints (search, tracks, artists) whose response does not
+        depend on the caller's token, so identical requests from different users coalesce too.
+        """
+        auth = "" if shared else (headers or {}).get("Authorization", "")
+        key = (url, tuple(sorted((params or {}).items())), auth)
+        return self.single_flight.do(key, self.request, "GET", url, breaker=breaker,
+                                     headers=headers, params=params, timeout=timeout)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["retry_after_seconds_total"] = round(stats["retry_after_seconds_total"], 3)
+        stats["queue"] = self.bucket.stats()
+        stats["single_flight"] = self.single_flight.stats()
+        return stats
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_spotify_scheduler() -> SpotifyRequestScheduler:
+    """Process-wide Spotify scheduler drawing on the host-wide 'spotify' bucket"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                bucket = SharedTokenBucket("spotify", rate=SPOTIFY_RATE_LIMIT, capacity=SPOTIFY_RATE_BURST)
+                _scheduler = SpotifyRequestScheduler(bucket, breakers=spotify_breakers)
+    return _scheduler
+
+
+def spotify_request(method: str, url: str, **kwargs) -> requests.Response:
+    """Send any Spotify request (Web API or accounts service) through the shared client"""
+    return get_spotify_scheduler().request(method, url, **kwargs)
+
+
+def spotify_get(url, headers=None, params=None, timeout=None, shared=False, breaker=True) -> requests.Response:
+    return get_spotify_scheduler().get_shared(url, headers=headers, params=params, timeout=timeout,
+                                              shared=shared, breaker=breaker)
@@ -1,12 +1,13 @@
 import os
 import json
 import datetime
-import time
 import base64
 import requests
 
 # Use your existing Firebase initialization instead of creating a new one
 from firebase_admin_init import db
+from spotify_client import spotify_request, SPOTIFY_TOKEN_URL
+from token_provider import get_system_access_token, get_user_token_provider
 
 # Spotify credential environment variables
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
@@ -15,24 +16,8 @@ SPOTIFY_REFRESH_TOKEN = os.getenv("SPOTIFY_REFRESH_TOKEN")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI", "https://example.com/callback")
 
 def get_spotify_access_token():
-    """Get system/app access token for MoodQue"""
-    auth_header = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
-    headers = {
-        "Authorization": f"Basic {auth_header}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    data = {
-        "grant_type": "refresh_token",
-        "refresh_token": SPOTIFY_REFRESH_TOKEN
-    }
-    response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
-
-    if response.status_code != 200:
-        print("❌ Failed to refresh app access token", response.text)
-        raise Exception("Spotify token refresh failed")
-
-    token_info = response.json()
-    return token_info["access_token"]
+    """Get system/app access token for MoodQue (cached by token_provider)"""
+    return get_system_access_token()
 
 def refresh_token_with_spotify(refresh_token):
     """Refresh a user's token with Spotify API"""
@@ -46,7 +31,7 @@ def refresh_token_with_spotify(refresh_token):
         "refresh_token": refresh_token
     }
 
-    response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
+    response = spotify_request("POST", SPOTIFY_TOKEN_URL, headers=headers, data=data)
     if response.status_code != 200:
         print("❌ Failed to refresh user token", response.text)
         raise Exception("Spotify user token refresh failed")
@@ -59,54 +44,13 @@ def refresh_token_with_spotify(refresh_token):
 
 def refresh_access_token(user_id=None):
     """
-    Refresh the Spotify access token for a given user using their stored refresh token.
-    Checks expiry and only refreshes if needed.
+    A valid Spotify access token for a given user, refreshed from their stored refresh token
+    only when it is about to expire. Served from memory while valid; see UserTokenProvider.
     """
     if not user_id:
         raise ValueError("A user_id must be provided to refresh the access token.")
 
-    user_doc = db.collection("users").document(user_id).get()
-    if not user_doc.exists:
-        raise ValueError(f"User {user_id} not found in Firestore.")
-
-    user_data = user_doc.to_dict()
-    refresh_token = user_data.get("spotify_refresh_token")
-    if not refresh_token:
-        raise ValueError(f"No refresh token found for user {user_id}.")
-
-    # Check if the current token is still valid
-    try:
-        expires_at = float(user_data.get("spotify_token_expires_at", 0))
-    except (ValueError, TypeError):
-        expires_at = 0
-
-    if expires_at > time.time():
-        return user_data.get("spotify_access_token")
-
-    # Refresh the token with Spotify
-    token_url = "https://accounts.spotify.com/api/token"
-    payload = {
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-        "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
-        "client_secret": os.getenv("SPOTIFY_CLIENT_SECRET"),
-    }
-
-    r = requests.post(token_url, data=payload)
-    r.raise_for_status()
-    token_data = r.json()
-
-    # Update Firestore with new token and expiry
-    user_data["spotify_access_token"] = token_data["access_token"]
-    user_data["spotify_token_expires_at"] = str(time.time() + token_data.get("expires_in", 3600))
-
-    # Only update refresh token if Spotify provided a new one
-    if "refresh_token" in token_data and token_data["refresh_token"]:
-        user_data["spotify_refresh_token"] = token_data["refresh_token"]
-
-    db.collection("users").document(user_id).set(user_data, merge=True)
-
-    return token_data["access_token"]
+    return get_user_token_provider().get_token(user_id)
 
 def get_user_access_token(user_id):
     """
@@ -147,6 +91,7 @@ def revoke_user_tokens(user_id):
             "spotify_token_expiry": None,  # Clear old field name too
             "tokens_revoked_at": datetime.datetime.now().isoformat()
         })
+        get_user_token_provider().invalidate(user_id)
         print(f"✅ Revoked tokens for user {user_id}")
         return True
     except Exception as e:
@@ -188,7 +133,7 @@ def get_user_top_data(user_id, time_range="medium_term", limit=20):
 
     def spotify_get(endpoint, params=None):
         url = f"https://api.spotify.com/v1/{endpoint}"
-        r = requests.get(url, headers=headers, params=params)
+        r = spotify_request("GET", url, headers=headers, params=params)
         r.raise_for_status()
         return r.json()
 
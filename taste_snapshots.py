@@ -0,0 +1,202 @@
+# taste_snapshots.py - Compact per-user Spotify taste profiles, refreshed off the build path
+
+import os
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from cachetools import TTLCache
+
+from firebase_admin_init import db
+from moodque_logging import get_logger
+from moodque_utilities import fetch_user_playback_data, remember_track_metadata
+
+log = get_logger("moodque.taste_snapshots")
+
+TASTE_SNAPSHOT_COLLECTION = "taste_snapshots"
+TASTE_SNAPSHOT_REFRESH_AFTER = int(os.getenv("TASTE_SNAPSHOT_REFRESH_AFTER", str(12 * 3600)))  # seconds; older -> refresh
+TASTE_SNAPSHOT_TTL = int(os.getenv("TASTE_SNAPSHOT_TTL", str(7 * 24 * 3600)))  # seconds; older -> not used
+TASTE_SNAPSHOT_MEMORY_SIZE = int(os.getenv("TASTE_SNAPSHOT_MEMORY_SIZE", "2000"))
+TASTE_SNAPSHOT_MEMORY_TTL = int(os.getenv("TASTE_SNAPSHOT_MEMORY_TTL", "600"))  # seconds before re-reading Firestore
+TASTE_SNAPSHOT_WORKERS = int(os.getenv("TASTE_SNAPSHOT_WORKERS", "2"))
+TASTE_SNAPSHOT_RETRY_AFTER = int(os.getenv("TASTE_SNAPSHOT_RETRY_AFTER", "900"))  # seconds between attempts per user
+TASTE_SNAPSHOT_ITEMS = 10  # entries kept per list
+
+# Users without a connected Spotify account
+ANONYMOUS_USERS = {"", "anonymous", "unknown", None}
+
+
+def _track_summary(track) -> Optional[Dict]:
+    if not isinstance(track, dict) or not track.get("uri"):
+        return None
+    remember_track_metadata(track)
+    return {"track": track.get("name", ""), "artist": (track.get("artists") or [{}])[0].get("name", ""),
+            "uri": track["uri"]}
+
+
+def _items(data, key) -> List:
+    return (data.get(key) or {}).get("items", []) if isinstance(data, dict) else []
+
+
+def build_snapshot(playback_data: Dict) -> Dict:
+    """Reduce the raw /me responses to the few names and URIs builds need"""
+    top_artist_items = _items(playback_data, "top_artists")
+    genres = Counter(g for artist in top_artist_items for g in artist.get("genres", []))
+
+    recent = [_track_summary(item.get("track")) for item in _items(playback_data, "recently_played")]
+    saved = [_track_summary(item.get("track")) for item in _items(playback_data, "saved_tracks")]
+    top_tracks = [_track_summary(track) for track in _items(playback_data, "top_tracks")]
+
+    now = datetime.now()
+    return {
+        "top_artists": [a.get("name") for a in top_artist_items if a.get("name")][:TASTE_SNAPSHOT_ITEMS],
+        "top_tracks": [t for t in top_tracks if t][:TASTE_SNAPSHOT_ITEMS],
+        "recent_tracks": [t for t in recent if t][:TASTE_SNAPSHOT_ITEMS],
+        "saved_tracks": [t for t in saved if t][:TASTE_SNAPSHOT_ITEMS],
+        "playlists": [p.get("name") for p in _items(playback_data, "playlists") if p.get("name")][:TASTE_SNAPSHOT_ITEMS],
+        "top_genres": [g for g, _ in genres.most_common(TASTE_SNAPSHOT_ITEMS)],
+        "fetched_at": now.isoformat(),
+        "fetched_at_ts": time.time(),
+        # Firestore TTL policies delete documents once this timestamp passes
+        "expires_at": now + timedelta(seconds=TASTE_SNAPSHOT_TTL)
+    }
+
+
+def seed_artists(snapshot: Optional[Dict], limit: int = 3) -> List[str]:
+    """Seed artists from a snapshot: long-term favorites first, then what they played lately"""
+    if not snapshot:
+        return []
+    candidates = list(snapshot.get("top_artists", []))
+    for key in ("recent_tracks", "top_tracks", "saved_tracks"):
+        candidates.extend(t.get("artist") for t in snapshot.get(key, []))
+    return [a for a in dict.fromkeys(candidates) if a][:limit]
+
+
+class TasteSnapshotStore:
+    """Snapshots in a short-lived memory cache over Firestore; refreshes run on a small worker pool"""
+
+    def __init__(self, collection=TASTE_SNAPSHOT_COLLECTION, refresh_after=TASTE_SNAPSHOT_REFRESH_AFTER,
+                 ttl=TASTE_SNAPSHOT_TTL):
+        self.collection = collection
+        self.refresh_after = refresh_after
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=TASTE_SNAPSHOT_MEMORY_SIZE, ttl=TASTE_SNAPSHOT_MEMORY_TTL)
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        # Users refreshed (or tried) recently; stops every build re-queueing a user whose refresh fails
+        self.recent_attempts = TTLCache(maxsize=TASTE_SNAPSHOT_MEMORY_SIZE, ttl=TASTE_SNAPSHOT_RETRY_AFTER)
+        self.executor = ThreadPoolExecutor(max_workers=TASTE_SNAPSHOT_WORKERS, thread_name_prefix="taste-snapshot")
+        self.counters = {"hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def _age(self, snapshot) -> float:
+        return time.time() - snapshot.get("fetched_at_ts", 0)
+
+    def get(self, user_id) -> Optional[Dict]:
+        """
+        The user's snapshot if one younger than the TTL exists (memory, then Firestore).
+        Never calls Spotify: a missing or aging snapshot is refreshed in the background.
+        """
+        if user_id in ANONYMOUS_USERS:
+            return None
+
+        with self.lock:
+            snapshot = self.memory.get(user_id)
+        if snapshot is None:
+            snapshot = self._load(user_id)
+
+        if not snapshot or self._age(snapshot) > self.ttl:
+            with self.lock:
+                self.counters["misses"] += 1
+            self.refresh_in_background(user_id)
+            return None
+
+        if self._age(snapshot) > self.refresh_after:
+            with self.lock:
+                self.counters["stale"] += 1
+            self.refresh_in_background(user_id)
+
+        with self.lock:
+            self.counters["hits"] += 1
+        return snapshot
+
+    def _load(self, user_id) -> Optional[Dict]:
+        try:
+            doc = db.collection(self.collection).document(user_id).get()
+        except Exception as e:
+            log.warning("⚠️ Could not read taste snapshot for %s: %s", user_id, e)
+            return None
+        if not doc.exists:
+            return None
+        snapshot = doc.to_dict()
+        with self.lock:
+            self.memory[user_id] = snapshot
+        return snapshot
+
+    def refresh(self, user_id, headers=None) -> Optional[Dict]:
+        """Fetch the user's Spotify data (five endpoints at once) and store a fresh snapshot"""
+        if headers is None:
+            from spotify_token_manager import refresh_access_token
+            headers = {"Authorization": f"Bearer {refresh_access_token(user_id)}"}
+
+        snapshot = build_snapshot(fetch_user_playback_data(headers))
+        if not snapshot["top_artists"] and not snapshot["recent_tracks"] and not snapshot["top_tracks"]:
+            log.warning("⚠️ Taste snapshot for %s came back empty - keeping the old one", user_id)
+            return None
+
+        db.collection(self.collection).document(user_id).set(snapshot)
+        with self.lock:
+            self.memory[user_id] = snapshot
+            self.counters["refreshes"] += 1
+        log.info("🧑‍🎤 Refreshed taste snapshot for %s: %s top artists", user_id, len(snapshot["top_artists"]))
+        return snapshot
+
+    def refresh_in_background(self, user_id, headers=None) -> bool:
+        """Queue a refresh unless one is queued, running or was attempted recently for this user"""
+        if user_id in ANONYMOUS_USERS:
+            return False
+        with self.lock:
+            if user_id in self.refreshing or user_id in self.recent_attempts:
+                return False
+            self.refreshing.add(user_id)
+            self.recent_attempts[user_id] = True
+        self.executor.submit(self._refresh_job, user_id, headers)
+        return True
+
+    def _refresh_job(self, user_id, headers):
+        try:
+            self.refresh(user_id, headers)
+        except Exception as e:
+            with self.lock:
+                self.counters["refresh_errors"] += 1
+            log.error("❌ Taste snapshot refresh failed for %s: %s", user_id, e)
+        finally:
+            with self.lock:
+                self.refreshing.discard(user_id)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["in_memory"] = len(self.memory)
+            stats["refreshing"] = len(self.refreshing)
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_taste_snapshot_store() -> TasteSnapshotStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TasteSnapshotStore()
+    return _store
+
+
+def get_taste_seed_artists(user_id, limit: int = 3) -> List[str]:
+    """Default seed artists for a user from their stored snapshot (no Spotify calls)"""
+    return seed_artists(get_taste_snapshot_store().get(user_id), limit=limit)
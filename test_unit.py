@@ -60,6 +60,931 @@ class TestLastFMRecommender(unittest.TestCase):
         self.assertIn(current_decade, result)
         print("✅ Unknown artist handling test passed")
 
+class TestEraIndex(unittest.TestCase):
+    """Test normalized artist era lookups"""
+    
+    def test_build_path_uses_cached_tags_and_queues_the_rest(self):
+        """Test era learning never calls Last.fm on the build path and remembers eraless artists"""
+        import lastfm_recommender
+        from era_index import ArtistEraIndex
+        from lastfm_client import LastFMClient, LastFMResponseCache, InMemoryTransport, make_cache_key
+        
+        transport = InMemoryTransport()
+        client = LastFMClient(api_key="test", transport=transport, cache=LastFMResponseCache())
+        client.cache.set(make_cache_key("artist.gettoptags", {"artist": "Cached Act"}),
+                         {"toptags": {"tag": [{"name": "90s", "count": 80}]}}, 60)
+        client.cache.set(make_cache_key("artist.gettoptags", {"artist": "Tagless Act"}),
+                         {"toptags": {"tag": [{"name": "chill", "count": 80}]}}, 60)
+        index = ArtistEraIndex()
+        
+        with patch.object(lastfm_recommender, "ERA_INDEX", index), \
+             patch.object(lastfm_recommender, "get_lastfm_client", return_value=client), \
+             patch.object(lastfm_recommender, "queue_era_learning") as queue, patch('builtins.print'):
+            lastfm_recommender.learn_unknown_artist_eras(["Cached Act", "Tagless Act", "New Act"])
+            lastfm_recommender.learn_unknown_artist_eras(["Tagless Act"])
+        
+        self.assertEqual(transport.calls, [])
+        self.assertEqual(index.get("cached act"), ("1990s",))
+        self.assertTrue(index.is_settled("Tagless Act"))
+        queue.assert_called_once_with("New Act")
+        print("✅ Era learning build path test passed")
+    
+    def test_unknown_marker_expires(self):
+        """Test an eraless artist is retried once the negative entry ages out"""
+        import time
+        from era_index import ArtistEraIndex
+        index = ArtistEraIndex(unknown_retry_after=60)
+        index.mark_unknown("Quiet Act", at=time.time() - 120)
+        index.mark_unknown("Fresh Act")
+        self.assertFalse(index.is_settled("Quiet Act"))
+        self.assertTrue(index.is_settled("fresh act"))
+        self.assertNotIn("Fresh Act", index)
+        print("✅ Era index unknown marker test passed")
+    
+    def test_lookup_ignores_case_punctuation_and_article(self):
+        """Test user spellings resolve to the same artist as Last.fm's"""
+        from lastfm_recommender import find_era_overlap, get_artist_eras
+        self.assertEqual(get_artist_eras("beatles"), get_artist_eras("The Beatles"))
+        self.assertEqual(get_artist_eras("hall & oates"), ("1970s", "1980s"))
+        self.assertEqual(get_artist_eras("DR DRE"), get_artist_eras("Dr. Dre"))
+        with patch('builtins.print'):
+            self.assertEqual(find_era_overlap(["snoop dogg", "PHARRELL"]),
+                             find_era_overlap(["Pharrell", "Snoop Dogg"]))
+        print("✅ Normalized era lookup test passed")
+    
+    def test_tag_eras_extend_index_and_invalidate_memo(self):
+        """Test eras learned from Last.fm tags replace the current-decade fallback"""
+        from era_index import ArtistEraIndex, eras_from_tags
+        from lastfm_recommender import find_era_overlap
+        
+        tags = [("soul", 100), ("90s", 60), ("1980s", 40), ("00s rnb", 12), ("70s", 2)]
+        self.assertEqual(eras_from_tags(tags), ["1980s", "1990s", "2000s"])
+        
+        index = ArtistEraIndex()
+        with patch('lastfm_recommender.ERA_INDEX', index), patch('builtins.print'):
+            current_decade = f"{datetime.now().year//10*10}s"
+            self.assertEqual(find_era_overlap(["Toni Braxton"]), {current_decade: 1.0})
+            index.add("Toni Braxton", eras_from_tags(tags))
+            self.assertIn("1990s", find_era_overlap(["toni braxton"]))
+        print("✅ Tag-derived era test passed")
+
+class TestTrackMatcher(unittest.TestCase):
+    """Test scoring of Spotify search results against the requested track"""
+    
+    def _item(self, uri, artist, name, explicit=False):
+        return {"uri": uri, "name": name, "explicit": explicit, "artists": [{"name": artist}]}
+    
+    def test_ranks_best_result_despite_noise(self):
+        """Test the right track wins over prefix lookalikes, live takes and reordered titles"""
+        from track_matcher import TrackMatcher
+        items = [
+            self._item("live", "The Beatles", "Here Comes the Sun - Live"),
+            self._item("band", "The Band", "Here Comes the Night"),
+            self._item("right", "The Beatles", "Here Comes The Sun - Remastered 2009"),
+        ]
+        self.assertEqual(TrackMatcher("beatles", "Here Comes the Sun").best(items)["uri"], "right")
+        
+        reordered = [self._item("right", "Fleetwood Mac", "Go Your Own Way")]
+        self.assertIsNotNone(TrackMatcher("Fleetwood Mac", "Your Own Way Go").best(reordered))
+        print("✅ Track ranking test passed")
+    
+    def test_rejects_wrong_artist_and_respects_content_filter(self):
+        """Test nothing is accepted for another artist, and clean playlists skip explicit twins"""
+        from track_matcher import TrackMatcher
+        matcher = TrackMatcher("The Beatles", "Help!")
+        self.assertIsNone(matcher.best([self._item("x", "The Beach Boys", "Help Me, Rhonda")]))
+        
+        twins = [self._item("explicit", "The Beatles", "Help!", explicit=True),
+                 self._item("clean", "The Beatles", "Help!")]
+        self.assertEqual(matcher.best(twins, "clean")["uri"], "clean")
+        self.assertEqual(matcher.best(twins, "explicit")["uri"], "explicit")
+        print("✅ Track rejection test passed")
+
+class TestLastFMClient(unittest.TestCase):
+    """Test the shared Last.fm client and its response cache"""
+    
+    def _client(self, body, **cache_kwargs):
+        from lastfm_client import LastFMClient, LastFMResponseCache
+        client = LastFMClient(api_key="test", cache=LastFMResponseCache(**cache_kwargs))
+        response = MagicMock(status_code=200)
+        response.json.return_value = body
+        client.session.get = MagicMock(return_value=response)
+        return client
+    
+    def test_cache_normalizes_params(self):
+        """Test equivalent requests share one cached response"""
+        client = self._client({"similarartists": {"artist": []}})
+        client.call("artist.getSimilar", artist="The  Beatles ", limit=3)
+        client.call("artist.getsimilar", artist="the beatles", limit=3)
+        self.assertEqual(client.session.get.call_count, 1)
+        self.assertEqual(client.cache_stats()["memory_hits"], 1)
+        print("✅ Last.fm cache key normalization test passed")
+    
+    def test_cache_respects_ttl(self):
+        """Test expired entries are refetched and uncached methods always hit the API"""
+        client = self._client({"ok": True}, ttls={"artist.gettoptracks": 60})
+        with patch('lastfm_client.time.time', return_value=1000):
+            client.call("artist.gettoptracks", artist="Drake")
+        with patch('lastfm_client.time.time', return_value=1100):
+            client.call("artist.gettoptracks", artist="Drake")
+        client.call("artist.search", artist="Drake")
+        client.call("artist.search", artist="Drake")
+        self.assertEqual(client.session.get.call_count, 4)
+        self.assertEqual(client.cache_stats()["expired"], 1)
+        print("✅ Last.fm cache TTL test passed")
+
+    def test_rate_limit_error_is_retried(self):
+        """Test Last.fm error 29 pauses the shared bucket and retries instead of returning nothing"""
+        import tempfile
+        from lastfm_client import LastFMClient
+        from rate_limiter import SharedTokenBucket
+        
+        limited = MagicMock(status_code=200)
+        limited.json.return_value = {"error": 29, "message": "Rate Limit Exceeded"}
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {"toptracks": {"track": []}}
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            bucket = SharedTokenBucket("test_lastfm", rate=100, capacity=5, state_dir=tmp)
+            client = LastFMClient(api_key="test", rate_limiter=bucket)
+            client.session.get = MagicMock(side_effect=[limited, ok])
+            with patch('lastfm_client.LASTFM_RATE_LIMIT_BACKOFF', 0.05), patch('builtins.print'):
+                data = client.call("artist.gettoptracks", artist="Drake")
+        
+        self.assertEqual(data, {"toptracks": {"track": []}})
+        stats = client.rate_limit_stats()
+        self.assertEqual(stats["rate_limited_responses"], 1)
+        self.assertEqual(stats["pauses"], 1)
+        self.assertGreater(stats["wait_seconds_total"], 0)
+        print("✅ Last.fm rate limit retry test passed")
+    
+    def test_pause_does_not_refill_bucket(self):
+        """Test tokens only accrue after a pause lifts, so callers don't burst out together"""
+        import tempfile
+        from rate_limiter import SharedTokenBucket
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            bucket = SharedTokenBucket("test_pause", rate=10, capacity=10, state_dir=tmp)
+            with patch('rate_limiter.time.time', return_value=1000.0):
+                bucket.pause_until(1005.0)
+            with patch('rate_limiter.time.time', return_value=1005.1):
+                # One token has accrued in the 0.1s since the pause lifted - not the full capacity
+                self.assertEqual(bucket.try_acquire(), 0.0)
+                self.assertGreater(bucket.try_acquire(), 0.0)
+        print("✅ Rate limiter pause refill test passed")
+    
+    def test_in_memory_transport_parses_single_results(self):
+        """Test parsed helpers run offline and handle Last.fm's single-item dict responses"""
+        from lastfm_client import LastFMClient, InMemoryTransport
+        
+        transport = InMemoryTransport()
+        transport.add("artist.getsimilar", {"similarartists": {"artist": {"name": "Kendrick Lamar", "match": "0.9"}}},
+                      artist="Drake", limit=2)
+        transport.add("artist.gettoptracks", {"toptracks": {"track": [{"name": "Hotline Bling"}, {"rank": 2}]}},
+                      artist="Drake", limit=5)
+        client = LastFMClient(api_key="test", transport=transport)
+        
+        self.assertEqual(client.similar_artists("drake ", limit=2), [("Kendrick Lamar", 0.9)])
+        self.assertEqual(client.top_tracks("Drake", limit=5), [("Hotline Bling", "Drake")])
+        with patch('builtins.print'):
+            self.assertEqual(client.top_albums("Drake"), [])
+        self.assertEqual(len(transport.calls), 3)
+        print("✅ Last.fm in-memory transport test passed")
+    
+    def test_fixture_transport_records_then_replays(self):
+        """Test a recording run writes a fixture that a later offline run replays"""
+        import tempfile
+        from lastfm_client import LastFMClient, InMemoryTransport, FixtureTransport
+        
+        live = InMemoryTransport()
+        live.add("album.getinfo", {"album": {"tracks": {"track": [{"name": "Intro"}, {"name": "Outro"}]}}},
+                 artist="Adele", album="25")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fixtures.json")
+            recorder = LastFMClient(api_key="test", transport=FixtureTransport(path, record_from=live))
+            recorder.album_tracks("Adele", "25")
+            
+            replay = LastFMClient(api_key="test", transport=FixtureTransport(path))
+            self.assertEqual(replay.album_tracks("Adele", "25", limit=1), [("Intro", "Adele")])
+        
+        self.assertEqual(len(live.calls), 1)
+        print("✅ Last.fm fixture record/replay test passed")
+    
+    def test_fan_out_keeps_order_and_deadline(self):
+        """Test fan-out merges results in input order and drops work past the deadline"""
+        import time
+        from lastfm_client import fan_out
+        
+        def lookup(item):
+            time.sleep(item[1])
+            return item[0]
+        
+        items = [("a", 0.05), ("b", 0.0), ("slow", 2.0), ("c", 0.01)]
+        started = time.monotonic()
+        with patch('builtins.print'):
+            results = fan_out(lookup, items, deadline=started + 0.5, default=None)
+        self.assertEqual(results, ["a", "b", None, "c"])
+        self.assertLess(time.monotonic() - started, 1.5)
+        print("✅ Last.fm fan-out order/deadline test passed")
+
+class TestSpotifyScheduler(unittest.TestCase):
+    """Test the shared Spotify request scheduler"""
+    
+    def test_retry_after_pauses_everyone_then_retries(self):
+        """Test a 429 pauses the shared bucket for Retry-After and the call is retried, not lost"""
+        import tempfile
+        import time
+        from rate_limiter import SharedTokenBucket
+        from spotify_client import SpotifyRequestScheduler, parse_retry_after
+        
+        limited = MagicMock(status_code=429, headers={"Retry-After": "0.3"})
+        ok = MagicMock(status_code=200, headers={})
+        send = MagicMock(side_effect=[limited, ok, ok])
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            bucket = SharedTokenBucket("test_spotify", rate=100, capacity=10, state_dir=tmp)
+            scheduler = SpotifyRequestScheduler(bucket, send=send)
+            started = time.monotonic()
+            with patch('builtins.print'):
+                first = scheduler.get("https://api.spotify.com/v1/search")
+                second = scheduler.get("https://api.spotify.com/v1/tracks")
+            elapsed = time.monotonic() - started
+        
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertEqual(scheduler.stats()["rate_limited_responses"], 1)
+        self.assertEqual(parse_retry_after(None), 1.0)
+        self.assertEqual(parse_retry_after("100000"), 60.0)
+        print("✅ Spotify Retry-After scheduling test passed")
+
+    def test_session_retries_only_idempotent_api_calls(self):
+        """Test the shared session never re-sends Web API POSTs and every call gets a timeout"""
+        from spotify_client import SpotifyRequestScheduler, build_spotify_session
+        
+        session = build_spotify_session()
+        api_retry = session.get_adapter("https://api.spotify.com/v1/me").max_retries
+        token_retry = session.get_adapter("https://accounts.spotify.com/api/token").max_retries
+        self.assertNotIn("POST", api_retry.allowed_methods)
+        self.assertIn("PUT", api_retry.allowed_methods)
+        self.assertIn("POST", token_retry.allowed_methods)
+        
+        send = MagicMock(return_value=MagicMock(status_code=200))
+        scheduler = SpotifyRequestScheduler(MagicMock(), send=send, timeout=(1, 2))
+        scheduler.get("https://api.spotify.com/v1/me")
+        self.assertEqual(send.call_args.kwargs["timeout"], (1, 2))
+        print("✅ Spotify session retry policy test passed")
+
+class TestAsyncClients(unittest.TestCase):
+    """Test the asyncio httpx clients used by the async build path"""
+    
+    def test_spotify_search_retries_429_and_ranks_results(self):
+        """Test a rate-limited search is retried after Retry-After and the best item is picked"""
+        import asyncio
+        import tempfile
+        import httpx
+        from rate_limiter import SharedTokenBucket
+        from async_clients import AsyncSpotifyClient
+        
+        items = [{"uri": "live", "name": "Superstition - Live", "explicit": False, "artists": [{"name": "Stevie Wonder"}]},
+                 {"uri": "studio", "name": "Superstition", "explicit": False, "artists": [{"name": "Stevie Wonder"}]}]
+        responses = [httpx.Response(429, headers={"Retry-After": "0.1"}),
+                     httpx.Response(200, json={"tracks": {"items": items}})]
+        transport = httpx.MockTransport(lambda request: responses.pop(0))
+        
+        async def search(bucket):
+            client = AsyncSpotifyClient(bucket=bucket, transport=transport)
+            try:
+                return await client.search_track("Stevie Wonder", "Superstition", {"Authorization": "Bearer t"}), client.stats()
+            finally:
+                await client.aclose()
+        
+        with tempfile.TemporaryDirectory() as tmp, patch('builtins.print'):
+            bucket = SharedTokenBucket("test_async_spotify", rate=100, capacity=10, state_dir=tmp)
+            (uri, returned), stats = asyncio.run(search(bucket))
+        
+        self.assertEqual(uri, "studio")
+        self.assertEqual(len(returned), 2)
+        self.assertEqual((stats["requests"], stats["retries"]), (2, 1))
+        print("✅ Async Spotify search test passed")
+    
+    def test_lastfm_calls_coalesce_and_share_the_cache(self):
+        """Test concurrent identical Last.fm calls share one request and later calls hit the cache"""
+        import asyncio
+        import httpx
+        from lastfm_client import LastFMClient, LastFMResponseCache, make_cache_key
+        from async_clients import AsyncLastFMClient
+        
+        requests_seen = []
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json={"toptracks": {"track": [{"name": "Hey Ya!"}]}})
+        
+        sync_client = LastFMClient(api_key="test", cache=LastFMResponseCache(db_path=None))
+        
+        async def lookups():
+            client = AsyncLastFMClient(client=sync_client, transport=httpx.MockTransport(handler))
+            try:
+                first = await asyncio.gather(*(client.top_tracks("Outkast", limit=5) for _ in range(3)))
+                again = await client.top_tracks("outkast", limit=5)
+                return first, again
+            finally:
+                await client.aclose()
+        
+        first, again = asyncio.run(lookups())
+        self.assertEqual(first[0], [("Hey Ya!", "Outkast")])
+        self.assertEqual(len(requests_seen), 1)
+        self.assertEqual(again, [("Hey Ya!", "outkast")])
+        # The sync client reads the same cache entry without a request of its own
+        cache_key = make_cache_key("artist.gettoptracks", {"artist": "Outkast", "limit": 5})
+        self.assertIsNotNone(sync_client.cache.get(cache_key))
+        print("✅ Async Last.fm coalescing test passed")
+
+class TestTokenProvider(unittest.TestCase):
+    """Test the cached system token provider"""
+    
+    def test_token_cached_until_margin_and_refreshed_once(self):
+        """Test concurrent callers share one refresh and the token is reused until near expiry"""
+        import threading
+        import time
+        from token_provider import SystemTokenProvider
+        
+        issued = []
+        def send(method, url, **kwargs):
+            time.sleep(0.05)  # let the other threads pile up on the lock
+            issued.append(kwargs["data"]["refresh_token"])
+            return MagicMock(status_code=200, json=lambda: {"access_token": f"token{len(issued)}", "expires_in": 3600})
+        
+        provider = SystemTokenProvider("id", "secret", "refresh", margin=300, send=send)
+        tokens = []
+        with patch('builtins.print'):
+            threads = [threading.Thread(target=lambda: tokens.append(provider.get_token())) for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(tokens, ["token1"] * 5)
+            self.assertEqual(len(issued), 1)
+            
+            # Inside the safety margin the token is refreshed again
+            provider._token = ("token1", time.time() + 200)
+            self.assertEqual(provider.get_token(), "token2")
+        print("✅ System token caching test passed")
+    
+    def test_failed_refresh_raises(self):
+        """Test a rejected refresh raises instead of exiting the process"""
+        from token_provider import SystemTokenProvider, TokenRefreshError
+        send = MagicMock(return_value=MagicMock(status_code=400, text="invalid_grant"))
+        provider = SystemTokenProvider("id", "secret", "refresh", send=send)
+        with patch('builtins.print'), self.assertRaises(TokenRefreshError):
+            provider.get_token()
+        self.assertEqual(provider.stats()["failures"], 1)
+        print("✅ System token failure test passed")
+    
+    def test_system_spotify_user_id_looked_up_once(self):
+        """Test the app account's Spotify user ID costs one /me call per process"""
+        from token_provider import SystemTokenProvider
+        
+        def send(method, url, **kwargs):
+            if method == "POST":
+                return MagicMock(status_code=200, json=lambda: {"access_token": "app", "expires_in": 3600})
+            return MagicMock(status_code=200, json=lambda: {"id": "moodque_app"})
+        
+        provider = SystemTokenProvider("id", "secret", "refresh", send=MagicMock(side_effect=send))
+        provider._spotify_user_id = None
+        with patch('builtins.print'):
+            self.assertEqual(provider.spotify_user_id(), "moodque_app")
+            self.assertEqual(provider.spotify_user_id(), "moodque_app")
+        self.assertEqual(provider.send.call_count, 2)  # one token refresh, one /me
+        print("✅ System Spotify user ID test passed")
+
+class TestUserTokenProvider(unittest.TestCase):
+    """Test per-user token caching and single-flight refresh"""
+    
+    def make_provider(self, user_data, send):
+        from token_provider import UserTokenProvider
+        db = MagicMock()
+        ref = db.collection.return_value.document.return_value
+        ref.get.return_value = MagicMock(exists=True, to_dict=lambda: dict(user_data))
+        provider = UserTokenProvider(db, send=send)
+        provider._acquire_lease = MagicMock(side_effect=lambda _ref: dict(user_data))
+        return provider, ref
+    
+    def test_concurrent_refresh_writes_token_fields_once(self):
+        """Test concurrent builds for one user share a refresh that only writes token fields"""
+        import threading
+        import time
+        
+        def send(method, url, **kwargs):
+            time.sleep(0.05)
+            return MagicMock(status_code=200, json=lambda: {"access_token": "fresh", "expires_in": 3600})
+        
+        provider, ref = self.make_provider(
+            {"spotify_refresh_token": "r1", "spotify_access_token": "old", "spotify_token_expires_at": "0",
+             "spotify_display_name": "Someone"}, MagicMock(side_effect=send))
+        tokens = []
+        with patch('builtins.print'):
+            threads = [threading.Thread(target=lambda: tokens.append(provider.get_token("user1"))) for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        
+        self.assertEqual(tokens, ["fresh"] * 5)
+        self.assertEqual(provider.send.call_count, 1)
+        written = ref.update.call_args[0][0]
+        self.assertEqual(written["spotify_access_token"], "fresh")
+        self.assertNotIn("spotify_display_name", written)
+        self.assertNotIn("spotify_refresh_token", written)
+        
+        # The next build is served from memory without reading Firestore
+        reads = ref.get.call_count
+        self.assertEqual(provider.get_token("user1"), "fresh")
+        self.assertEqual(ref.get.call_count, reads)
+        print("✅ User token single-flight test passed")
+    
+    def test_valid_stored_token_skips_refresh(self):
+        """Test a token still valid in Firestore is used without calling Spotify"""
+        import time
+        send = MagicMock()
+        provider, ref = self.make_provider(
+            {"spotify_refresh_token": "r1", "spotify_access_token": "stored",
+             "spotify_token_expires_at": str(time.time() + 3000)}, send)
+        self.assertEqual(provider.get_token("user1"), "stored")
+        send.assert_not_called()
+        ref.update.assert_not_called()
+        
+        provider.invalidate("user1")
+        self.assertEqual(provider.stats()["cached_users"], 0)
+        print("✅ User token cache test passed")
+    
+    def test_refresh_ahead_of_expiry(self):
+        """Test a larger margin (the background refresher's) refreshes a token builds would still use"""
+        import time
+        send = MagicMock(return_value=MagicMock(status_code=200, json=lambda: {"access_token": "early", "expires_in": 3600}))
+        provider, ref = self.make_provider(
+            {"spotify_refresh_token": "r1", "spotify_access_token": "stored",
+             "spotify_token_expires_at": str(time.time() + 600)}, send)
+        with patch('builtins.print'):
+            self.assertEqual(provider.get_token("user1"), "stored")
+            self.assertEqual(provider.get_token("user1", margin=900), "early")
+        self.assertEqual(send.call_count, 1)
+        print("✅ User token refresh-ahead test passed")
+    
+    def test_spotify_user_id_cached_and_persisted(self):
+        """Test the Spotify user ID comes from the users doc and /me runs once for legacy docs"""
+        import time
+        send = MagicMock(return_value=MagicMock(status_code=200, json=lambda: {"id": "spotify_legacy"}))
+        provider, ref = self.make_provider(
+            {"spotify_refresh_token": "r1", "spotify_access_token": "stored",
+             "spotify_token_expires_at": str(time.time() + 3000)}, send)
+        self.assertEqual(provider.spotify_user_id("legacy"), "spotify_legacy")
+        self.assertEqual(provider.spotify_user_id("legacy"), "spotify_legacy")
+        self.assertEqual(send.call_count, 1)
+        ref.update.assert_called_once_with({"spotify_user_id": "spotify_legacy"})
+        
+        stored_send = MagicMock()
+        provider, _ = self.make_provider(
+            {"spotify_refresh_token": "r1", "spotify_access_token": "stored", "spotify_user_id": "spotify_known",
+             "spotify_token_expires_at": str(time.time() + 3000)}, stored_send)
+        self.assertEqual(provider.spotify_user_id("known"), "spotify_known")
+        stored_send.assert_not_called()
+        print("✅ Spotify user ID cache test passed")
+
+    def test_disconnect_in_another_worker_stops_cached_token(self):
+        """Test a second provider stops serving a token once another one disconnects the user"""
+        import time
+        user_data = {"spotify_refresh_token": "r1", "spotify_access_token": "stored", "spotify_user_id": "sp1",
+                     "spotify_token_expires_at": str(time.time() + 3000)}
+        handling_worker, _ = self.make_provider(user_data, MagicMock())
+        other_worker, ref = self.make_provider(user_data, MagicMock())
+        self.assertEqual(other_worker.get_token("user1"), "stored")
+        self.assertEqual(other_worker.spotify_user_id("user1"), "sp1")
+
+        # /disconnect_spotify clears the doc and only its own worker's cache
+        user_data.update({"spotify_access_token": None, "spotify_refresh_token": None, "spotify_user_id": None})
+        handling_worker.invalidate("user1")
+        self.assertEqual(other_worker.get_token("user1"), "stored")  # still inside the recheck window
+
+        later = time.time() + other_worker.recheck_seconds + 1
+        with patch('token_provider.time.time', return_value=later):
+            with self.assertRaises(ValueError):
+                other_worker.get_token("user1")
+            with self.assertRaises(ValueError):
+                other_worker.spotify_user_id("user1")
+        self.assertEqual(other_worker.stats()["cached_users"], 0)
+        other_worker.send.assert_not_called()
+        print("✅ Cross-worker disconnect test passed")
+
+class TestTokenRefresher(unittest.TestCase):
+    """Test the background refresher for recently active users' tokens"""
+
+    def make_refresher(self, provider):
+        from token_refresher import TokenRefresher
+        refresher = TokenRefresher(provider=provider)
+        refresher.bucket = MagicMock()
+        return refresher
+
+    def test_active_user_ids_skip_anonymous_and_repeats(self):
+        """Test active users come back once each, most recent first, without anonymous entries"""
+        refresher = self.make_refresher(MagicMock())
+        user_ids = ["u2", "anonymous", "u1", "u2", None, "", "unknown", "u3"]
+        docs = [MagicMock(to_dict=MagicMock(return_value={"user_id": u})) for u in user_ids]
+        with patch('token_refresher.db') as mock_db:
+            query = mock_db.collection.return_value.where.return_value.order_by.return_value
+            query.limit.return_value.select.return_value.stream.return_value = docs
+            self.assertEqual(refresher.active_user_ids(), ["u2", "u1", "u3"])
+        print("✅ Active user filtering test passed")
+
+    def test_counters_by_outcome(self):
+        """Test checked, skipped, deferred and failed users are counted separately"""
+        from rate_limiter import RateLimitTimeout
+        outcomes = {"gone": ValueError("no refresh token"), "busy": RateLimitTimeout("spotify"),
+                    "broken": RuntimeError("500")}
+
+        def get_token(user_id, margin=None, bucket=None):
+            if user_id in outcomes:
+                raise outcomes[user_id]
+            return "token"
+
+        refresher = self.make_refresher(MagicMock(get_token=MagicMock(side_effect=get_token)))
+        with patch('builtins.print'):
+            for user_id in ("ok", "gone", "busy", "broken"):
+                refresher._refresh_one(user_id)
+        stats = refresher.counters
+        self.assertEqual((stats["checked"], stats["skipped"], stats["deferred"], stats["failed"]), (1, 1, 1, 1))
+        print("✅ Token refresher counter test passed")
+
+    def test_rate_token_only_spent_on_refresh(self):
+        """Test a fresh cached token costs no rate token and an expiring one costs exactly one"""
+        import time
+        from token_provider import UserTokenProvider
+        db = MagicMock()
+        user_data = {"spotify_refresh_token": "r1", "spotify_access_token": "old",
+                     "spotify_token_expires_at": str(time.time() + 60)}
+        db.collection.return_value.document.return_value.get.return_value = MagicMock(
+            exists=True, to_dict=lambda: dict(user_data))
+        send = MagicMock(return_value=MagicMock(status_code=200, json=lambda: {"access_token": "new", "expires_in": 3600}))
+        provider = UserTokenProvider(db, send=send)
+        provider._acquire_lease = MagicMock(side_effect=lambda _ref: dict(user_data))
+        provider.remember("fresh", "cached", time.time() + 3600)
+        refresher = self.make_refresher(provider)
+
+        with patch('builtins.print'):
+            refresher._refresh_one("fresh")
+            refresher.bucket.acquire.assert_not_called()
+            refresher._refresh_one("expiring")
+        refresher.bucket.acquire.assert_called_once()
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(refresher.counters["checked"], 2)
+        print("✅ Token refresher rate budget test passed")
+
+class TestStructuredLogging(unittest.TestCase):
+    """Test the level-gated logging helpers"""
+    
+    def test_lazy_payloads_and_track_sampling(self):
+        """Test payloads are only serialized when emitted and per-track events are gated"""
+        import logging
+        from moodque_logging import LazyJSON, log_track_event
+        
+        logger = logging.getLogger("moodque.test_lazy")
+        logger.setLevel(logging.INFO)
+        
+        with self.assertLogs(logger, level="INFO") as captured:
+            with patch('moodque_logging.json.dumps', return_value="{}") as dumps:
+                logger.debug("payload: %s", LazyJSON({"row_id": "r1"}))
+                dumps.assert_not_called()
+            for i in range(50):
+                log_track_event(logger, "Found: %s", i, rate=0)
+            log_track_event(logger, "Found: %s", "sampled", rate=1)
+        self.assertEqual(len(captured.records), 1)
+        
+        logger.setLevel(logging.DEBUG)
+        with self.assertLogs(logger, level="DEBUG") as captured:
+            for i in range(3):
+                log_track_event(logger, "Found: %s", i, rate=0)
+        self.assertEqual(len(captured.records), 3)
+        print("✅ Lazy logging test passed")
+    
+    def test_request_summary_and_levels(self):
+        """Test one summary record per request and the per-logger level spec"""
+        import json
+        import logging
+        from moodque_logging import JsonFormatter, RequestSummary, parse_levels
+        
+        logger = logging.getLogger("moodque.test_summary")
+        with self.assertLogs(logger, level="INFO") as captured:
+            summary = RequestSummary(logger, "glide_social", "row-42", user_id="u1")
+            summary.update(track_count=12)
+            summary.finish(status="completed")
+            summary.finish(status="completed")
+        self.assertEqual(len(captured.records), 1)
+        entry = json.loads(JsonFormatter().format(captured.records[0]))
+        self.assertEqual(entry["row_id"], "row-42")
+        self.assertEqual(entry["track_count"], 12)
+        self.assertIn("elapsed_ms", entry)
+        
+        self.assertEqual(parse_levels("moodque.engine=debug, moodque.utilities=WARNING,bad"),
+                         {"moodque.engine": "DEBUG", "moodque.utilities": "WARNING"})
+        print("✅ Request summary test passed")
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test endpoint/principal circuit breakers"""
+    
+    def test_half_open_admits_bounded_probes(self):
+        """Test a recovering breaker lets only a few probes through and closes after enough successes"""
+        from circuit_breaker import CircuitBreaker
+        
+        breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=0,
+                                 half_open_max_probes=2, success_threshold=2)
+        with patch('builtins.print'):
+            breaker.record_failure()
+            breaker.record_failure()
+            self.assertEqual(breaker.state, 'OPEN')
+            admitted = [breaker.allow_request() for _ in range(5)]
+            self.assertEqual(admitted, [True, True, False, False, False])
+            breaker.record_success()
+            breaker.record_success()
+        self.assertEqual(breaker.state, 'CLOSED')
+        print("✅ Half-open probe limit test passed")
+    
+    def test_auth_failures_only_block_that_token(self):
+        """Test one user's 401s open their own breaker, not the endpoint for everyone"""
+        from circuit_breaker import CircuitBreakerRegistry, endpoint_family
+        
+        registry = CircuitBreakerRegistry("test")
+        bad = {"Authorization": "Bearer expired"}
+        good = {"Authorization": "Bearer fresh"}
+        with patch('builtins.print'):
+            for _ in range(5):
+                registry.admit("search", bad).failure(auth=True)
+        
+        self.assertIsNone(registry.admit("search", bad))
+        self.assertIsNotNone(registry.admit("search", good))
+        self.assertEqual(registry.stats()["endpoints"]["search"]["state"], 'CLOSED')
+        self.assertEqual(endpoint_family("https://api.spotify.com/v1/playlists/abc/tracks"), "playlists")
+        print("✅ Per-token circuit breaker test passed")
+
+    def test_scheduler_routes_calls_through_family_breakers(self):
+        """Test failing playlist writes open only the playlists breaker for scheduled calls"""
+        from circuit_breaker import CircuitBreakerRegistry
+        from spotify_client import CircuitOpenError, SpotifyRequestScheduler
+
+        failing = MagicMock(status_code=503, headers={})
+        ok = MagicMock(status_code=200, headers={})
+        send = MagicMock(side_effect=lambda method, url, **kwargs: failing if "playlists" in url else ok)
+        registry = CircuitBreakerRegistry("test")
+        scheduler = SpotifyRequestScheduler(MagicMock(), send=send, breakers=registry)
+        headers = {"Authorization": "Bearer fresh"}
+        playlist_url = "https://api.spotify.com/v1/playlists/abc/tracks"
+
+        with patch('builtins.print'):
+            for _ in range(5):
+                scheduler.post(playlist_url, headers=headers)
+            with self.assertRaises(CircuitOpenError):
+                scheduler.post(playlist_url, headers=headers)
+            self.assertEqual(scheduler.get("https://api.spotify.com/v1/search", headers=headers).status_code, 200)
+            # Callers that admit themselves bypass the scheduler's breakers
+            self.assertEqual(scheduler.request("POST", playlist_url, breaker=False, headers=headers).status_code, 503)
+
+        self.assertEqual(registry.stats()["endpoints"]["playlists"]["state"], 'OPEN')
+        self.assertEqual(registry.stats()["endpoints"]["search"]["state"], 'CLOSED')
+        print("✅ Scheduler circuit breaker routing test passed")
+
+class TestSingleFlight(unittest.TestCase):
+    """Test request coalescing for identical upstream calls"""
+    
+    def test_concurrent_calls_share_one_execution(self):
+        """Test concurrent callers with the same key share one call and its result"""
+        import threading
+        import time
+        from single_flight import SingleFlight
+        
+        flight = SingleFlight()
+        calls = []
+        
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"tracks": ["a"]}
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("search:drake", fetch))) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"tracks": ["a"]}] * 6)
+        self.assertEqual(flight.stats()["coalesced"], 5)
+        # Once finished, the next call goes upstream again
+        flight.do("search:drake", fetch)
+        self.assertEqual(len(calls), 2)
+        print("✅ Single-flight coalescing test passed")
+
+class TestGenrePools(unittest.TestCase):
+    """Test genre-only candidate pools"""
+    
+    def _store(self):
+        import time
+        from genre_pools import GenrePoolStore, pool_doc_id
+        store = GenrePoolStore(max_age=3600)
+        store.pools[pool_doc_id("pop", "current")] = {
+            "built_at_ts": time.time(),
+            "tracks": [
+                {"artist": "A", "track": "Clean One", "uri": "spotify:track:c1", "explicit": False},
+                {"artist": "B", "track": "Explicit One", "uri": "spotify:track:e1", "explicit": True},
+                {"artist": "C", "track": "Legacy", "uri": "spotify:track:l1"}
+            ]
+        }
+        return store
+    
+    def test_era_buckets(self):
+        """Test listeners map to the decade they turned 18 in, clamped to the known buckets"""
+        from genre_pools import era_bucket_for, era_weights_for_bucket
+        self.assertEqual(era_bucket_for(None), "current")
+        self.assertEqual(era_bucket_for("not a year"), "current")
+        self.assertEqual(era_bucket_for(1975), "1990s")
+        self.assertEqual(era_bucket_for("1990"), "2000s")
+        self.assertEqual(era_bucket_for(1930), "1960s")
+        self.assertEqual(era_bucket_for(2008), "current")
+        self.assertIsNone(era_weights_for_bucket("current"))
+        self.assertIn("1990s", era_weights_for_bucket("1990s"))
+        print("✅ Genre pool era bucket test passed")
+    
+    def test_pool_filtered_by_playlist_type(self):
+        """Test clean builds never get explicit candidates and explicit builds only get explicit ones"""
+        store = self._store()
+        clean = store.get("Pop", playlist_type="clean")
+        self.assertEqual([t["uri"] for t in clean], ["spotify:track:c1", "spotify:track:l1"])
+        explicit = store.get("pop", playlist_type="explicit")
+        self.assertEqual([t["uri"] for t in explicit], ["spotify:track:e1"])
+        self.assertEqual(len(store.get("pop", playlist_type="any")), 3)
+        
+        # Callers get copies they can annotate
+        clean[0]["score"] = 1.0
+        self.assertNotIn("score", store.get("pop")[0])
+        print("✅ Genre pool playlist type filter test passed")
+    
+    def test_missing_pools_fall_back_to_discovery(self):
+        """Test unknown genres and genres without a fresh pool return None"""
+        store = self._store()
+        with patch('genre_pools.db') as mock_db:
+            mock_db.collection.return_value.document.return_value.get.return_value = MagicMock(exists=False)
+            self.assertIsNone(store.get("polka-trance"))
+            self.assertIsNone(store.get("hip-hop"))
+            self.assertIsNone(store.get("pop", birth_year=1970))
+        self.assertEqual(store.stats()["misses"], 2)
+        print("✅ Genre pool fallback test passed")
+
+class TestArtistGraph(unittest.TestCase):
+    """Test the local artist-similarity graph"""
+    
+    def setUp(self):
+        from artist_graph import ArtistSimilarityGraph
+        self.graph = ArtistSimilarityGraph()
+        self.graph.add_similar("Maxwell", [("Usher", 1.0), ("Ne-Yo", 0.8), ("Sade", 0.5)])
+        self.graph.add_similar("Usher", [("Ne-Yo", 0.9), ("Trey Songz", 0.7)])
+    
+    def test_neighbors_and_multi_hop(self):
+        """Test direct neighbors are ranked and multi-hop paths are damped"""
+        self.assertEqual(self.graph.neighbors("maxwell", limit=2), [("Usher", 1.0), ("Ne-Yo", 0.8)])
+        hood = dict(self.graph.neighborhood(["Maxwell"], hops=2))
+        self.assertEqual(hood["Ne-Yo"], 0.8)  # direct edge beats the 2-hop path
+        self.assertAlmostEqual(hood["Trey Songz"], 0.35)
+        print("✅ Artist graph neighborhood test passed")
+    
+    def test_shared_neighbors_and_persistence(self):
+        """Test shared-neighbor scoring and a save/load round trip"""
+        import tempfile
+        from artist_graph import ArtistSimilarityGraph
+        self.assertGreater(self.graph.shared_neighbor_score("Maxwell", "Usher"), 0)
+        self.assertEqual(self.graph.shared_neighbor_score("Maxwell", "Nobody"), 0.0)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "graph.json")
+            self.graph.save(path)
+            with patch('builtins.print'):
+                loaded = ArtistSimilarityGraph(path=path)
+        self.assertEqual(loaded.neighbors("Usher"), self.graph.neighbors("Usher"))
+        self.assertTrue(loaded.has_fresh_neighbors("Usher"))
+        print("✅ Artist graph persistence test passed")
+    
+    def test_fresh_neighbors_rule(self):
+        """Test a fetched list (even an empty one) is fresh until max_age, and never-fetched artists are not"""
+        import time
+        from artist_graph import ArtistSimilarityGraph
+        graph = ArtistSimilarityGraph(max_age=60)
+        graph.add_similar("Obscure Act", [])
+        graph.add_similar("Old Fetch", [("Someone", 0.5)], fetched_at=time.time() - 120)
+        self.assertTrue(graph.has_fresh_neighbors("obscure act"))
+        self.assertFalse(graph.has_fresh_neighbors("Old Fetch"))
+        self.assertFalse(graph.has_fresh_neighbors("Never Asked"))
+        print("✅ Artist graph freshness test passed")
+
+class TestTasteSnapshots(unittest.TestCase):
+    """Test compact taste snapshots and their background refresh"""
+
+    def _store(self, age):
+        import time
+        from taste_snapshots import TasteSnapshotStore
+        store = TasteSnapshotStore(refresh_after=3600, ttl=7200)
+        store.executor = MagicMock()
+        store.memory["u1"] = {"top_artists": ["A"], "fetched_at_ts": time.time() - age}
+        return store
+
+    def test_build_snapshot_compacts_playback_data(self):
+        """Test the raw /me responses shrink to capped name/URI lists with a TTL expiry"""
+        from datetime import datetime, timedelta
+        from taste_snapshots import build_snapshot, TASTE_SNAPSHOT_ITEMS, TASTE_SNAPSHOT_TTL
+        track = {"uri": "spotify:track:1", "name": "Song", "artists": [{"name": "A"}], "duration_ms": 1000}
+        playback = {
+            "top_artists": {"items": [{"name": f"Artist {i}", "genres": ["soul"] + (["funk"] if i % 2 else [])}
+                                      for i in range(15)]},
+            "top_tracks": {"items": [track, {"name": "No URI"}]},
+            "recently_played": {"items": [{"track": track}, {"track": None}]},
+            "saved_tracks": None,
+            "playlists": {"items": [{"name": "Gym"}, {}]},
+        }
+        with patch('taste_snapshots.remember_track_metadata') as remember:
+            snapshot = build_snapshot(playback)
+
+        self.assertEqual(len(snapshot["top_artists"]), TASTE_SNAPSHOT_ITEMS)
+        self.assertEqual(snapshot["top_genres"], ["soul", "funk"])
+        self.assertEqual(snapshot["top_tracks"], [{"track": "Song", "artist": "A", "uri": "spotify:track:1"}])
+        self.assertEqual(len(snapshot["recent_tracks"]), 1)
+        self.assertEqual((snapshot["saved_tracks"], snapshot["playlists"]), ([], ["Gym"]))
+        self.assertEqual(remember.call_count, 2)
+        expected_expiry = datetime.now() + timedelta(seconds=TASTE_SNAPSHOT_TTL)
+        self.assertLess(abs((snapshot["expires_at"] - expected_expiry).total_seconds()), 5)
+        print("✅ Taste snapshot compaction test passed")
+
+    def test_seed_artists_order_and_dedupe(self):
+        """Test favorites come first, then recent plays, without repeats or blanks"""
+        from taste_snapshots import seed_artists
+        snapshot = {
+            "top_artists": ["A", "B"],
+            "recent_tracks": [{"artist": "C"}, {"artist": "A"}, {"artist": ""}],
+            "top_tracks": [{"artist": "D"}],
+        }
+        self.assertEqual(seed_artists(snapshot, limit=3), ["A", "B", "C"])
+        self.assertEqual(seed_artists(snapshot, limit=10), ["A", "B", "C", "D"])
+        self.assertEqual(seed_artists(None), [])
+        print("✅ Taste seed artists test passed")
+
+    def test_stale_snapshot_served_and_refreshed_once(self):
+        """Test an aging snapshot is still returned and queues a single background refresh"""
+        store = self._store(age=5000)
+        self.assertIsNotNone(store.get("u1"))
+        self.assertIsNotNone(store.get("u1"))
+        store.executor.submit.assert_called_once_with(store._refresh_job, "u1", None)
+        self.assertEqual(store.stats()["stale"], 2)
+        print("✅ Stale taste snapshot test passed")
+
+    def test_expired_snapshot_not_used(self):
+        """Test a snapshot past its TTL is ignored and refreshed in the background"""
+        store = self._store(age=10000)
+        self.assertIsNone(store.get("u1"))
+        self.assertIsNone(store.get("anonymous"))
+        store.executor.submit.assert_called_once()
+        self.assertEqual(store.stats()["misses"], 1)
+        print("✅ Expired taste snapshot test passed")
+
+    def test_refresh_cooldown(self):
+        """Test a user isn't re-queued while a refresh runs or within the retry window after it"""
+        store = self._store(age=0)
+        self.assertTrue(store.refresh_in_background("u2"))
+        self.assertFalse(store.refresh_in_background("u2"))
+        with patch.object(store, 'refresh', side_effect=RuntimeError("spotify down")):
+            store._refresh_job("u2", None)
+        self.assertFalse(store.refresh_in_background("u2"))
+        self.assertEqual(store.stats()["refresh_errors"], 1)
+        store.recent_attempts.clear()
+        self.assertTrue(store.refresh_in_background("u2"))
+        print("✅ Taste snapshot refresh cooldown test passed")
+
+class TestBuildResult(unittest.TestCase):
+    """Test the structured result returned by playlist builds"""
+    
+    def test_result_carries_response_fields(self):
+        """Test ID, count, duration and code URL come from the result without any API call"""
+        from build_result import BuildResult
+        result = BuildResult.from_url(
+            "https://open.spotify.com/playlist/abc123?si=x",
+            uris=["spotify:track:1", "spotify:track:2"],
+            duration_ms=390000,
+            stage_stats={"search": {"seconds": 1.2, "cache_hits": 2}}
+        )
+        self.assertEqual(result.playlist_id, "abc123")
+        self.assertEqual(result.track_count, 2)
+        self.assertEqual(result.duration_minutes, 6.5)
+        self.assertFalse(result.duration_partial)
+        self.assertTrue(result.spotify_code_url.endswith("spotify:playlist:abc123"))
+        self.assertEqual(str(result), result.url)
+        self.assertEqual(result.to_dict()["track_count"], 2)
+        print("✅ Build result test passed")
+
 class TestMoodQueEngine(unittest.TestCase):
     """Test core moodQue engine functions"""
     
@@ -87,6 +1012,163 @@ class TestMoodQueEngine(unittest.TestCase):
         self.assertLessEqual(len(result), 2)  # Should limit to 2 genres
         print("✅ Genre parsing test passed")
 
+class TestTrackCache(unittest.TestCase):
+    """Test the persistent track ID cache and its clean/explicit variants"""
+
+    def _item(self, uri, name, explicit, artist="Artist"):
+        return {"uri": uri, "name": name, "explicit": explicit, "duration_ms": 200000,
+                "artists": [{"name": artist}]}
+
+    def test_pick_variant(self):
+        """Test clean/explicit playlists get their own variant and legacy entries always match"""
+        from moodque_engine import TrackCache
+        both = {"track_id": "e", "explicit": True, "explicit_track_id": "e", "clean_track_id": "c"}
+        explicit_only = {"track_id": "e", "explicit": True, "explicit_track_id": "e"}
+        legacy = {"track_id": "old"}
+        self.assertEqual(TrackCache._pick_variant(both, "Clean"), "c")
+        self.assertEqual(TrackCache._pick_variant(both, "explicit"), "e")
+        self.assertIsNone(TrackCache._pick_variant(explicit_only, "clean"))
+        self.assertEqual(TrackCache._pick_variant(explicit_only, None), "e")
+        self.assertEqual(TrackCache._pick_variant(legacy, "clean"), "old")
+        print("✅ Track cache variant selection test passed")
+
+    def test_store_many_merges_variants_in_one_batch(self):
+        """Test entries are written in one merged batch with variant IDs and durations"""
+        from moodque_engine import TrackCache
+        cache = TrackCache()
+        entries = [
+            cache.entry_from_search_item(self._item("spotify:track:c", "Song", False)),
+            cache.entry_from_search_item(self._item("spotify:track:e", "Song", True)),
+            cache.entry_from_search_item({"uri": "spotify:track:x", "name": "No Artist"}),
+            {"artist": "Artist", "track": "", "track_id": "spotify:track:y"},
+        ]
+        with patch('moodque_engine.db') as mock_db, patch('builtins.print'):
+            stored = cache.store_many(entries)
+
+        batch = mock_db.batch.return_value
+        self.assertEqual(stored, 2)
+        batch.commit.assert_called_once()
+        written = [c.args[1] for c in batch.set.call_args_list]
+        self.assertTrue(all(c.kwargs["merge"] for c in batch.set.call_args_list))
+        self.assertEqual(written[0]["clean_track_id"], "spotify:track:c")
+        self.assertEqual(written[1]["explicit_track_id"], "spotify:track:e")
+        self.assertEqual(written[1]["duration_ms"], 200000)
+        self.assertEqual(written[0]["cache_key"], written[1]["cache_key"])
+        print("✅ Track cache batch store test passed")
+
+    def test_search_results_harvested_into_cache(self):
+        """Test every search item is cached under its own name and the pick under the searched name"""
+        from moodque_engine import SpotifyAdapter, TrackCache
+        items = [self._item("spotify:track:c", "Song (Radio Edit)", False),
+                 self._item("spotify:track:e", "Song", True)]
+
+        def search(artist, title, headers, playlist_type, max_retries=2, harvest=None):
+            harvest(items)
+            return "spotify:track:c"
+
+        cache = TrackCache()
+        adapter = SpotifyAdapter({"Authorization": "Bearer t"}, cache)
+        with patch.object(cache, 'get_track_entry', return_value=None), \
+             patch.object(cache, 'store_many') as store_many, \
+             patch('moodque_engine.search_spotify_track_ultra_robust', side_effect=search):
+            self.assertEqual(adapter.search_track("artist", "song"), "spotify:track:c")
+
+        entries = store_many.call_args.args[0]
+        self.assertEqual([(e["track"], e["track_id"]) for e in entries],
+                         [("Song (Radio Edit)", "spotify:track:c"), ("Song", "spotify:track:e"),
+                          ("song", "spotify:track:c")])
+        self.assertFalse(entries[-1]["explicit"])
+        self.assertEqual(entries[-1]["duration_ms"], 200000)
+        print("✅ Search result harvesting test passed")
+
+    def test_build_result_sums_resolved_durations(self):
+        """Test the result's duration comes from pool, cache and search durations with no extra lookup"""
+        from cachetools import TTLCache
+        from moodque_engine import MoodQueEngine
+        from moodque_utilities import remember_track_metadata
+
+        engine = MoodQueEngine({"request_id": "t1"})
+        engine.curated_tracks = [
+            {"artist": "Pool", "track": "One", "uri": "spotify:track:p", "duration_ms": 100000},
+            {"artist": "Cached", "track": "Two"},
+            {"artist": "Legacy", "track": "Three"},
+            {"artist": "Nowhere", "track": "Four"},
+        ]
+        adapter = MagicMock()
+        adapter.resolve_track.side_effect = [{"uri": "spotify:track:c", "duration_ms": 200000},
+                                             {"uri": "spotify:track:l", "duration_ms": None},
+                                             {"uri": "spotify:track:n", "duration_ms": None}]
+        engine.streaming_adapters = {"spotify": adapter}
+        with patch('moodque_utilities.track_metadata_cache', TTLCache(maxsize=10, ttl=60)), \
+             patch.object(engine.cache, 'get_track_id', return_value=None), \
+             patch('moodque_utilities.spotify_get') as mock_get, patch('builtins.print'):
+            # A legacy cache entry has no duration, but an earlier search warmed the metadata cache
+            remember_track_metadata({"id": "l", "duration_ms": 50000, "name": "Three"})
+            track_ids = engine.search_streaming_services()
+            result = engine.build_result("https://open.spotify.com/playlist/abc", track_ids)
+
+        mock_get.assert_not_called()
+        self.assertEqual(result.uris, ["spotify:track:p", "spotify:track:c", "spotify:track:l", "spotify:track:n"])
+        self.assertEqual(result.duration_ms, 350000)
+        self.assertEqual(result.missing_durations, 1)
+        self.assertTrue(result.duration_partial)
+        self.assertTrue(result.to_dict()["duration_partial"])
+        self.assertNotIn("duration_lookup", result.stage_stats)
+        print("✅ Build result duration test passed")
+
+class TestCurationStrategies(unittest.TestCase):
+    """Test the curation strategy registry and offline harness metrics"""
+    
+    def test_default_strategy_registered(self):
+        """Test the legacy curator is registered under its historical name"""
+        from curation_strategies import get_curation_strategy, SmartTrackCurator
+        self.assertIs(get_curation_strategy("smart_mood_valence_v2"), SmartTrackCurator)
+        print("✅ Default curation strategy test passed")
+    
+    def test_unknown_strategy_falls_back(self):
+        """Test unknown strategy names fall back to the default"""
+        from curation_strategies import get_curation_strategy, DEFAULT_CURATION_STRATEGY
+        self.assertEqual(get_curation_strategy("does_not_exist").name, DEFAULT_CURATION_STRATEGY)
+        print("✅ Unknown curation strategy fallback test passed")
+    
+    def test_harness_runs_every_strategy(self):
+        """Test the comparison harness reports metrics for every registered strategy"""
+        from curation_benchmark import build_default_corpus, compare_strategies
+        from curation_strategies import list_curation_strategies
+        corpus = build_default_corpus()[:2]
+        with patch('builtins.print'):
+            report = compare_strategies(corpus, runs=1)
+        self.assertEqual(sorted(report), list_curation_strategies())
+        for metrics in report.values():
+            self.assertGreater(metrics["track_count_mean"], 0)
+            self.assertLessEqual(metrics["artist_diversity_mean"], 1.0)
+        print("✅ Curation harness test passed")
+    
+    def test_duration_fit_respects_clean_filter(self):
+        """Test duration_fit_v1 keeps explicit tracks out of clean playlists"""
+        from curation_benchmark import build_default_corpus, clean_filter_violations
+        from curation_strategies import get_curation_strategy
+        case = build_default_corpus()[0]
+        curator = get_curation_strategy("duration_fit_v1")(case["mood_tags"], case["genre"], case["time_minutes"], "clean")
+        with patch('builtins.print'):
+            selected = curator.curate_tracks(case["candidates"])
+        self.assertEqual(clean_filter_violations(selected, "clean"), 0)
+        print("✅ Duration-fit clean filter test passed")
+    
+    def test_incomplete_strategy_rejected_at_registration(self):
+        """Test a strategy without curate_tracks fails when registered, not mid-build"""
+        from curation_strategies import CurationStrategy, register_curation_strategy, CURATION_STRATEGIES
+        
+        class Incomplete(CurationStrategy):
+            name = "incomplete_test_strategy"
+        
+        with self.assertRaises(TypeError):
+            register_curation_strategy(Incomplete)
+        with self.assertRaises(TypeError):
+            Incomplete("happy", "pop", 30)
+        self.assertNotIn("incomplete_test_strategy", CURATION_STRATEGIES)
+        print("✅ Abstract curation strategy test passed")
+
 class TestUtilities(unittest.TestCase):
     """Test utility functions"""
     
@@ -113,6 +1195,139 @@ class TestUtilities(unittest.TestCase):
         except Exception as e:
             self.fail(f"DateTime import test failed: {e}")
 
+class TestPlaylistPopulation(unittest.TestCase):
+    """Test chunked, ordered playlist writes"""
+
+    def _uris(self, count):
+        return [f"spotify:track:{i:022d}" for i in range(count)]
+
+    def _ok(self, snapshot="snap"):
+        return MagicMock(status_code=201, json=MagicMock(return_value={"snapshot_id": snapshot}))
+
+    def test_large_playlist_written_in_ordered_chunks(self):
+        """Test more than 100 URIs are split into ordered chunks, each at the right position"""
+        from moodque_utilities import populate_playlist
+        uris = self._uris(250)
+        with patch('moodque_utilities.spotify_request', return_value=self._ok()) as mock_request, \
+             patch('builtins.print'):
+            stats = populate_playlist({}, "pl1", uris, existing_total=7)
+
+        payloads = [c.kwargs["json"] for c in mock_request.call_args_list]
+        self.assertEqual([c.args[0] for c in mock_request.call_args_list], ["POST", "POST", "POST"])
+        self.assertEqual([p["position"] for p in payloads], [7, 107, 207])
+        self.assertEqual(sum((p["uris"] for p in payloads), []), uris)
+        self.assertTrue(stats["ok"])
+        self.assertEqual((stats["added"], stats["chunks"]), (250, 3))
+        print("✅ Ordered playlist chunk test passed")
+
+    def test_replace_puts_first_chunk_then_posts(self):
+        """Test replace=True swaps the contents with a PUT and appends the rest with POSTs"""
+        from moodque_utilities import populate_playlist
+        with patch('moodque_utilities.spotify_request', return_value=self._ok()) as mock_request, \
+             patch('moodque_utilities.get_playlist_total') as mock_total, \
+             patch('builtins.print'):
+            stats = populate_playlist({}, "pl1", self._uris(150), replace=True)
+
+        calls = mock_request.call_args_list
+        self.assertEqual([c.args[0] for c in calls], ["PUT", "POST"])
+        self.assertNotIn("position", calls[0].kwargs["json"])
+        self.assertEqual(calls[1].kwargs["json"]["position"], 100)
+        mock_total.assert_not_called()
+        self.assertTrue(stats["ok"])
+        print("✅ Playlist replace test passed")
+
+    def test_timeout_verified_by_total_is_not_resent(self):
+        """Test a chunk that landed despite a timeout is confirmed by the total, not posted twice"""
+        import requests
+        from moodque_utilities import populate_playlist
+        responses = [requests.exceptions.ReadTimeout("slow"), self._ok()]
+        with patch('moodque_utilities.spotify_request', side_effect=responses) as mock_request, \
+             patch('moodque_utilities.get_playlist_total', return_value=100) as mock_total, \
+             patch('moodque_utilities.time.sleep') as mock_sleep, \
+             patch('builtins.print'):
+            stats = populate_playlist({}, "pl1", self._uris(150), existing_total=0)
+
+        positions = [c.kwargs["json"]["position"] for c in mock_request.call_args_list]
+        self.assertEqual(positions, [0, 100])
+        self.assertEqual(mock_total.call_count, 1)
+        self.assertEqual(stats["verified_after_error"], 1)
+        self.assertEqual(stats["added"], 150)
+        mock_sleep.assert_not_called()
+        print("✅ Verified-after-timeout test passed")
+
+    def test_retries_back_off_and_honour_retry_after(self):
+        """Test a 429 waits its Retry-After, a 5xx backs off, and a failed verify read just retries"""
+        import requests
+        from moodque_utilities import populate_playlist, PLAYLIST_RETRY_BACKOFF
+        limited = MagicMock(status_code=429, headers={"Retry-After": "4"})
+        unavailable = MagicMock(status_code=503, headers={})
+        responses = [limited, unavailable, self._ok()]
+        with patch('moodque_utilities.spotify_request', side_effect=responses) as mock_request, \
+             patch('moodque_utilities.get_playlist_total',
+                   side_effect=requests.exceptions.ConnectionError("down")), \
+             patch('moodque_utilities.time.sleep') as mock_sleep, \
+             patch('builtins.print'):
+            stats = populate_playlist({}, "pl1", self._uris(10), existing_total=0)
+
+        self.assertTrue(stats["ok"])
+        self.assertEqual(mock_request.call_count, 3)
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [4.0, PLAYLIST_RETRY_BACKOFF * 2])
+        print("✅ Playlist retry backoff test passed")
+
+    def test_unknown_total_omits_position(self):
+        """Test an unreadable playlist total appends without positions instead of guessing 0"""
+        from moodque_utilities import populate_playlist
+        with patch('moodque_utilities.spotify_request', return_value=self._ok()) as mock_request, \
+             patch('moodque_utilities.get_playlist_total', return_value=None), \
+             patch('builtins.print'):
+            stats = populate_playlist({}, "pl1", self._uris(120))
+
+        self.assertTrue(stats["ok"])
+        self.assertTrue(all("position" not in c.kwargs["json"] for c in mock_request.call_args_list))
+        print("✅ Unknown playlist total test passed")
+
+class TestTrackMetadata(unittest.TestCase):
+    """Test cached, batched track duration lookups"""
+
+    def setUp(self):
+        from cachetools import TTLCache
+        patcher = patch('moodque_utilities.track_metadata_cache', TTLCache(maxsize=100, ttl=3600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _track(self, track_id, duration_ms, **extra):
+        return {"id": track_id, "duration_ms": duration_ms, "name": f"Song {track_id}",
+                "artists": [{"name": "Artist"}], "explicit": False, **extra}
+
+    def test_results_matched_by_id_not_position(self):
+        """Test out-of-order, null and relinked entries map back to the URIs that asked for them"""
+        from moodque_utilities import get_tracks_with_duration
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"tracks": [
+            self._track("b", 2000),
+            None,
+            self._track("a2", 1000, linked_from={"id": "a"}),
+        ]}
+        with patch('moodque_utilities.spotify_get', return_value=response), patch('builtins.print'):
+            tracks = get_tracks_with_duration(
+                ["spotify:track:a", "spotify:track:gone", "spotify:track:b"], {})
+
+        self.assertEqual([(t["uri"], t["duration_ms"]) for t in tracks],
+                         [("spotify:track:a", 1000), ("spotify:track:b", 2000)])
+        print("✅ Track metadata ID matching test passed")
+
+    def test_cached_tracks_skip_the_request(self):
+        """Test tracks already in the metadata cache are served without calling Spotify"""
+        from moodque_utilities import get_tracks_with_duration, remember_track_metadata
+        remember_track_metadata(self._track("a", 1000))
+        remember_track_metadata(self._track("b", 2000))
+        with patch('moodque_utilities.spotify_get') as mock_get:
+            tracks = get_tracks_with_duration(["spotify:track:b", "spotify:track:a"], {})
+
+        mock_get.assert_not_called()
+        self.assertEqual([t["duration_ms"] for t in tracks], [2000, 1000])
+        print("✅ Track metadata cache hit test passed")
+
 class TestFirebaseIntegration(unittest.TestCase):
     """Test Firebase integration"""
     
@@ -149,8 +1364,27 @@ def run_unit_tests():
     
     # Add test classes
     suite.addTests(loader.loadTestsFromTestCase(TestLastFMRecommender))
+    suite.addTests(loader.loadTestsFromTestCase(TestEraIndex))
+    suite.addTests(loader.loadTestsFromTestCase(TestTrackMatcher))
+    suite.addTests(loader.loadTestsFromTestCase(TestLastFMClient))
+    suite.addTests(loader.loadTestsFromTestCase(TestSpotifyScheduler))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncClients))
+    suite.addTests(loader.loadTestsFromTestCase(TestTokenProvider))
+    suite.addTests(loader.loadTestsFromTestCase(TestUserTokenProvider))
+    suite.addTests(loader.loadTestsFromTestCase(TestTokenRefresher))
+    suite.addTests(loader.loadTestsFromTestCase(TestStructuredLogging))
+    suite.addTests(loader.loadTestsFromTestCase(TestCircuitBreaker))
+    suite.addTests(loader.loadTestsFromTestCase(TestSingleFlight))
+    suite.addTests(loader.loadTestsFromTestCase(TestArtistGraph))
+    suite.addTests(loader.loadTestsFromTestCase(TestGenrePools))
+    suite.addTests(loader.loadTestsFromTestCase(TestTasteSnapshots))
+    suite.addTests(loader.loadTestsFromTestCase(TestBuildResult))
     suite.addTests(loader.loadTestsFromTestCase(TestMoodQueEngine))
+    suite.addTests(loader.loadTestsFromTestCase(TestTrackCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestCurationStrategies))
     suite.addTests(loader.loadTestsFromTestCase(TestUtilities))
+    suite.addTests(loader.loadTestsFromTestCase(TestPlaylistPopulation))
+    suite.addTests(loader.loadTestsFromTestCase(TestTrackMetadata))
     suite.addTests(loader.loadTestsFromTestCase(TestFirebaseIntegration))
     
     # Run tests
@@ -0,0 +1,376 @@
+# token_provider.py - Process-wide cached Spotify system (app account) access token
+
+import os
+import time
+import base64
+import socket
+import threading
+
+from cachetools import LRUCache
+
+from moodque_logging import get_logger
+from single_flight import SingleFlight
+from spotify_client import spotify_request, SPOTIFY_API_URL, SPOTIFY_TOKEN_URL
+
+# Refresh this long before Spotify's expires_in runs out, so no caller gets a token that dies mid-build
+SPOTIFY_TOKEN_REFRESH_MARGIN = int(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN", "300"))  # seconds
+SPOTIFY_TOKEN_DEFAULT_TTL = 3600  # seconds, when expires_in is missing
+USER_TOKEN_CACHE_SIZE = int(os.getenv("USER_TOKEN_CACHE_SIZE", "5000"))
+USER_TOKEN_LEASE_SECONDS = float(os.getenv("USER_TOKEN_LEASE_SECONDS", "15"))  # how long one worker may hold a refresh
+USER_TOKEN_LEASE_WAIT = float(os.getenv("USER_TOKEN_LEASE_WAIT", "10"))  # seconds to wait on another worker's refresh
+USER_TOKEN_LEASE_POLL = 0.25  # seconds between re-reads while waiting
+# A cached user token is re-checked against the users doc this often, so a disconnect
+# in one worker stops every other worker from using the token within this window
+USER_TOKEN_RECHECK_SECONDS = float(os.getenv("USER_TOKEN_RECHECK_SECONDS", "60"))
+
+# The app account's Spotify user ID never changes; set it to skip even the one /me lookup
+SPOTIFY_SYSTEM_USER_ID = os.getenv("SPOTIFY_SYSTEM_USER_ID")
+
+# Fields on the users/{user_id} document
+LEASE_UNTIL_FIELD = "spotify_token_lease_until"
+LEASE_OWNER_FIELD = "spotify_token_lease_owner"
+
+log = get_logger("moodque.token_provider")
+
+
+class TokenRefreshError(Exception):
+    """Raised when accounts.spotify.com refuses to refresh a token"""
+
+
+def fetch_spotify_user_id(send, access_token) -> str:
+    """GET /me for the token's owner; only called when a principal's ID is not known yet"""
+    response = send("GET", f"{SPOTIFY_API_URL}/me", headers={"Authorization": f"Bearer {access_token}"})
+    if response.status_code != 200:
+        log.warning("❌ Failed to get Spotify user ID: %s", response.status_code)
+        raise TokenRefreshError(f"Spotify /me failed with {response.status_code}")
+    return response.json()["id"]
+
+
+class SystemTokenProvider:
+    """
+    Caches the app account's access token until shortly before it expires. Readers take
+    no lock while the token is valid; one thread refreshes under the lock, the rest wait
+    for it and reuse the result.
+    """
+
+    def __init__(self, client_id=None, client_secret=None, refresh_token=None,
+                 margin=SPOTIFY_TOKEN_REFRESH_MARGIN, send=None):
+        self.client_id = client_id or os.getenv("SPOTIFY_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("SPOTIFY_CLIENT_SECRET")
+        self.refresh_token = refresh_token or os.getenv("SPOTIFY_REFRESH_TOKEN")
+        self.margin = margin
+        self.send = send or spotify_request
+        self.lock = threading.Lock()
+        self._token = (None, 0.0)  # (access_token, expires_at); swapped as one object
+        self._spotify_user_id = SPOTIFY_SYSTEM_USER_ID
+        self.counters = {"hits": 0, "refreshes": 0, "failures": 0, "me_lookups": 0}
+
+    def _cached(self):
+        access_token, expires_at = self._token
+        if access_token and time.time() < expires_at - self.margin:
+            return access_token
+        return None
+
+    def get_token(self) -> str:
+        """A valid system access token, refreshing it first if it is about to expire"""
+        access_token = self._cached()
+        if access_token:
+            self.counters["hits"] += 1
+            return access_token
+
+        with self.lock:
+            # Another thread may have refreshed while we waited
+            access_token = self._cached()
+            if access_token:
+                self.counters["hits"] += 1
+                return access_token
+            return self._refresh()
+
+    def spotify_user_id(self) -> str:
+        """The app account's Spotify user ID, looked up once per process"""
+        if self._spotify_user_id is None:
+            access_token = self.get_token()
+            with self.lock:
+                if self._spotify_user_id is None:
+                    self._spotify_user_id = fetch_spotify_user_id(self.send, access_token)
+                    self.counters["me_lookups"] += 1
+        return self._spotify_user_id
+
+    def invalidate(self, access_token=None):
+        """Drop the cached token (e.g. after a 401); only if it is still the one the caller saw"""
+        with self.lock:
+            if access_token is None or self._token[0] == access_token:
+                self._token = (None, 0.0)
+
+    def _refresh(self) -> str:
+        auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+        headers = {
+            "Authorization": f"Basic {auth_header}",
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        data = {
+            "grant_type": "refresh_token",
+            "refresh_token": self.refresh_token
+        }
+        response = self.send("POST", SPOTIFY_TOKEN_URL, headers=headers, data=data)
+
+        if response.status_code != 200:
+            self.counters["failures"] += 1
+            log.warning("❌ Failed to refresh app access token: %s", response.text)
+            raise TokenRefreshError("Spotify token refresh failed")
+
+        token_info = response.json()
+        expires_in = token_info.get("expires_in") or SPOTIFY_TOKEN_DEFAULT_TTL
+        self._token = (token_info["access_token"], time.time() + expires_in)
+        # Spotify may rotate the refresh token; keep using the newest one
+        if token_info.get("refresh_token"):
+            self.refresh_token = token_info["refresh_token"]
+        self.counters["refreshes"] += 1
+        log.info("🔑 Refreshed system Spotify token (valid %ss)", expires_in)
+        return token_info["access_token"]
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["expires_in"] = max(0, round(self._token[1] - time.time())) if self._token[0] else 0
+        return stats
+
+
+def _stored_expiry(user_data) -> float:
+    try:
+        return float(user_data.get("spotify_token_expires_at") or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+class UserTokenProvider:
+    """
+    Per-user access tokens. Valid tokens are served from memory for up to recheck_seconds,
+    then confirmed against the users doc (one read), so a disconnect handled by another
+    worker takes effect everywhere within that window. An expiring token is refreshed once per process (single-flight per user) and once across
+    workers: the refreshing worker holds a short lease on the user doc, taken in a Firestore
+    transaction, and the others wait for the token it writes. Only token fields are written.
+    """
+
+    def __init__(self, db, collection="users", margin=SPOTIFY_TOKEN_REFRESH_MARGIN,
+                 lease_seconds=USER_TOKEN_LEASE_SECONDS, lease_wait=USER_TOKEN_LEASE_WAIT, send=None,
+                 recheck_seconds=USER_TOKEN_RECHECK_SECONDS):
+        self.db = db
+        self.collection = collection
+        self.margin = margin
+        self.lease_seconds = lease_seconds
+        self.lease_wait = lease_wait
+        self.recheck_seconds = recheck_seconds
+        self.send = send or spotify_request
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.tokens = LRUCache(maxsize=USER_TOKEN_CACHE_SIZE)  # user_id -> (access_token, expires_at, checked_at)
+        self.spotify_ids = LRUCache(maxsize=USER_TOKEN_CACHE_SIZE)  # user_id -> Spotify user ID
+        self.single_flight = SingleFlight("user_tokens")
+        self.counters = {"hits": 0, "firestore_reads": 0, "refreshes": 0, "lease_waits": 0, "failures": 0,
+                         "me_lookups": 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _valid(self, access_token, expires_at, margin) -> bool:
+        return bool(access_token) and time.time() < expires_at - margin
+
+    def get_token(self, user_id, margin=None, bucket=None) -> str:
+        """
+        A valid access token for the user, refreshing it first if it expires within `margin`
+        seconds (default: the provider's margin; the background refresher asks for more).
+        A bucket, if given, is drawn on only right before an actual refresh request.
+        Raises ValueError if the user has no Spotify connection (e.g. disconnected).
+        """
+        margin = self.margin if margin is None else max(margin, self.margin)
+        with self.lock:
+            access_token, expires_at, checked_at = self.tokens.get(user_id, (None, 0.0, 0.0))
+        if self._valid(access_token, expires_at, margin) and time.time() - checked_at < self.recheck_seconds:
+            self._count("hits")
+            return access_token
+        return self.single_flight.do(user_id, self._load_or_refresh, user_id, margin, bucket)
+
+    def remember(self, user_id, access_token, expires_at, spotify_user_id=None):
+        """Cache a token obtained elsewhere (e.g. the OAuth callback)"""
+        with self.lock:
+            self.tokens[user_id] = (access_token, float(expires_at), time.time())
+            if spotify_user_id:
+                self.spotify_ids[user_id] = spotify_user_id
+
+    def spotify_user_id(self, user_id) -> str:
+        """
+        The user's Spotify ID: from memory, else the users doc (read along with the token).
+        Only a doc written before the ID was stored costs one /me call, and the answer is saved.
+        The token is checked first, so a disconnected user's cached ID is never returned.
+        """
+        access_token = self.get_token(user_id)
+        with self.lock:
+            spotify_user_id = self.spotify_ids.get(user_id)
+        if spotify_user_id:
+            return spotify_user_id
+
+        ref = self.db.collection(self.collection).document(user_id)
+        spotify_user_id = self._read(ref, user_id).get("spotify_user_id")
+        if not spotify_user_id:
+            spotify_user_id = fetch_spotify_user_id(self.send, access_token)
+            ref.update({"spotify_user_id": spotify_user_id})
+            self._count("me_lookups")
+        with self.lock:
+            self.spotify_ids[user_id] = spotify_user_id
+        return spotify_user_id
+
+    def invalidate(self, user_id, access_token=None):
+        """Drop the cached token (after a 401, disconnect or revoke); only if it is the one the caller saw.
+        Without an access_token the cached Spotify user ID goes too."""
+        with self.lock:
+            cached = self.tokens.get(user_id)
+            if cached and (access_token is None or cached[0] == access_token):
+                del self.tokens[user_id]
+            if access_token is None:
+                self.spotify_ids.pop(user_id, None)
+
+    def _read(self, ref, user_id):
+        doc = ref.get()
+        self._count("firestore_reads")
+        if not doc.exists:
+            raise ValueError(f"User {user_id} not found in Firestore.")
+        return doc.to_dict()
+
+    def _load_or_refresh(self, user_id, margin, bucket=None) -> str:
+        ref = self.db.collection(self.collection).document(user_id)
+        deadline = time.time() + self.lease_wait
+
+        while True:
+            try:
+                user_data = self._read(ref, user_id)
+            except ValueError:
+                self.invalidate(user_id)
+                raise
+            if not user_data.get("spotify_refresh_token"):
+                # Disconnected (possibly by another worker): forget whatever we cached
+                self.invalidate(user_id)
+                raise ValueError(f"No refresh token found for user {user_id}.")
+
+            access_token, expires_at = user_data.get("spotify_access_token"), _stored_expiry(user_data)
+            if self._valid(access_token, expires_at, margin):
+                self.remember(user_id, access_token, expires_at, user_data.get("spotify_user_id"))
+                return access_token
+
+            leased = self._acquire_lease(ref)
+            if leased is not None:
+                return self._refresh(user_id, ref, leased, margin, bucket)
+
+            if time.time() >= deadline:
+                # The lease holder stalled; refreshing without it beats failing the build
+                log.warning("⚠️ Token refresh lease for %s still held after %ss - refreshing anyway", user_id, self.lease_wait)
+                return self._refresh(user_id, ref, user_data, margin, bucket)
+
+            self._count("lease_waits")
+            time.sleep(USER_TOKEN_LEASE_POLL)
+
+    def _acquire_lease(self, ref):
+        """The user doc as read inside the transaction if we now hold the lease, else None"""
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def take(transaction):
+            snapshot = ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            user_data = snapshot.to_dict()
+            now = time.time()
+            lease_until = float(user_data.get(LEASE_UNTIL_FIELD) or 0)
+            if lease_until > now and user_data.get(LEASE_OWNER_FIELD) != self.owner:
+                return None
+            transaction.update(ref, {LEASE_UNTIL_FIELD: now + self.lease_seconds, LEASE_OWNER_FIELD: self.owner})
+            return user_data
+
+        return take(self.db.transaction())
+
+    def _refresh(self, user_id, ref, user_data, margin, bucket=None) -> str:
+        # Another worker may have refreshed between our read and taking the lease
+        access_token, expires_at = user_data.get("spotify_access_token"), _stored_expiry(user_data)
+        if self._valid(access_token, expires_at, margin):
+            ref.update({LEASE_UNTIL_FIELD: None, LEASE_OWNER_FIELD: None})
+            self.remember(user_id, access_token, expires_at, user_data.get("spotify_user_id"))
+            return access_token
+
+        payload = {
+            "grant_type": "refresh_token",
+            "refresh_token": user_data["spotify_refresh_token"],
+            "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
+            "client_secret": os.getenv("SPOTIFY_CLIENT_SECRET"),
+        }
+        if bucket is not None:
+            try:
+                bucket.acquire(timeout=self.lease_seconds)
+            except Exception:
+                ref.update({LEASE_UNTIL_FIELD: None, LEASE_OWNER_FIELD: None})
+                raise
+        try:
+            response = self.send("POST", SPOTIFY_TOKEN_URL, data=payload)
+            if response.status_code != 200:
+                log.warning("❌ Failed to refresh Spotify token for %s: %s", user_id, response.text)
+                raise TokenRefreshError(f"Spotify user token refresh failed for {user_id}")
+        except Exception:
+            self._count("failures")
+            ref.update({LEASE_UNTIL_FIELD: None, LEASE_OWNER_FIELD: None})
+            raise
+
+        token_info = response.json()
+        expires_at = time.time() + (token_info.get("expires_in") or SPOTIFY_TOKEN_DEFAULT_TTL)
+        fields = {
+            "spotify_access_token": token_info["access_token"],
+            "spotify_token_expires_at": str(expires_at),
+            LEASE_UNTIL_FIELD: None,
+            LEASE_OWNER_FIELD: None
+        }
+        # Only update the refresh token if Spotify rotated it
+        if token_info.get("refresh_token"):
+            fields["spotify_refresh_token"] = token_info["refresh_token"]
+        ref.update(fields)
+
+        self.remember(user_id, token_info["access_token"], expires_at, user_data.get("spotify_user_id"))
+        self._count("refreshes")
+        log.info("🔑 Refreshed Spotify token for %s", user_id)
+        return token_info["access_token"]
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["cached_users"] = len(self.tokens)
+        stats["single_flight"] = self.single_flight.stats()
+        return stats
+
+
+_system_provider = None
+_system_provider_lock = threading.Lock()
+
+
+def get_system_token_provider() -> SystemTokenProvider:
+    global _system_provider
+    if _system_provider is None:
+        with _system_provider_lock:
+            if _system_provider is None:
+                _system_provider = SystemTokenProvider()
+    return _system_provider
+
+
+def get_system_access_token() -> str:
+    """The MoodQue app account's access token (cached; refreshed shortly before expiry)"""
+    return get_system_token_provider().get_token()
+
+
+_user_provider = None
+_user_provider_lock = threading.Lock()
+
+
+def get_user_token_provider() -> UserTokenProvider:
+    global _user_provider
+    if _user_provider is None:
+        with _user_provider_lock:
+            if _user_provider is None:
+                from firebase_admin_init import db
+                _user_provider = UserTokenProvider(db)
+    return _user_provider
@@ -0,0 +1,158 @@
+# token_refresher.py - Refresh recently active users' Spotify tokens before their builds need them
+
+import os
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes - every process runs its own refresher
+    fcntl = None
+
+from firebase_admin import firestore
+
+from firebase_admin_init import db
+from moodque_logging import get_logger
+from rate_limiter import RateLimitTimeout, SharedTokenBucket
+from token_provider import get_user_token_provider
+
+# Background refresher is opt-in per deployment
+TOKEN_REFRESHER_ENABLED = os.getenv("TOKEN_REFRESHER_ENABLED", "false").lower() == "true"
+TOKEN_REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", "300"))  # seconds between sweeps
+TOKEN_REFRESH_AHEAD = int(os.getenv("TOKEN_REFRESH_AHEAD", "900"))  # refresh tokens expiring within this many seconds
+TOKEN_REFRESH_ACTIVE_DAYS = int(os.getenv("TOKEN_REFRESH_ACTIVE_DAYS", "3"))  # "recently active" window
+TOKEN_REFRESH_MAX_USERS = int(os.getenv("TOKEN_REFRESH_MAX_USERS", "500"))  # interactions scanned per sweep
+TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", "5"))
+TOKEN_REFRESH_RATE = float(os.getenv("TOKEN_REFRESH_RATE", "2"))  # accounts.spotify.com calls per second, host-wide
+
+# Interactions logged without a connected Spotify account
+ANONYMOUS_USERS = {"", "anonymous", "unknown", None}
+
+log = get_logger("moodque.token_refresher")
+
+
+class TokenRefresher:
+    """
+    Sweeps users with recent interactions and refreshes any token that would expire before
+    the next sweep, a small batch at a time under its own host-wide rate limit. Builds then
+    find a valid token in UserTokenProvider instead of waiting on accounts.spotify.com.
+    """
+
+    def __init__(self, provider=None, ahead=TOKEN_REFRESH_AHEAD, batch_size=TOKEN_REFRESH_BATCH_SIZE,
+                 rate=TOKEN_REFRESH_RATE):
+        self.provider = provider or get_user_token_provider()
+        self.ahead = ahead
+        self.batch_size = batch_size
+        self.bucket = SharedTokenBucket("token_refresh", rate=rate, capacity=batch_size)
+        self.lock = threading.Lock()
+        self.counters = {"sweeps": 0, "checked": 0, "failed": 0, "skipped": 0, "deferred": 0,
+                         "last_sweep_seconds": 0.0}
+
+    def active_user_ids(self, days=TOKEN_REFRESH_ACTIVE_DAYS, limit=TOKEN_REFRESH_MAX_USERS) -> List[str]:
+        """Users with interactions in the last `days`, most recent first"""
+        since = datetime.now() - timedelta(days=days)
+        query = (db.collection("interactions")
+                 .where("timestamp", ">=", since)
+                 .order_by("timestamp", direction=firestore.Query.DESCENDING)
+                 .limit(limit)
+                 .select(["user_id"]))
+        user_ids = (doc.to_dict().get("user_id") for doc in query.stream())
+        return [u for u in dict.fromkeys(user_ids) if u not in ANONYMOUS_USERS]
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _refresh_one(self, user_id):
+        try:
+            # Cached tokens with enough life left return without touching Firestore or Spotify;
+            # the bucket is only drawn on right before an actual accounts.spotify.com request
+            self.provider.get_token(user_id, margin=self.ahead, bucket=self.bucket)
+            self._count("checked")
+        except ValueError:
+            # Not connected to Spotify (no user doc or refresh token)
+            self._count("skipped")
+        except RateLimitTimeout:
+            # Refresh budget used up for now; the next sweep (or the build itself) picks it up
+            self._count("deferred")
+        except Exception as e:
+            self._count("failed")
+            log.warning("⚠️ Background token refresh failed for %s: %s", user_id, e)
+
+    def sweep(self):
+        """One pass over the recently active users"""
+        started = time.time()
+        user_ids = self.active_user_ids()
+        refreshes_before = self.provider.stats()["refreshes"]
+
+        with ThreadPoolExecutor(max_workers=self.batch_size, thread_name_prefix="token-refresh") as executor:
+            for i in range(0, len(user_ids), self.batch_size):
+                list(executor.map(self._refresh_one, user_ids[i:i + self.batch_size]))
+
+        with self.lock:
+            self.counters["sweeps"] += 1
+            self.counters["last_sweep_seconds"] = round(time.time() - started, 2)
+        refreshed = self.provider.stats()["refreshes"] - refreshes_before
+        log.info("🔑 Token refresher: %s active users, %s refreshed in %ss",
+                 len(user_ids), refreshed, self.counters["last_sweep_seconds"])
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["rate_limit"] = self.bucket.stats()
+        return stats
+
+
+_refresher = None
+_refresher_thread = None
+_refresher_lock_fd = None
+
+
+def get_token_refresher() -> TokenRefresher:
+    global _refresher
+    if _refresher is None:
+        _refresher = TokenRefresher()
+    return _refresher
+
+
+def _claim_refresher_lock() -> bool:
+    """Only one worker per host runs the sweeps; the others still serve tokens it wrote to Firestore"""
+    global _refresher_lock_fd
+    if fcntl is None:
+        return True
+    fd = os.open(os.path.join(tempfile.gettempdir(), "moodque_token_refresher.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _refresher_lock_fd = fd  # held for the life of the process
+    return True
+
+
+def _refresh_loop(interval):
+    refresher = get_token_refresher()
+    while True:
+        try:
+            refresher.sweep()
+        except Exception as e:
+            log.warning("❌ Token refresher error: %s", e)
+        time.sleep(interval)
+
+
+def start_token_refresher(interval=TOKEN_REFRESH_INTERVAL) -> bool:
+    """Start the background refresher thread (once per host); returns True if this process runs it"""
+    global _refresher_thread
+    if _refresher_thread is not None:
+        return True
+    if not _claim_refresher_lock():
+        log.info("🔑 Token refresher already running in another worker")
+        return False
+    _refresher_thread = threading.Thread(target=_refresh_loop, args=(interval,), name="token-refresher", daemon=True)
+    _refresher_thread.start()
+    log.info("🔑 Token refresher started (every %ss, %ss ahead of expiry)", interval, TOKEN_REFRESH_AHEAD)
+    return True
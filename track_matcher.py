@@ -0,0 +1,131 @@
+# track_matcher.py - Scores Spotify search results against the artist/title we asked for
+
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# A result must clear all three to be accepted
+MATCH_THRESHOLD = float(os.getenv("TRACK_MATCH_THRESHOLD", "0.72"))
+MATCH_MIN_ARTIST = float(os.getenv("TRACK_MATCH_MIN_ARTIST", "0.75"))
+MATCH_MIN_TITLE = float(os.getenv("TRACK_MATCH_MIN_TITLE", "0.5"))
+ARTIST_WEIGHT = 0.45
+TITLE_WEIGHT = 0.55
+
+# Alternate recordings we should not hand out unless they were asked for
+VERSION_WORDS = frozenset({"live", "remix", "karaoke", "instrumental", "cover", "acoustic",
+                           "demo", "tribute", "reprise", "sped", "slowed"})
+VERSION_PENALTY = 0.2
+
+# " - Remastered 2011", " - Radio Edit", " - Mono" and friends say nothing about which song it is
+EDITION_SUFFIX = re.compile(r"\s+-\s+.*\b(remaster(ed)?|version|edit|mono|stereo|single|bonus|deluxe|mix)\b.*$")
+BRACKETS = re.compile(r"\(.*?\)|\[.*?\]")
+FEATURING = re.compile(r"\b(feat\.?|ft\.?|featuring)(\s|$).*$")
+NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return text.replace("&", " and ")
+
+
+def _bigrams(text: str) -> FrozenSet[str]:
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1)) if len(text) > 1 else frozenset({text})
+
+
+class NormalizedForm:
+    """Precomputed tokens and character bigrams of one artist or title"""
+
+    __slots__ = ("tokens", "joined", "bigrams", "version_words")
+
+    def __init__(self, tokens: Tuple[str, ...], version_words: FrozenSet[str] = frozenset()):
+        self.tokens = frozenset(tokens)
+        self.joined = "".join(tokens)
+        self.bigrams = _bigrams(self.joined)
+        self.version_words = version_words
+
+
+@lru_cache(maxsize=8192)
+def normalize_title(title: str) -> NormalizedForm:
+    """Title without edition suffixes, bracketed notes or featured artists"""
+    text = _fold(title)
+    # Version words are read before the brackets go: "Song (Live)" is still a live take
+    version_words = frozenset(NON_WORD.split(text)) & VERSION_WORDS
+    text = EDITION_SUFFIX.sub("", text)
+    text = BRACKETS.sub(" ", text)
+    text = FEATURING.sub("", text)
+    tokens = tuple(t for t in NON_WORD.split(text) if t)
+    return NormalizedForm(tokens, version_words)
+
+
+@lru_cache(maxsize=8192)
+def normalize_artist(name: str) -> NormalizedForm:
+    """Artist name without a leading "The" or featured artists"""
+    text = FEATURING.sub("", _fold(name))
+    tokens = [t for t in NON_WORD.split(text) if t]
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens = tokens[1:]
+    return NormalizedForm(tuple(tokens))
+
+
+def similarity(a: NormalizedForm, b: NormalizedForm) -> float:
+    """
+    0..1: the better of word overlap (order-free, so reordered titles still match)
+    and character-bigram overlap (tolerates typos and joined/split words).
+    """
+    if not a.joined or not b.joined:
+        return 0.0
+    if a.joined == b.joined:
+        return 1.0
+    token_score = 2 * len(a.tokens & b.tokens) / (len(a.tokens) + len(b.tokens))
+    char_score = 2 * len(a.bigrams & b.bigrams) / (len(a.bigrams) + len(b.bigrams))
+    return max(token_score, char_score)
+
+
+class TrackMatcher:
+    """Ranks search results for one requested artist/title; the query is normalized once"""
+
+    def __init__(self, artist: str, title: str, threshold: float = MATCH_THRESHOLD):
+        self.artist = normalize_artist(artist)
+        self.title = normalize_title(title)
+        self.threshold = threshold
+
+    def score(self, item: Dict) -> float:
+        """Similarity of a Spotify track object to the query; 0 if artist or title is too far off"""
+        artists = item.get("artists") or []
+        artist_score = max((similarity(self.artist, normalize_artist(a.get("name", ""))) for a in artists),
+                           default=0.0)
+        if artist_score < MATCH_MIN_ARTIST:
+            return 0.0
+
+        title = normalize_title(item.get("name", ""))
+        title_score = similarity(self.title, title)
+        if title_score < MATCH_MIN_TITLE:
+            return 0.0
+
+        score = ARTIST_WEIGHT * artist_score + TITLE_WEIGHT * title_score
+        if title.version_words - self.title.version_words:
+            score -= VERSION_PENALTY
+        return score
+
+    def rank(self, items: Iterable[Dict], playlist_type: str = "any") -> List[Tuple[float, Dict]]:
+        """(score, item) for every acceptable item, best first"""
+        playlist_type = (playlist_type or "any").lower()
+        ranked = []
+        for item in items:
+            is_explicit = bool(item.get("explicit"))
+            if playlist_type == "clean" and is_explicit:
+                continue
+            if playlist_type == "explicit" and not is_explicit:
+                continue
+            score = self.score(item)
+            if score >= self.threshold:
+                ranked.append((score, item))
+        ranked.sort(key=lambda pair: pair[0], reverse=True)
+        return ranked
+
+    def best(self, items: Iterable[Dict], playlist_type: str = "any") -> Optional[Dict]:
+        ranked = self.rank(items, playlist_type)
+        return ranked[0][1] if ranked else None
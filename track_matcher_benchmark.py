@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Offline accuracy/throughput check for Spotify search-result matching.
+
+Replays a labelled corpus of (requested artist/title, search results, correct URI)
+cases through the scored TrackMatcher and the old 5-character prefix rule, and
+reports precision, recall and matches per second.
+
+Run with: python track_matcher_benchmark.py [--corpus corpus.json] [--runs 20] [--json]
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+
+from track_matcher import TrackMatcher
+
+CORPUS_SEED = 11
+
+# (artist, title) pairs the corpus is built around
+CATALOG = [
+    ("The Beatles", "Here Comes the Sun"),
+    ("The Band", "The Weight"),
+    ("Beyoncé", "Crazy in Love"),
+    ("Florence + The Machine", "Dog Days Are Over"),
+    ("Simon & Garfunkel", "The Sound of Silence"),
+    ("Earth, Wind & Fire", "September"),
+    ("Daft Punk", "Get Lucky"),
+    ("Kendrick Lamar", "HUMBLE."),
+    ("Fleetwood Mac", "Go Your Own Way"),
+    ("Queen", "Don't Stop Me Now"),
+    ("Sigur Rós", "Hoppípolla"),
+    ("Outkast", "Hey Ya!"),
+    ("Miles Davis", "So What"),
+    ("Taylor Swift", "Shake It Off"),
+    ("The Weeknd", "Blinding Lights"),
+    ("Bob Marley & The Wailers", "Three Little Birds"),
+    ("Radiohead", "Karma Police"),
+    ("Billie Eilish", "bad guy"),
+    ("Stevie Wonder", "Superstition"),
+    ("Tame Impala", "The Less I Know the Better"),
+]
+
+# Same artist, different song - a prefix rule happily accepts these
+OTHER_TITLES = ["Here Today", "Crazy Train", "Dog Eat Dog", "September Song", "Get Back",
+                "Go Now", "Don't Look Back", "Hey Jude", "So Far Away", "Shake It Up"]
+
+# Different artists that share a prefix with catalog artists
+LOOKALIKE_ARTISTS = ["The Beach Boys", "The Bangles", "Beyond", "Florida Georgia Line", "Simon Says",
+                     "Earthgang", "Daft Kids", "Kendrick Scott", "Fleet Foxes", "Queensryche"]
+
+EDITION_SUFFIXES = [" - Remastered 2009", " - 2011 Remaster", " - Radio Edit", " - Mono Version"]
+VERSION_SUFFIXES = [" - Live", " (Karaoke Version)", " - Acoustic", " (Instrumental)"]
+
+
+def _item(uri, artist, name, explicit=False):
+    return {"uri": uri, "name": name, "explicit": explicit, "artists": [{"name": a} for a in artist.split(" feat. ")]}
+
+
+def _typo(text, rng):
+    i = rng.randrange(1, max(2, len(text) - 1))
+    return text[:i] + text[i + 1:]
+
+
+def build_default_corpus(seed=CORPUS_SEED):
+    """Deterministic labelled cases; expected is the URI a correct matcher picks, or None"""
+    rng = random.Random(seed)
+    corpus = []
+
+    for n, (artist, title) in enumerate(CATALOG):
+        right = f"spotify:track:right{n}"
+        other_title = OTHER_TITLES[n % len(OTHER_TITLES)]
+        lookalike = LOOKALIKE_ARTISTS[n % len(LOOKALIKE_ARTISTS)]
+        noise = [
+            _item(f"spotify:track:other{n}", artist, other_title),
+            _item(f"spotify:track:alike{n}", lookalike, title if rng.random() < 0.5 else other_title),
+        ]
+
+        # Exact result among noise
+        corpus.append({"kind": "exact", "artist": artist, "title": title, "playlist_type": "any",
+                       "items": noise + [_item(right, artist, title)], "expected": right})
+
+        # Spotify adds an edition suffix or a featured artist
+        corpus.append({"kind": "edition", "artist": artist, "title": title, "playlist_type": "any",
+                       "items": [_item(right, artist, title + rng.choice(EDITION_SUFFIXES))] + noise,
+                       "expected": right})
+        corpus.append({"kind": "featuring", "artist": artist, "title": title, "playlist_type": "any",
+                       "items": noise + [_item(right, f"{artist} feat. Guest {n}", f"{title} (feat. Guest {n})")],
+                       "expected": right})
+
+        # Requested with "The" dropped, different case/accents and a typo
+        plain_artist = re.sub(r"^The ", "", artist).lower()
+        corpus.append({"kind": "spelling", "artist": plain_artist, "title": _typo(title, rng),
+                       "playlist_type": "any", "items": noise + [_item(right, artist, title)], "expected": right})
+
+        # Reordered title words (Last.fm and Spotify disagree surprisingly often)
+        words = title.split()
+        if len(words) > 2:
+            reordered = " ".join(words[1:] + words[:1])
+            corpus.append({"kind": "reordered", "artist": artist, "title": reordered, "playlist_type": "any",
+                           "items": noise + [_item(right, artist, title)], "expected": right})
+
+        # Live/karaoke take listed first; the studio version should still win
+        corpus.append({"kind": "version", "artist": artist, "title": title, "playlist_type": "any",
+                       "items": [_item(f"spotify:track:live{n}", artist, title + rng.choice(VERSION_SUFFIXES)),
+                                 _item(right, artist, title)], "expected": right})
+
+        # Clean playlist: the explicit twin comes back first
+        corpus.append({"kind": "clean_twin", "artist": artist, "title": title, "playlist_type": "clean",
+                       "items": [_item(f"spotify:track:explicit{n}", artist, title, explicit=True),
+                                 _item(right, artist, title)], "expected": right})
+
+        # The song is not in the results at all: nothing should be accepted
+        corpus.append({"kind": "absent", "artist": artist, "title": title, "playlist_type": "any",
+                       "items": noise, "expected": None})
+
+    return corpus
+
+
+def load_corpus(path=None):
+    if not path:
+        return build_default_corpus()
+    with open(path) as f:
+        return json.load(f)
+
+
+def prefix_match(case):
+    """The matching rule search_spotify_track_ultra_robust used before TrackMatcher"""
+    def clean_text(text):
+        text = re.sub(r"\(.*?\)|\[.*?\]", "", text)
+        text = text.replace("feat.", "").replace("featuring", "")
+        return text.strip().lower()
+
+    cleaned_artist = clean_text(case["artist"])
+    cleaned_title = clean_text(case["title"])
+    for track in case["items"]:
+        t_name = clean_text(track.get("name", ""))
+        t_artist = clean_text(track.get("artists", [{}])[0].get("name", ""))
+        if (cleaned_artist[:5] in t_artist or t_artist[:5] in cleaned_artist) and \
+           (cleaned_title[:5] in t_name or t_name[:5] in cleaned_title):
+            if case["playlist_type"] == "clean" and track.get("explicit"):
+                continue
+            return track["uri"]
+    return None
+
+
+def scored_match(case):
+    best = TrackMatcher(case["artist"], case["title"]).best(case["items"], case["playlist_type"])
+    return best["uri"] if best else None
+
+
+MATCHERS = {"scored": scored_match, "prefix": prefix_match}
+
+
+def evaluate(matcher, corpus, runs=20):
+    """Precision/recall over the corpus plus throughput over repeated replays"""
+    accepted = correct = wrong = 0
+    misses_by_kind = {}
+    for case in corpus:
+        picked = matcher(case)
+        if picked is not None:
+            accepted += 1
+            if picked == case["expected"]:
+                correct += 1
+            else:
+                wrong += 1
+                misses_by_kind[case["kind"]] = misses_by_kind.get(case["kind"], 0) + 1
+        elif case["expected"] is not None:
+            misses_by_kind[case["kind"]] = misses_by_kind.get(case["kind"], 0) + 1
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        for case in corpus:
+            matcher(case)
+    elapsed = time.perf_counter() - started
+
+    answerable = sum(1 for case in corpus if case["expected"] is not None)
+    return {
+        "cases": len(corpus),
+        "precision": correct / accepted if accepted else 0.0,
+        "recall": correct / answerable if answerable else 0.0,
+        "wrong_accepts": wrong,
+        "matches_per_sec": runs * len(corpus) / elapsed if elapsed else 0.0,
+        "misses_by_kind": misses_by_kind
+    }
+
+
+def print_report(report):
+    header = f"{'matcher':<10}{'cases':>8}{'precision':>12}{'recall':>10}{'wrong':>8}{'matches/s':>14}"
+    print(header)
+    print("-" * len(header))
+    for name, m in report.items():
+        print(f"{name:<10}{m['cases']:>8}{m['precision']:>12.1%}{m['recall']:>10.1%}"
+              f"{m['wrong_accepts']:>8}{m['matches_per_sec']:>14,.0f}")
+    for name, m in report.items():
+        if m["misses_by_kind"]:
+            print(f"\n{name} errors by case kind: {m['misses_by_kind']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Spotify search-result matching offline")
+    parser.add_argument("--corpus", help="JSON labelled corpus (default: built-in fixed corpus)")
+    parser.add_argument("--dump-corpus", help="Write the built-in corpus to this path and exit")
+    parser.add_argument("--runs", type=int, default=20, help="Replays of the corpus for the throughput figure")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.dump_corpus:
+        with open(args.dump_corpus, "w") as f:
+            json.dump(build_default_corpus(), f, indent=2)
+        print(f"✅ Corpus written to {args.dump_corpus}")
+        return
+
+    corpus = load_corpus(args.corpus)
+    report = {name: evaluate(matcher, corpus, runs=args.runs) for name, matcher in MATCHERS.items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"🧪 Matched {len(corpus)} labelled search results x {args.runs} runs\n")
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()